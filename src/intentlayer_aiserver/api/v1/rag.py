@@ -0,0 +1,126 @@
+"""Routes API pour l'alimentation de la base de connaissances et la recherche de produits"""
+
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from typing import Dict, Any, List, Optional
+import logging
+
+from ...services.rag_service import RAGService
+from ...services.ingestion_jobs import (
+    IngestionJobManager, IngestionError, iter_ndjson, iter_multipart, multipart_boundary
+)
+from ...core.config import settings
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["RAG"])
+
+# Instance globale du gestionnaire d'ingestion
+ingestion_jobs: IngestionJobManager = None
+
+def get_rag_service() -> RAGService:
+    """Dépendance pour obtenir le service RAG depuis l'état global"""
+    from ...main import app
+    return app.state.rag_service
+
+def get_ingestion_jobs(rag_service: RAGService = Depends(get_rag_service)) -> IngestionJobManager:
+    """Dépendance pour obtenir le gestionnaire d'ingestion"""
+    global ingestion_jobs
+    if ingestion_jobs is None or ingestion_jobs.rag_service is not rag_service:
+        ingestion_jobs = IngestionJobManager(rag_service, settings.rag_ingest_jobs_path)
+    return ingestion_jobs
+
+@router.post("/ingest", response_model=Dict[str, Any])
+async def ingest_knowledge(
+    request: Request,
+    job_id: Optional[str] = Query(None, description="Identifiant du job (généré si absent)"),
+    namespace: Optional[str] = Query(None, description="Namespace des documents sans namespace"),
+    rag_service: RAGService = Depends(get_rag_service),
+    jobs: IngestionJobManager = Depends(get_ingestion_jobs)
+) -> Dict[str, Any]:
+    """
+    Ingère un flux de documents dans la base de connaissances
+
+    Corps NDJSON (application/x-ndjson), une ligne par document :
+    `{"content": "...", "source": "...", "metadata": {...}, "version": 3, "namespace": "..."}`
+
+    Ou multipart/form-data : fichiers .ndjson/.jsonl (même format), ou un
+    document par fichier texte (la source est le nom du fichier). Les
+    parties sont décodées au fil de la réception, sans mise en tampon.
+
+    Le corps est lu au fur et à mesure de l'indexation ; l'avancement est
+    consultable pendant l'envoi via GET /ingest/{job_id}. Une source déjà
+    indexée est remplacée (voir add_knowledge_runtime). L'avancement est
+    partagé entre les workers (settings.rag_ingest_jobs_path).
+
+    Retourne le rapport du job : documents indexés, ignorés, en erreur.
+    """
+    if not rag_service or not rag_service.initialized:
+        raise HTTPException(status_code=503, detail="Le service RAG n'est pas encore initialisé")
+
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        boundary = multipart_boundary(content_type)
+        if boundary is None:
+            raise HTTPException(status_code=400, detail="Délimiteur multipart absent du Content-Type")
+        documents = iter_multipart(request.stream(), boundary, settings.rag_ingest_max_line_bytes)
+    else:
+        documents = iter_ndjson(request.stream(), settings.rag_ingest_max_line_bytes)
+
+    try:
+        job = jobs.create_job(job_id)
+    except IngestionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    logger.info(f"Ingestion {job['job_id']} démarrée")
+
+    return await jobs.run(job, documents, namespace=namespace)
+
+@router.get("/ingest", response_model=List[Dict[str, Any]])
+async def list_ingestion_jobs(jobs: IngestionJobManager = Depends(get_ingestion_jobs)) -> List[Dict[str, Any]]:
+    """Jobs d'ingestion en cours et récents (du plus récent au plus ancien)"""
+    return jobs.list_jobs()
+
+@router.get("/ingest/{job_id}", response_model=Dict[str, Any])
+async def get_ingestion_job(job_id: str, jobs: IngestionJobManager = Depends(get_ingestion_jobs)) -> Dict[str, Any]:
+    """Avancement d'un job d'ingestion"""
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job d'ingestion {job_id} introuvable")
+    return job
+
+@router.get("/products", response_model=Dict[str, Any])
+async def search_products(
+    q: Optional[str] = Query(None, description="Requête, ex: \"portables à moins de 1000€\""),
+    category: Optional[List[str]] = Query(None, description="Catégories (valeurs exactes)"),
+    brand: Optional[List[str]] = Query(None, description="Marques (valeurs exactes)"),
+    min_price: Optional[float] = Query(None, ge=0, description="Prix minimum"),
+    max_price: Optional[float] = Query(None, ge=0, description="Prix maximum"),
+    sort: Optional[str] = Query(None, description="relevance, price_asc, price_desc ou name"),
+    top_k: int = Query(10, ge=1, le=100, description="Nombre de produits retournés"),
+    rag_service: RAGService = Depends(get_rag_service)
+) -> Dict[str, Any]:
+    """
+    Recherche structurée dans le catalogue de produits
+    
+    Les contraintes de prix, catégorie et marque de la requête sont appliquées
+    comme filtres exacts (les paramètres explicites sont prioritaires) ; seul
+    le texte libre restant est classé par similarité.
+    
+    Retourne les produits, le nombre total de produits filtrés, les facettes
+    (comptes par catégorie, marque et tranche de prix) et les filtres appliqués.
+    """
+    if not rag_service or not rag_service.initialized:
+        raise HTTPException(status_code=503, detail="Le service RAG n'est pas encore initialisé")
+    
+    try:
+        return await rag_service.search_products(
+            q, top_k, category=category, brand=brand,
+            min_price=min_price, max_price=max_price, sort=sort
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Erreur lors de la recherche de produits: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la recherche de produits: {str(e)}")
@@ -289,32 +289,40 @@ async def chat_with_session(
         rag_service = get_rag_service()
         if rag_service and rag_service.initialized:
             try:
-                # Recherche de connaissances pertinentes
-                knowledge_results = await rag_service.search_knowledge(request.message, top_k=3)
+                # Recherche groupée : un seul encodage du message pour toutes les collections
+                rag_results = await rag_service.multi_search(
+                    request.message,
+                    {"knowledge_base": 3, "ui_components": 2, "image_catalog": 3},
+                    namespace=enriched_context.get("namespace")
+                )
+                logger.debug(f"Recherche RAG groupée: {rag_results['timings']}")
+                
+                # Connaissances pertinentes (chunks contigus fusionnés, budget de caractères)
+                knowledge_results = rag_service.build_knowledge_context(rag_results["results"]["knowledge_base"])
                 if knowledge_results:
                     enriched_context["relevant_knowledge"] = [
                         {
-                            "content": result["content"][:500] + "..." if len(result["content"]) > 500 else result["content"],
-                            "score": result["score"],
+                            "content": result["content"],
+                            "score": result.get("relevance_score", 0),
                             "metadata": result.get("metadata", {})
                         }
                         for result in knowledge_results
                     ]
                 
-                # Recherche de composants UI pertinents
-                ui_results = await rag_service.search_ui_components(request.message, top_k=2)
+                # Composants UI pertinents
+                ui_results = rag_results["results"]["ui_components"]
                 if ui_results:
                     enriched_context["relevant_ui_components"] = [
                         {
-                            "name": result.get("metadata", {}).get("name", "Unknown"),
-                            "type": result.get("metadata", {}).get("type", "Unknown"),
-                            "score": result["score"]
+                            "name": result.get("name", "Unknown"),
+                            "type": result.get("type", "Unknown"),
+                            "score": result.get("relevance_score", 0)
                         }
                         for result in ui_results
                     ]
                 
-                # Recherche d'images pertinentes
-                image_results = await rag_service.search_images(request.message, top_k=3)
+                # Images pertinentes
+                image_results = rag_results["results"]["image_catalog"]
                 if image_results:
                     enriched_context["relevant_images"] = [
                         {
@@ -326,6 +334,23 @@ async def chat_with_session(
                         }
                         for result in image_results
                     ]
+                
+                # Produits filtrés exactement (prix, catégorie, marque) pour les questions de catalogue
+                product_results = await rag_service.search_products(request.message, top_k=5, require_filters=True)
+                if product_results is not None:
+                    enriched_context["matching_products"] = {
+                        "filters": product_results["filters"],
+                        "total": product_results["total"],
+                        "products": [
+                            {
+                                "name": product["name"],
+                                "category": product["category"],
+                                "brand": product["brand"],
+                                "price": product["price"]
+                            }
+                            for product in product_results["products"]
+                        ]
+                    }
                     
             except Exception as e:
                 logger.warning(f"Erreur lors de l'enrichissement RAG: {e}")
@@ -63,8 +63,9 @@ async def generate_ui(
         if not ui_service.initialized:
             await ui_service.initialize()
         
+        # Le RAG s'initialise en tâche de fond : génération sans contexte RAG en attendant
         if rag_service and not rag_service.initialized:
-            await rag_service.initialize()
+            logger.warning(f"Service RAG non prêt (phase: {rag_service.phase}), génération sans composants RAG")
         
         # Génération de l'UI
         response = await ui_service.generate_ui_layout(
@@ -95,51 +96,60 @@ async def search_ui_components(
     
     - **query**: Requête de recherche
     - **component_type**: Type de composant (optionnel)
+    - **namespace**: Namespace (boutique, domaine) des composants (optionnel)
     - **limit**: Nombre maximum de résultats (défaut: 10)
+    - **diversify**: Écarte les composants quasi identiques (reranking MMR, optionnel)
     
     Retourne une liste de composants UI avec leurs métadonnées
     """
     try:
         query = request.get("query", "")
         component_type = request.get("component_type")
+        namespace = request.get("namespace")
         limit = request.get("limit", 10)
+        diversify = request.get("diversify")
         
         if not query:
             raise HTTPException(status_code=400, detail="La requête est requise")
         
         logger.info(f"Recherche de composants UI pour: {query}")
         
-        # Initialisation du service RAG si nécessaire
+        # Service RAG encore en cours d'initialisation
         if not rag_service.initialized:
-            await rag_service.initialize()
-        
-        # Recherche des composants
-        results = await rag_service.search_ui_components(query, limit=limit)
-        
-        # Filtrage par type si spécifié
-        if component_type:
-            results = [
-                result for result in results
-                if result.get("metadata", {}).get("type") == component_type
-            ]
+            raise HTTPException(
+                status_code=503,
+                detail=f"Service RAG non disponible (phase: {rag_service.phase})",
+                headers={"Retry-After": "5"}
+            )
+        
+        # Recherche des composants (filtre de type appliqué dans la base vectorielle)
+        results = await rag_service.search_ui_components(
+            query,
+            top_k=limit,
+            where={"type": component_type} if component_type else None,
+            namespace=namespace,
+            diversify=diversify
+        )
         
-        # Formatage des résultats
+        # Formatage des résultats (composants hydratés par le service RAG)
         formatted_results = []
         for result in results:
-            metadata = result.get("metadata", {})
+            description = result.get("description", "")
             formatted_results.append({
-                "name": metadata.get("name", "Unknown"),
-                "type": metadata.get("type", "Unknown"),
-                "description": result.get("content", "")[:200] + "..." if len(result.get("content", "")) > 200 else result.get("content", ""),
-                "props": metadata.get("props", {}),
-                "variants": metadata.get("variants", []),
-                "score": result.get("score", 0.0),
-                "category": metadata.get("category", "general")
+                "name": result.get("name", "Unknown"),
+                "type": result.get("type", "Unknown"),
+                "description": description[:200] + "..." if len(description) > 200 else description,
+                "props": result.get("props", {}),
+                "variants": result.get("variants", []),
+                "score": result.get("relevance_score", 0.0),
+                "category": result.get("category", "general")
             })
         
         logger.info(f"Trouvé {len(formatted_results)} composants")
         return formatted_results
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erreur lors de la recherche de composants: {e}")
         raise HTTPException(
@@ -0,0 +1,195 @@
+"""Mesure de l'impact de la quantification des vecteurs sur le rappel
+
+Compare la recherche exacte float32 à float16 et int8, avec et sans
+recalcul float32 des meilleurs candidats, sur les vecteurs d'un artefact
+construit par build_index ou sur un jeu synthétique regroupé en clusters.
+
+Chaque mode est mesuré sur un vrai artefact écrit dans un répertoire
+temporaire et interrogé par ArtifactCollection : taille sur disque des
+fichiers parcourus (vecteurs float32 ou codes) et du fichier froid float32,
+et mémoire résidente des fichiers projetés après les requêtes (lue dans
+/proc/self/smaps, Linux uniquement).
+
+    uv run python -m src.intentlayer_aiserver.benchmark_quantization --artifact data/index_artifact
+    uv run python -m src.intentlayer_aiserver.benchmark_quantization --rows 200000 --dimension 384
+"""
+
+import argparse
+import re
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional, List
+
+import numpy as np
+
+from .core.config import settings
+from .services.index_artifact import read_artifact_manifest, write_index_artifact, ArtifactVectorStore
+from .services.quantization import QUANTIZATION_TYPES, quantize, approximate_scores
+
+BENCHMARK_COLLECTION = "benchmark"
+# Fichiers d'un segment parcourus par le premier passage de la recherche
+SCANNED_FILES = ('vectors', 'codes', 'scales')
+
+_SMAPS_HEADER = re.compile(r"^[0-9a-f]+-[0-9a-f]+ ")
+
+
+def synthetic_vectors(rows: int, dimension: int, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """Vecteurs normalisés regroupés autour de centres, proches d'un corpus de chunks"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, rows)] + 0.6 * rng.standard_normal((rows, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def artifact_vectors(path: str, collection: Optional[str] = None) -> np.ndarray:
+    """Vecteurs float32 des segments de base d'un artefact"""
+    manifest = read_artifact_manifest(path)
+    names = [collection] if collection else list(manifest['collections'])
+    blocks = [
+        np.load(Path(path) / (description.get('vectors') or description['rescore']))
+        for description in (manifest['collections'][name] for name in names) if description['count']
+    ]
+    if not blocks:
+        raise ValueError(f"Aucun vecteur dans l'artefact {path}")
+    return np.concatenate(blocks)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    return top[np.argsort(-scores[top])]
+
+
+def resident_bytes(directory: Path) -> Optional[int]:
+    """Pages des fichiers de `directory` projetées en mémoire et résidentes dans ce processus"""
+    try:
+        with open("/proc/self/smaps", 'r') as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    total, inside = 0, False
+    prefix = str(directory)
+    for line in lines:
+        if _SMAPS_HEADER.match(line):
+            fields = line.split()
+            inside = len(fields) >= 6 and fields[5].startswith(prefix)
+        elif inside and line.startswith("Rss:"):
+            total += int(line.split()[1]) * 1024
+    return total
+
+
+def measure_artifact(vectors: np.ndarray, queries: np.ndarray, quantization: str, top_k: int,
+                     rescore_factor: int, exact: List[set]) -> Dict[str, Any]:
+    """Écrit un artefact, l'interroge par ArtifactCollection et mesure disque, mémoire et rappel"""
+    directory = Path(tempfile.mkdtemp(prefix="benchmark_quantization."))
+    try:
+        count = len(vectors)
+        write_index_artifact(str(directory / "artifact"), {BENCHMARK_COLLECTION: {
+            'ids': [str(row) for row in range(count)],
+            'embeddings': vectors,
+            'documents': [None] * count,
+            'metadatas': [{}] * count
+        }}, "benchmark", quantization)
+        artifact = directory / "artifact"
+        description = read_artifact_manifest(str(artifact))['collections'][BENCHMARK_COLLECTION]
+        sizes = {key: (artifact / description[key]).stat().st_size for key in ('vectors', 'codes', 'scales', 'rescore')
+                 if description.get(key)}
+
+        collection = ArtifactVectorStore(str(artifact), rescore_factor=rescore_factor).get_or_create_collection(
+            BENCHMARK_COLLECTION
+        )
+        hits = 0
+        started = time.perf_counter()
+        for query, expected in zip(queries, exact):
+            found = collection.query([query], n_results=top_k, include=["distances"])['ids'][0]
+            hits += len(expected.intersection(int(chunk_id) for chunk_id in found))
+        elapsed = time.perf_counter() - started
+        resident = resident_bytes(artifact)
+
+        return {
+            'recall': hits / (top_k * len(queries)),
+            'scanned_mb': sum(size for key, size in sizes.items() if key in SCANNED_FILES) / 1e6,
+            'cold_mb': sizes.get('rescore', 0) / 1e6,
+            'disk_mb': sum(path.stat().st_size for path in artifact.iterdir()) / 1e6,
+            'resident_mb': resident / 1e6 if resident is not None else None,
+            'latency_ms': 1000 * elapsed / len(queries)
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run_benchmark(vectors: np.ndarray, queries: np.ndarray, top_k: int = 10,
+                  rescore_factor: int = 4) -> List[Dict[str, Any]]:
+    """Rappel@k, taille sur disque, mémoire résidente et latence de chaque mode
+
+    Les modes float32 et « + rescore » sont mesurés sur un artefact réel ;
+    les modes quantifiés sans recalcul classent en mémoire sur les codes
+    (rappel du premier passage seul).
+    """
+    top_k = min(top_k, len(vectors))
+    exact = [set(_top_k(vectors @ query, top_k).tolist()) for query in queries]
+    results = []
+
+    for quantization in QUANTIZATION_TYPES:
+        measured = measure_artifact(vectors, queries, quantization, top_k, rescore_factor, exact)
+        if quantization != "none":
+            codes, scales = quantize(vectors, quantization)
+            hits = 0
+            started = time.perf_counter()
+            for query, expected in zip(queries, exact):
+                hits += len(expected.intersection(_top_k(approximate_scores(codes, scales, query), top_k).tolist()))
+            results.append({
+                **measured,
+                'mode': quantization,
+                'recall': hits / (top_k * len(queries)),
+                'latency_ms': 1000 * (time.perf_counter() - started) / len(queries)
+            })
+        results.append({**measured, 'mode': quantization + (" + rescore" if quantization != "none" else "")})
+
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare la recherche float32, float16 et int8")
+    parser.add_argument("--artifact", help="Artefact d'index à mesurer (défaut: vecteurs synthétiques)")
+    parser.add_argument("--collection", help="Collection de l'artefact (défaut: toutes)")
+    parser.add_argument("--rows", type=int, default=100000, help="Nombre de vecteurs synthétiques")
+    parser.add_argument("--dimension", type=int, default=384, help="Dimension des vecteurs synthétiques")
+    parser.add_argument("--queries", type=int, default=200, help="Nombre de requêtes")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=settings.rag_rescore_factor)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.artifact:
+            vectors = artifact_vectors(args.artifact, args.collection)
+        else:
+            vectors = synthetic_vectors(args.rows, args.dimension)
+    except Exception as e:
+        print(f"❌ Erreur lors du chargement des vecteurs: {e}", file=sys.stderr)
+        return 1
+
+    # Requêtes : vecteurs du corpus bruités, comme des questions proches d'un chunk
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, len(vectors), args.queries)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(vectors.shape[1])
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+    print(f"{len(vectors)} vecteurs de dimension {vectors.shape[1]}, {len(queries)} requêtes, top {args.top_k}")
+    print(
+        f"{'mode':<18} {'rappel@k':>9} {'disque Mo':>10} {'parcouru Mo':>12} {'froid Mo':>9} "
+        f"{'résident Mo':>12} {'latence ms':>11}"
+    )
+    for row in run_benchmark(vectors, queries, args.top_k, args.rescore_factor):
+        resident = f"{row['resident_mb']:>12.1f}" if row['resident_mb'] is not None else f"{'-':>12}"
+        print(
+            f"{row['mode']:<18} {row['recall']:>9.4f} {row['disk_mb']:>10.1f} {row['scanned_mb']:>12.1f} "
+            f"{row['cold_mb']:>9.1f} {resident} {row['latency_ms']:>11.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
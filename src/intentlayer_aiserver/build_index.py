@@ -0,0 +1,97 @@
+"""Construction hors ligne de l'artefact d'index RAG
+
+Exécute le pipeline d'ingestion complet de RAGService (base de connaissances,
+composants et layouts UI, catalogue d'images) puis écrit un artefact versionné
+que le serveur ouvre en lecture seule via RAG_INDEX_ARTIFACT_PATH.
+
+    uv run python -m src.intentlayer_aiserver.build_index --output data/index_artifact
+"""
+
+import argparse
+import asyncio
+import logging
+import shutil
+import sys
+import tempfile
+from typing import Dict, Any, Optional, List
+
+from .core.config import settings
+from .services.rag_service import RAGService
+from .services.chunk_dedup import DeduplicatedCollection
+from .services.index_artifact import write_index_artifact
+from .services.quantization import QUANTIZATION_TYPES
+
+logger = logging.getLogger(__name__)
+
+
+async def build_index(output_path: str, knowledge_path: Optional[str] = None,
+                      ui_components_path: Optional[str] = None,
+                      embedding_model: Optional[str] = None,
+                      quantization: Optional[str] = None) -> Dict[str, Any]:
+    """Ingère les données dans une base FAISS temporaire et l'exporte en artefact"""
+    work_dir = tempfile.mkdtemp(prefix="intentlayer-index-")
+
+    # Configuration propre au processus de construction
+    settings.vector_db_type = "faiss"
+    settings.faiss_index_type = "flat"
+    settings.vector_db_path = work_dir
+    settings.rag_index_artifact_path = None
+    settings.rag_matrix_index_collections = []
+    if knowledge_path:
+        settings.knowledge_base_path = knowledge_path
+    if ui_components_path:
+        settings.ui_components_path = ui_components_path
+    if embedding_model:
+        settings.embedding_model = embedding_model
+
+    rag_service = RAGService()
+    try:
+        await rag_service.initialize()
+
+        collections = {}
+        for name, collection in rag_service.collections.items():
+            # Lignes stockées seulement : les doublons restent dans les métadonnées de leur chunk canonique
+            if isinstance(collection, DeduplicatedCollection):
+                collection = collection.collection
+            collections[name] = collection.get(include=["embeddings", "documents", "metadatas"])
+        return write_index_artifact(
+            output_path, collections, settings.embedding_model,
+            quantization or settings.rag_vector_quantization
+        )
+
+    finally:
+        await rag_service.cleanup()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Construit l'artefact d'index RAG hors ligne")
+    parser.add_argument("--output", "-o", required=True, help="Répertoire de l'artefact à écrire")
+    parser.add_argument("--knowledge-path", help=f"Base de connaissances (défaut: {settings.knowledge_base_path})")
+    parser.add_argument("--ui-components-path", help=f"Composants et layouts UI (défaut: {settings.ui_components_path})")
+    parser.add_argument("--embedding-model", help=f"Modèle d'embedding (défaut: {settings.embedding_model})")
+    parser.add_argument("--quantization", choices=QUANTIZATION_TYPES,
+                        help=f"Quantification des vecteurs (défaut: {settings.rag_vector_quantization})")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    try:
+        manifest = asyncio.run(build_index(
+            args.output,
+            knowledge_path=args.knowledge_path,
+            ui_components_path=args.ui_components_path,
+            embedding_model=args.embedding_model,
+            quantization=args.quantization
+        ))
+    except Exception as e:
+        logger.error(f"Erreur lors de la construction de l'artefact: {e}")
+        return 1
+
+    counts = ", ".join(f"{name}: {info['count']}" for name, info in manifest['collections'].items())
+    print(f"✅ Artefact écrit dans {args.output} (corpus {manifest['corpus_hash'][:12]}, {manifest['quantization']}, {counts})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
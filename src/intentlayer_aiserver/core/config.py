@@ -1,7 +1,7 @@
 """Configuration du serveur IA IntentLayer"""
 
 from pydantic_settings import BaseSettings
-from typing import Optional, List
+from typing import Optional, List, Dict
 import os
 
 class Settings(BaseSettings):
@@ -38,15 +38,69 @@ class Settings(BaseSettings):
     ollama_timeout: int = 30
     
     # Configuration RAG
-    rag_chunk_size: int = 1000
-    rag_chunk_overlap: int = 200
+    rag_chunking_strategy: str = "markdown"  # markdown (titres, listes, tableaux, taille en tokens) ou recursive (caractères)
+    rag_chunk_max_tokens: int = 256  # Borné par la fenêtre du modèle d'embedding (stratégie markdown)
+    rag_chunk_overlap_tokens: int = 32  # Recouvrement entre morceaux d'un même paragraphe (stratégie markdown)
+    rag_chunk_size: int = 1000  # Stratégie recursive, en caractères
+    rag_chunk_overlap: int = 200  # Stratégie recursive, en caractères
     rag_top_k: int = 5
     rag_similarity_threshold: float = 0.7
+    rag_context_max_chars: int = 1500  # Budget des connaissances injectées dans le contexte du chat (0 = illimité)
+    rag_dedup_enabled: bool = False  # Chunks de connaissances quasi identiques stockés une fois, avec leurs sources (les filtres where ne voient que le chunk canonique)
+    rag_dedup_similarity: float = 0.95  # Similarité cosinus à partir de laquelle deux chunks sont des doublons
+    rag_dedup_max_hamming: int = 10  # Écart SimHash maximal (sur 64 bits) d'un candidat comparé par embedding
+    rag_background_init: bool = True  # Initialisation du RAG en tâche de fond au démarrage (voir /ready)
+    rag_embedding_batch_size: int = 64  # Textes encodés par appel au modèle lors de l'ingestion
+    rag_watch_knowledge: bool = False  # Rechargement à chaud des fichiers de connaissances modifiés (scrutation)
+    rag_watch_interval: float = 2.0  # Intervalle de scrutation du répertoire des connaissances, en secondes
+    rag_watch_batch_size: int = 8  # Chunks encodés par appel au modèle lors d'un rechargement à chaud
+    rag_watch_idle_ms: float = 200.0  # Silence des requêtes exigé avant chaque lot encodé à chaud
+    rag_ingest_batch_documents: int = 32  # Documents écrits par lot par l'ingestion en flux (/api/v1/rag/ingest)
+    rag_ingest_queue_size: int = 256  # Documents en attente avant de suspendre la lecture du flux
+    rag_ingest_max_line_bytes: int = 4_000_000  # Taille maximale d'un document NDJSON, en octets
+    rag_ingest_jobs_kept: int = 100  # Jobs d'ingestion dont l'avancement reste consultable
+    rag_ingest_jobs_path: str = "./data/ingest_jobs"  # État des jobs d'ingestion, partagé entre les workers
+    rag_encoder_batch_window_ms: float = 5.0  # Fenêtre de regroupement des requêtes concurrentes
+    rag_encoder_max_batch_size: int = 32  # Taille maximale d'un lot de requêtes
+    rag_encoder_workers: int = 1  # Threads dédiés au modèle d'embedding
+    rag_embedding_cache_size: int = 2048  # Embeddings de requêtes gardés en cache LRU (0 = désactivé)
+    rag_result_cache_size: int = 1024  # Résultats de recherche gardés en cache (0 = désactivé)
+    rag_result_cache_ttl: float = 300.0  # Durée de vie d'un résultat en cache, en secondes (0 = illimitée)
+    rag_knowledge_search_mode: str = "vector"  # vector, hybrid (BM25 + vecteurs, scores RRF) ou lexical (BM25 seul), sur option
+    rag_hybrid_candidates: int = 20  # Candidats de chaque classement avant fusion
+    rag_rrf_k: int = 60  # Constante de la reciprocal rank fusion
+    rag_mmr_enabled: bool = False  # Reranking MMR (diversité) des recherches sans paramètre diversify explicite
+    rag_mmr_lambda: float = 0.7  # Compromis pertinence / diversité du MMR (1 = pertinence seule)
+    rag_mmr_fetch_factor: int = 4  # Candidats récupérés avant MMR = top_k × facteur
+    rag_product_catalog_files: List[str] = ["product_catalog"]  # Fichiers de connaissances (nom sans extension) indexés aussi en table de produits
+    rag_product_category_aliases: Dict[str, str] = {}  # Synonymes de catégories reconnus dans les requêtes produits, ex: {"laptop": "Ordinateurs Portables"}
+    rag_product_price_buckets: List[float] = [100, 500, 1000, 1500]  # Bornes des tranches de prix de la facette price
     
     # Configuration base vectorielle
     vector_db_type: str = "chroma"  # "chroma", "faiss"
     vector_db_path: str = "./data/vectordb"
+    faiss_index_type: str = "hnsw"  # "flat", "ivf", "hnsw"
+    faiss_hnsw_m: int = 32
+    faiss_hnsw_ef_construction: int = 80
+    faiss_hnsw_ef_search: int = 64
+    faiss_ivf_nlist: int = 256
+    faiss_ivf_nprobe: int = 16
+    rag_matrix_index_collections: List[str] = ["ui_components", "ui_layouts", "image_catalog"]  # Collections recherchées en mémoire
+    rag_default_namespace: str = "default"  # Namespace des documents et items sans namespace explicite
+    rag_namespace_include_default: bool = True  # Le namespace par défaut est partagé : visible depuis chaque namespace
+    rag_namespace_map: Dict[str, str] = {}  # Namespace par fichier de connaissances à la racine (nom sans extension)
+    rag_namespace_index_collections: List[str] = ["knowledge_base"]  # Collections avec un index par namespace, chargé à la première requête
+    rag_index_artifact_path: Optional[str] = None  # Artefact construit par build_index, partagé entre workers (pas d'ingestion)
+    rag_delta_merge_interval: float = 60.0  # Fusion des ajouts de chaque worker dans l'artefact, en secondes
+    rag_delta_max_rows: int = 1000  # Taille du delta déclenchant une fusion immédiate
+    rag_vector_quantization: str = "none"  # Quantification des vecteurs de l'artefact: none, float16, int8
+    rag_rescore_factor: int = 4  # Candidats recalculés en float32 = top_k × facteur (artefact quantifié)
     embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    embedding_server_enabled: bool = False  # Modèle porté par un processus partagé entre workers (socket Unix)
+    embedding_server_socket: str = "/tmp/intentlayer-embedding.sock"
+    embedding_server_start_timeout: float = 120.0  # Attente du chargement du modèle au lancement, en secondes
+    embedding_server_health_interval: float = 10.0  # Intervalle des vérifications de santé, en secondes
+    embedding_server_idle_timeout: float = 300.0  # Arrêt du serveur sans requête d'aucun worker, en secondes
     
     # Configuration spaCy
     spacy_model: str = "fr_core_news_sm"  # Modèle français
@@ -0,0 +1,14 @@
+"""Point d'entrée du processus serveur d'embeddings
+
+Lancé par EmbeddingServerSupervisor ; n'importe que le serveur et
+l'exécuteur d'embeddings (ni ChromaDB, ni FAISS, ni le service RAG).
+
+    python -m src.intentlayer_aiserver.embedding_server --socket /tmp/intentlayer-embedding.sock --model all-MiniLM-L6-v2
+"""
+
+import sys
+
+from .services.embedding_server import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,13 +3,14 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 import uvicorn
 from dotenv import load_dotenv
 import os
 from pathlib import Path
 
-from .api.v1 import nlp, ui_generator, memory, sessions
+from .api.v1 import nlp, ui_generator, memory, sessions, rag
 from .core.config import settings
 from .services.rag_service import RAGService
 from .services.session_service import SessionService
@@ -29,10 +30,14 @@ async def lifespan(app: FastAPI):
     # Initialisation au démarrage
     print("🚀 Initialisation du serveur IA IntentLayer...")
     
-    # Initialisation du service RAG
+    # Initialisation du service RAG (en tâche de fond : le port est ouvert sans attendre
+    # le chargement du modèle ni l'ingestion ; voir /health et /ready)
     rag_service = RAGService()
-    await rag_service.initialize()
     app.state.rag_service = rag_service
+    if settings.rag_background_init:
+        rag_service.start_background_initialization()
+    else:
+        await rag_service.initialize()
     
     # Initialisation du service de sessions
     session_service = SessionService()
@@ -73,6 +78,7 @@ app.include_router(nlp.router, prefix="/api/v1/nlp", tags=["NLP"])
 app.include_router(ui_generator.router, prefix="/api/v1/ui", tags=["UI Generator"])
 app.include_router(memory.router, prefix="/api/v1/memory", tags=["Memory"])
 app.include_router(sessions.router, prefix="/api/v1/sessions", tags=["Sessions"])
+app.include_router(rag.router, prefix="/api/v1/rag", tags=["RAG"])
 
 # Montage des fichiers statiques pour l'audio
 audio_path = Path(settings.memory_path) / "audio"
@@ -96,19 +102,34 @@ async def root():
             "ui_generator": "/api/v1/ui",
             "memory": "/api/v1/memory",
             "sessions": "/api/v1/sessions",
+            "rag": "/api/v1/rag",
             "docs": "/docs"
         }
     }
 
 @app.get("/health")
 async def health_check():
-    """Vérification de l'état de santé du serveur"""
+    """Vérification de l'état de santé du serveur (répond pendant l'initialisation du RAG)"""
     return {
         "status": "healthy",
-        "rag_service": "initialized" if rag_service else "not_initialized",
+        "rag_service": rag_service.phase if rag_service else "not_initialized",
+        "rag_initialization": rag_service.get_status() if rag_service else None,
         "session_service": "initialized" if session_service else "not_initialized"
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Disponibilité du serveur : 503 tant que le service RAG n'est pas prêt"""
+    ready = bool(rag_service and rag_service.initialized and session_service)
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "rag_service": rag_service.phase if rag_service else "not_initialized",
+            "session_service": "initialized" if session_service else "not_initialized"
+        }
+    )
+
 if __name__ == "__main__":
     uvicorn.run(
         "src.intentlayer_aiserver.main:app",
@@ -1,13 +1,22 @@
-"""Services pour le serveur IA IntentLayer"""
-
-from .rag_service import RAGService
-from .nlp_service import NLPService
-from .ui_generator import UIGeneratorService
-from .memory_service import MemoryService
-
-__all__ = [
-    "RAGService",
-    "NLPService", 
-    "UIGeneratorService",
-    "MemoryService"
-]
\ No newline at end of file
+"""Services pour le serveur IA IntentLayer
+
+Les services sont importés à la première utilisation : un module léger du
+paquet (serveur d'embeddings) se charge sans ChromaDB, FAISS ni le service RAG.
+"""
+
+from importlib import import_module
+
+_SERVICES = {
+    "RAGService": ".rag_service",
+    "NLPService": ".nlp_service",
+    "UIGeneratorService": ".ui_generator",
+    "MemoryService": ".memory_service"
+}
+
+__all__ = list(_SERVICES)
+
+
+def __getattr__(name):
+    if name not in _SERVICES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(_SERVICES[name], __name__), name)
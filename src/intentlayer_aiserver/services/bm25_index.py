@@ -0,0 +1,156 @@
+"""Index lexical BM25 (index inversé) pour la base de connaissances"""
+
+import math
+import re
+import threading
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+import logging
+
+from .rag_cache import fold_accents
+from .vector_store import CollectionObserver, matches_where
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+")
+# "1 229€" et "1.229€" sont indexés comme "1229"
+_DIGIT_GROUP_RE = re.compile(r"(?<=\d)[ .\u00a0\u202f](?=\d{3}(?!\w))")
+
+STOPWORDS = frozenset("""
+a au aux avec ce ces c d de des du elle en est et il ils j je l la le les leur lui m ma mais me
+mes mon n ne nos notre nous on ou par pas pour qu que quel quelle quelles quels qui s sa se ses
+son sont sur t ta te tes ton tu un une vos votre vous y
+the of and or to in is are for on with
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Découpe un texte en termes normalisés (casse, accents, mots vides)"""
+    text = _DIGIT_GROUP_RE.sub('', fold_accents(text).lower())
+    return [token for token in _TOKEN_RE.findall(text) if token not in STOPWORDS]
+
+
+class BM25Index(CollectionObserver):
+    """Index inversé BM25 construit sur les mêmes chunks que la collection vectorielle
+
+    L'index est chargé au démarrage depuis la collection puis tenu à jour par
+    les notifications d'écriture (ingestion, ajouts à l'exécution). Il garde
+    aussi le texte et les métadonnées des chunks, ce qui permet de servir une
+    recherche purement lexicale sans interroger la base vectorielle.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents: Dict[str, str] = {}
+        self.metadatas: Dict[str, Dict[str, Any]] = {}
+        self.lengths: Dict[str, int] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def load_collection(self, collection):
+        """Indexe tous les chunks existants d'une collection"""
+        existing = collection.get(include=["documents", "metadatas"])
+        with self._lock:
+            self.documents.clear()
+            self.metadatas.clear()
+            self.lengths.clear()
+            self.postings.clear()
+            self.total_length = 0
+            self.on_upsert(collection.name, existing['ids'], existing['documents'], existing['metadatas'])
+        logger.info(f"Index BM25 {collection.name}: {len(self)} chunks, {len(self.postings)} termes")
+
+    def _add(self, chunk_id: str, document: str, metadata: Optional[Dict[str, Any]]):
+        terms = Counter(tokenize(document or ''))
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[chunk_id] = frequency
+        self.documents[chunk_id] = document or ''
+        self.metadatas[chunk_id] = metadata or {}
+        self.lengths[chunk_id] = sum(terms.values())
+        self.total_length += self.lengths[chunk_id]
+
+    def _remove(self, chunk_id: str):
+        document = self.documents.pop(chunk_id, None)
+        if document is None:
+            return
+        self.metadatas.pop(chunk_id, None)
+        self.total_length -= self.lengths.pop(chunk_id, 0)
+        for term in set(tokenize(document)):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(chunk_id, None)
+            if not postings:
+                del self.postings[term]
+
+    def get(self, chunk_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Retourne (document, métadonnées) d'un chunk indexé"""
+        with self._lock:
+            if chunk_id not in self.documents:
+                return None
+            return self.documents[chunk_id], self.metadatas[chunk_id]
+
+    def search(self, query: str, top_k: int,
+               where: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """Retourne les (id, score BM25) des top_k meilleurs chunks, par score décroissant"""
+        terms = set(tokenize(query))
+        with self._lock:
+            total = len(self.documents)
+            if not terms or total == 0 or top_k <= 0:
+                return []
+
+            average_length = self.total_length / total or 1.0
+            scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / average_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+            if where:
+                scores = {
+                    chunk_id: score for chunk_id, score in scores.items()
+                    if matches_where(self.metadatas[chunk_id], where)
+                }
+
+        return sorted(scores.items(), key=lambda hit: hit[1], reverse=True)[:top_k]
+
+    def on_upsert(self, collection_name, ids, documents, metadatas):
+        with self._lock:
+            for i, chunk_id in enumerate(ids):
+                previous = self.get(chunk_id)
+                document = documents[i] if documents is not None else (previous[0] if previous else '')
+                metadata = metadatas[i] if metadatas is not None else (previous[1] if previous else {})
+                self._remove(chunk_id)
+                self._add(chunk_id, document, metadata)
+
+    def on_update(self, collection_name, ids, documents, metadatas):
+        with self._lock:
+            known = [i for i, chunk_id in enumerate(ids) if chunk_id in self.documents]
+            self.on_upsert(
+                collection_name,
+                [ids[i] for i in known],
+                [documents[i] for i in known] if documents is not None else None,
+                [metadatas[i] for i in known] if metadatas is not None else None
+            )
+
+    def on_delete(self, collection_name, ids):
+        with self._lock:
+            for chunk_id in ids:
+                self._remove(chunk_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Statistiques de l'index"""
+        with self._lock:
+            return {
+                'chunks': len(self.documents),
+                'terms': len(self.postings),
+                'average_length': round(self.total_length / len(self.documents), 2) if self.documents else 0.0
+            }
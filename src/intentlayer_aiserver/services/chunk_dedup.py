@@ -0,0 +1,429 @@
+"""Détection des chunks quasi identiques de la base de connaissances (SimHash + embeddings)"""
+
+import hashlib
+import json
+import re
+import threading
+from typing import List, Dict, Any, Optional, Set, Tuple
+import logging
+
+import numpy as np
+
+from .vector_store import VectorCollection, DEFAULT_INCLUDE, matches_where
+from .namespace_index import NAMESPACE_KEY
+
+logger = logging.getLogger(__name__)
+
+# Métadonnée d'un chunk canonique listant ses doublons (JSON : [{id, document, metadata}])
+DUPLICATES_KEY = "duplicates"
+
+SIMHASH_BITS = 64
+# Bandes de la signature : deux signatures à moins de SIMHASH_BANDS bits d'écart partagent une bande
+SIMHASH_BANDS = 6
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_BIT_SHIFTS = np.arange(SIMHASH_BITS, dtype=np.uint64)
+_BAND_EDGES = np.linspace(0, SIMHASH_BITS, SIMHASH_BANDS + 1).astype(int)
+
+
+def simhash(text: str) -> int:
+    """Signature SimHash 64 bits des mots et bigrammes d'un texte"""
+    words = _WORD_RE.findall(text.lower())
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    if not features:
+        return 0
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+         for feature in features),
+        dtype=np.uint64, count=len(features)
+    )
+    bits = (hashes[:, None] >> _BIT_SHIFTS) & np.uint64(1)
+    weights = 2 * bits.sum(axis=0, dtype=np.int64) - len(features)
+    return sum(1 << int(bit) for bit in np.flatnonzero(weights > 0))
+
+
+def simhash_bands(signature: int) -> List[Tuple[int, int]]:
+    """(indice, valeur) de chaque bande de la signature"""
+    return [
+        (band, (signature >> int(start)) & ((1 << int(end - start)) - 1))
+        for band, (start, end) in enumerate(zip(_BAND_EDGES[:-1], _BAND_EDGES[1:]))
+    ]
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def decode_duplicates(metadata: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Doublons enregistrés dans les métadonnées d'un chunk canonique"""
+    raw = (metadata or {}).get(DUPLICATES_KEY)
+    if not raw:
+        return []
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return []
+
+
+def with_source_references(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Métadonnées d'un résultat : la liste `sources` remplace les doublons encodés"""
+    if DUPLICATES_KEY not in metadata:
+        return metadata
+    sources = [metadata.get('source')] + [
+        record['metadata'].get('source') for record in decode_duplicates(metadata)
+    ]
+    result = {key: value for key, value in metadata.items() if key != DUPLICATES_KEY}
+    result['sources'] = [source for source in dict.fromkeys(sources) if source]
+    return result
+
+
+class DeduplicatedCollection(VectorCollection):
+    """Collection qui ne stocke qu'une fois les chunks quasi identiques
+
+    Un chunk écrit est comparé aux chunks du même namespace dont la
+    signature SimHash est proche (préfiltre par bandes, sans parcourir la
+    collection), puis confirmé par la similarité cosinus des embeddings.
+    Un doublon n'occupe pas de ligne : il est enregistré (id, texte,
+    métadonnées) dans la métadonnée `duplicates` du chunk canonique et reste
+    visible par get() et delete() sous son propre id. La suppression d'un
+    chunk canonique, ou la réécriture de son texte, promeut son premier
+    doublon sur une ligne propre, avec le vecteur du chunk ; les autres
+    doublons lui sont rattachés.
+
+    Les filtres where d'une requête vectorielle ne voient que les
+    métadonnées du chunk canonique : un doublon d'une autre source n'est pas
+    trouvé par un filtre sur sa source.
+    """
+
+    def __init__(self, collection, similarity: float = 0.95, max_hamming: int = 10):
+        self.collection = collection
+        self.name = collection.name
+        self.similarity = similarity
+        self.max_hamming = max_hamming
+        self.aliases: Dict[str, str] = {}
+        self.duplicates: Dict[str, List[Dict[str, Any]]] = {}
+        self.signatures: Dict[str, Tuple[Optional[str], int]] = {}
+        self.buckets: Dict[Tuple[Optional[str], int, int], Set[str]] = {}
+        self._lock = threading.RLock()
+
+    def load(self):
+        """Reconstruit signatures et doublons depuis la collection"""
+        with self._lock:
+            self.aliases.clear()
+            self.duplicates.clear()
+            self.signatures.clear()
+            self.buckets.clear()
+            existing = self.collection.get(include=["documents", "metadatas"])
+            for chunk_id, document, metadata in zip(existing['ids'], existing['documents'], existing['metadatas']):
+                self._register(chunk_id, document, metadata)
+                records = decode_duplicates(metadata)
+                if records:
+                    self.duplicates[chunk_id] = records
+                    for record in records:
+                        self.aliases[record['id']] = chunk_id
+            if self.aliases:
+                logger.info(f"{self.name}: {len(self.aliases)} doublons rattachés à {len(self.duplicates)} chunks")
+
+    # Signatures
+
+    def _register(self, chunk_id: str, document: Optional[str], metadata: Optional[Dict[str, Any]]):
+        self._unregister(chunk_id)
+        namespace = (metadata or {}).get(NAMESPACE_KEY)
+        signature = simhash(document or "")
+        self.signatures[chunk_id] = (namespace, signature)
+        for band, value in simhash_bands(signature):
+            self.buckets.setdefault((namespace, band, value), set()).add(chunk_id)
+
+    def _unregister(self, chunk_id: str):
+        previous = self.signatures.pop(chunk_id, None)
+        if previous is None:
+            return
+        namespace, signature = previous
+        for band, value in simhash_bands(signature):
+            bucket = self.buckets.get((namespace, band, value))
+            if bucket is not None:
+                bucket.discard(chunk_id)
+                if not bucket:
+                    del self.buckets[(namespace, band, value)]
+
+    def _candidates(self, namespace: Optional[str], signature: int) -> List[str]:
+        candidates = set()
+        for band, value in simhash_bands(signature):
+            candidates.update(self.buckets.get((namespace, band, value), ()))
+        return [
+            chunk_id for chunk_id in candidates
+            if hamming_distance(self.signatures[chunk_id][1], signature) <= self.max_hamming
+        ]
+
+    def _best_match(self, vector: np.ndarray, candidates: List[str],
+                    pending: Dict[str, np.ndarray]) -> Optional[str]:
+        """Candidat dont l'embedding dépasse le seuil de similarité (le plus proche)"""
+        if not candidates:
+            return None
+        vectors = {chunk_id: pending[chunk_id] for chunk_id in candidates if chunk_id in pending}
+        stored = [chunk_id for chunk_id in candidates if chunk_id not in pending]
+        if stored:
+            existing = self.collection.get(ids=stored, include=["embeddings"])
+            for chunk_id, embedding in zip(existing['ids'], existing['embeddings']):
+                vectors[chunk_id] = _normalize(embedding)
+        if not vectors:
+            return None
+        ids = list(vectors)
+        scores = np.stack([vectors[chunk_id] for chunk_id in ids]) @ vector
+        best = int(np.argmax(scores))
+        return ids[best] if scores[best] >= self.similarity else None
+
+    # Doublons
+
+    def _record(self, alias_id: str) -> Dict[str, Any]:
+        return next(record for record in self.duplicates[self.aliases[alias_id]] if record['id'] == alias_id)
+
+    def _detach(self, alias_id: str) -> str:
+        canonical = self.aliases.pop(alias_id)
+        records = [record for record in self.duplicates[canonical] if record['id'] != alias_id]
+        if records:
+            self.duplicates[canonical] = records
+        else:
+            del self.duplicates[canonical]
+        return canonical
+
+    def _with_duplicates(self, chunk_id: str, metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        metadata = {key: value for key, value in (metadata or {}).items() if key != DUPLICATES_KEY}
+        if self.duplicates.get(chunk_id):
+            metadata[DUPLICATES_KEY] = json.dumps(self.duplicates[chunk_id], ensure_ascii=False)
+        return metadata
+
+    def _save_duplicates(self, canonical_ids: List[str]):
+        """Réécrit la liste des doublons dans les métadonnées des chunks canoniques"""
+        if not canonical_ids:
+            return
+        existing = self.collection.get(ids=canonical_ids, include=["metadatas"])
+        if existing['ids']:
+            self.collection.update(
+                ids=existing['ids'],
+                metadatas=[
+                    self._with_duplicates(chunk_id, metadata)
+                    for chunk_id, metadata in zip(existing['ids'], existing['metadatas'])
+                ]
+            )
+
+    def _promote(self, canonical_ids: List[str], vectors: Dict[str, Any]):
+        """Donne au premier doublon de chaque chunk une ligne propre, avec le vecteur du chunk"""
+        replacements = []
+        for chunk_id in canonical_ids:
+            first, *others = self.duplicates.pop(chunk_id)
+            del self.aliases[first['id']]
+            if others:
+                self.duplicates[first['id']] = others
+                for record in others:
+                    self.aliases[record['id']] = first['id']
+            if chunk_id in vectors:
+                replacements.append((first, vectors[chunk_id]))
+
+        if replacements:
+            self.collection.upsert(
+                ids=[record['id'] for record, _ in replacements],
+                embeddings=np.asarray([vector for _, vector in replacements], dtype=np.float32),
+                documents=[record['document'] for record, _ in replacements],
+                metadatas=[self._with_duplicates(record['id'], record['metadata']) for record, _ in replacements]
+            )
+            for record, _ in replacements:
+                self._register(record['id'], record['document'], record['metadata'])
+
+    def _rehome_replaced(self, ids, documents):
+        """Promeut les doublons des chunks canoniques dont le texte est réécrit"""
+        if documents is None:
+            return
+        new_documents = {
+            chunk_id: documents[i] for i, chunk_id in enumerate(ids)
+            if chunk_id not in self.aliases and self.duplicates.get(chunk_id)
+        }
+        if not new_documents:
+            return
+        existing = self.collection.get(ids=list(new_documents), include=["documents", "embeddings"])
+        replaced = [
+            chunk_id for chunk_id, document in zip(existing['ids'], existing['documents'])
+            if document != new_documents[chunk_id]
+        ]
+        if replaced:
+            self._promote(replaced, dict(zip(existing['ids'], existing['embeddings'])))
+
+    # Écritures
+
+    def count(self) -> int:
+        return self.collection.count() + len(self.aliases)
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        with self._lock:
+            existing = set(self.get(ids=ids, include=[])['ids'])
+            new = [i for i, chunk_id in enumerate(ids) if chunk_id not in existing]
+            if new:
+                self.upsert(
+                    [ids[i] for i in new],
+                    [embeddings[i] for i in new],
+                    [documents[i] for i in new] if documents is not None else None,
+                    [metadatas[i] for i in new] if metadatas is not None else None
+                )
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        with self._lock:
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+            self._rehome_replaced(ids, documents)
+            pending: Dict[str, np.ndarray] = {}
+            written = []
+            changed = set()
+
+            for i, chunk_id in enumerate(ids):
+                document = documents[i] if documents is not None else ""
+                metadata = dict(metadatas[i] or {}) if metadatas is not None else {}
+                metadata.pop(DUPLICATES_KEY, None)
+
+                if chunk_id in self.aliases:
+                    record = self._record(chunk_id)
+                    if record['document'] == document:
+                        record['metadata'] = metadata
+                        changed.add(self.aliases[chunk_id])
+                        continue
+                    changed.add(self._detach(chunk_id))
+
+                vector = _normalize(embeddings[i])
+                if chunk_id not in self.signatures:
+                    namespace = metadata.get(NAMESPACE_KEY)
+                    canonical = self._best_match(vector, self._candidates(namespace, simhash(document)), pending)
+                    if canonical is not None:
+                        self.duplicates.setdefault(canonical, []).append(
+                            {'id': chunk_id, 'document': document, 'metadata': metadata}
+                        )
+                        self.aliases[chunk_id] = canonical
+                        changed.add(canonical)
+                        continue
+
+                self._register(chunk_id, document, metadata)
+                pending[chunk_id] = vector
+                written.append((i, metadata))
+
+            if written:
+                self.collection.upsert(
+                    ids=[ids[i] for i, _ in written],
+                    embeddings=embeddings[[i for i, _ in written]],
+                    documents=[documents[i] for i, _ in written] if documents is not None else None,
+                    metadatas=[self._with_duplicates(ids[i], metadata) for i, metadata in written]
+                )
+            self._save_duplicates([chunk_id for chunk_id in changed if chunk_id not in pending])
+
+            if len(written) < len(ids):
+                logger.debug(f"{self.name}: {len(ids) - len(written)} chunks rattachés à un chunk existant")
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        with self._lock:
+            self._rehome_replaced(ids, documents)
+            rows = []
+            changed = set()
+            for i, chunk_id in enumerate(ids):
+                if chunk_id not in self.aliases:
+                    rows.append(i)
+                    continue
+                record = self._record(chunk_id)
+                if documents is not None:
+                    record['document'] = documents[i]
+                if metadatas is not None:
+                    record['metadata'] = {key: value for key, value in (metadatas[i] or {}).items()
+                                          if key != DUPLICATES_KEY}
+                changed.add(self.aliases[chunk_id])
+
+            if rows:
+                row_ids = [ids[i] for i in rows]
+                self.collection.update(
+                    ids=row_ids,
+                    embeddings=[embeddings[i] for i in rows] if embeddings is not None else None,
+                    documents=[documents[i] for i in rows] if documents is not None else None,
+                    metadatas=[self._with_duplicates(ids[i], metadatas[i]) for i in rows]
+                    if metadatas is not None else None
+                )
+                if documents is not None or metadatas is not None:
+                    current = self.collection.get(ids=row_ids, include=["documents", "metadatas"])
+                    for chunk_id, document, metadata in zip(current['ids'], current['documents'], current['metadatas']):
+                        self._register(chunk_id, document, metadata)
+            self._save_duplicates(list(changed))
+
+    def delete(self, ids=None, where=None):
+        with self._lock:
+            if where is not None or ids is None:
+                ids = self.get(ids=ids, where=where, include=[])['ids']
+            if not ids:
+                return
+
+            changed = set()
+            canonicals = []
+            for chunk_id in dict.fromkeys(ids):
+                if chunk_id in self.aliases:
+                    changed.add(self._detach(chunk_id))
+                elif chunk_id in self.signatures:
+                    canonicals.append(chunk_id)
+
+            # Un chunk canonique supprimé cède sa ligne (et son vecteur) à son premier doublon
+            promoted = [chunk_id for chunk_id in canonicals if self.duplicates.get(chunk_id)]
+            vectors = {}
+            if promoted:
+                existing = self.collection.get(ids=promoted, include=["embeddings"])
+                vectors = dict(zip(existing['ids'], existing['embeddings']))
+
+            if canonicals:
+                self.collection.delete(ids=canonicals)
+            for chunk_id in canonicals:
+                self._unregister(chunk_id)
+
+            self._promote(promoted, vectors)
+            self._save_duplicates([chunk_id for chunk_id in changed if chunk_id not in canonicals])
+
+    # Lectures
+
+    def get(self, ids=None, where=None, include=("metadatas", "documents"), limit=None, offset=None):
+        with self._lock:
+            if ids is not None:
+                alias_ids = [chunk_id for chunk_id in ids if chunk_id in self.aliases]
+                row_ids = [chunk_id for chunk_id in ids if chunk_id not in self.aliases]
+            else:
+                alias_ids = list(self.aliases)
+                row_ids = None
+
+            if where is not None:
+                alias_ids = [chunk_id for chunk_id in alias_ids if matches_where(self._record(chunk_id)['metadata'], where)]
+            if not alias_ids:
+                return self.collection.get(ids=row_ids, where=where, include=include, limit=limit, offset=offset)
+
+            results = self.collection.get(ids=row_ids, where=where, include=include) \
+                if row_ids is None or row_ids else {'ids': []}
+            records = [self._record(chunk_id) for chunk_id in alias_ids]
+            merged = {'ids': list(results['ids']) + alias_ids}
+            if "documents" in include:
+                merged['documents'] = list(results.get('documents') or []) + [record['document'] for record in records]
+            if "metadatas" in include:
+                merged['metadatas'] = list(results.get('metadatas') or []) + [record['metadata'] for record in records]
+            if "embeddings" in include:
+                canonicals = [self.aliases[chunk_id] for chunk_id in alias_ids]
+                stored = self.collection.get(ids=list(dict.fromkeys(canonicals)), include=["embeddings"])
+                vectors = dict(zip(stored['ids'], stored['embeddings']))
+                rows = list(results.get('embeddings') if results.get('embeddings') is not None else [])
+                merged['embeddings'] = np.asarray(rows + [vectors[chunk_id] for chunk_id in canonicals])
+
+            start = offset or 0
+            end = start + limit if limit is not None else None
+            return {
+                key: merged[key][start:end] if key in merged else None
+                for key in ('ids', 'embeddings', 'documents', 'metadatas')
+            }
+
+    def query(self, query_embeddings, n_results=10, where=None, include=DEFAULT_INCLUDE):
+        return self.collection.query(query_embeddings=query_embeddings, n_results=n_results,
+                                     where=where, include=include)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'chunks': len(self.signatures), 'duplicates': len(self.aliases)}
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,177 @@
+"""Exécuteur d'embeddings hors de la boucle d'événements avec micro-batching des requêtes"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingExecutor:
+    """Exécute les appels au modèle d'embedding dans un pool de threads dédié
+
+    Les encodages de requêtes concurrents sont regroupés pendant une courte
+    fenêtre (ou jusqu'à une taille de lot maximale) puis encodés en une seule
+    passe du modèle ; chaque appelant récupère sa ligne via son propre future.
+    La boucle d'événements n'est jamais bloquée par le modèle.
+
+    Les encodages de fond (rechargement à chaud) passent par
+    encode_background : de petits lots, chacun attendant que les requêtes
+    se soient tues, pour ne jamais retarder un encodage de requête de plus
+    de la durée d'un petit lot.
+    """
+
+    def __init__(self, model, batch_window_ms: float = 5.0, max_batch_size: int = 32,
+                 max_workers: int = 1):
+        self.model = model
+        self.batch_window = max(0.0, batch_window_ms) / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="embedding")
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._in_flight = 0
+        self._last_query = 0.0
+        self.stats = {
+            'queries': 0,
+            'batches': 0,
+            'batched_texts': 0,
+            'bulk_calls': 0,
+            'bulk_texts': 0,
+            'background_texts': 0,
+            'background_wait': 0.0,
+            'encode_time': 0.0
+        }
+
+    async def encode_query(self, text: str) -> np.ndarray:
+        """Encode une requête ; les appels concurrents sont regroupés en un lot"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self._last_query = time.monotonic()
+        self.stats['queries'] += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+
+        return await future
+
+    async def encode_texts(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """Encode une liste de textes (ingestion) dans le pool, sans micro-batching"""
+        loop = asyncio.get_running_loop()
+        self.stats['bulk_calls'] += 1
+        self.stats['bulk_texts'] += len(texts)
+        return await loop.run_in_executor(
+            self._executor, self._encode, texts, batch_size or len(texts) or 1
+        )
+
+    async def wait_for_idle(self, quiet_ms: float):
+        """Attend qu'aucune requête ne soit en attente ni en cours depuis quiet_ms millisecondes"""
+        quiet = max(0.0, quiet_ms) / 1000.0
+        while True:
+            remaining = quiet - (time.monotonic() - self._last_query)
+            if not self._pending and not self._in_flight and remaining <= 0:
+                return
+            await asyncio.sleep(max(remaining, quiet / 4, 0.001))
+
+    async def encode_background(self, texts: List[str], batch_size: int, quiet_ms: float) -> np.ndarray:
+        """Encode des textes par petits lots, chacun lancé seulement quand les requêtes se sont tues"""
+        loop = asyncio.get_running_loop()
+        batch_size = max(1, batch_size)
+        self.stats['background_texts'] += len(texts)
+        parts = []
+        for start in range(0, len(texts), batch_size):
+            wait_start = time.perf_counter()
+            await self.wait_for_idle(quiet_ms)
+            self.stats['background_wait'] += time.perf_counter() - wait_start
+            batch = texts[start:start + batch_size]
+            parts.append(await loop.run_in_executor(self._executor, self._encode, batch, len(batch)))
+        return np.concatenate(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+
+    def _flush(self):
+        """Envoie les requêtes en attente au pool en un seul lot"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        # Les requêtes identiques concurrentes partagent la même ligne
+        texts = list(dict.fromkeys(text for text, _ in pending))
+        self.stats['batches'] += 1
+        self.stats['batched_texts'] += len(texts)
+
+        loop = asyncio.get_running_loop()
+        self._in_flight += 1
+        batch_future = loop.run_in_executor(self._executor, self._encode, texts, len(texts))
+        batch_future.add_done_callback(lambda done: self._batch_done(done, texts, pending))
+
+    def _batch_done(self, done: asyncio.Future, texts: List[str], pending: List[Tuple[str, asyncio.Future]]):
+        self._in_flight -= 1
+        self._resolve(done, texts, pending)
+
+    @staticmethod
+    def _resolve(done: asyncio.Future, texts: List[str], pending: List[Tuple[str, asyncio.Future]]):
+        """Distribue le résultat d'un lot aux futures des appelants"""
+        if done.cancelled():
+            # Lot annulé (arrêt du service) : les appelants sont annulés aussi
+            for _, future in pending:
+                if not future.done():
+                    future.cancel()
+            return
+
+        error = done.exception()
+        if error is None:
+            embeddings = done.result()
+            rows = {text: embeddings[i] for i, text in enumerate(texts)}
+
+        for text, future in pending:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(rows[text])
+
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """Appel bloquant au modèle, exécuté dans le pool de threads"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        start = time.perf_counter()
+        embeddings = self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        self.stats['encode_time'] += time.perf_counter() - start
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Statistiques d'utilisation de l'exécuteur"""
+        batches = self.stats['batches']
+        return {
+            **self.stats,
+            'average_batch_size': round(self.stats['batched_texts'] / batches, 2) if batches else 0.0,
+            'pending': len(self._pending),
+            'in_flight': self._in_flight
+        }
+
+    def shutdown(self):
+        """Arrête le pool de threads"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        for _, future in self._pending:
+            if not future.done():
+                future.cancel()
+        self._pending = []
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,355 @@
+"""Serveur d'embeddings local partagé par les workers (socket Unix)
+
+Un seul processus charge le modèle SentenceTransformer ; les workers uvicorn
+lui envoient leurs textes via RemoteEmbeddingModel, compatible avec
+SentenceTransformer.encode. Les requêtes courtes des différents workers sont
+regroupées côté serveur par un EmbeddingExecutor (micro-batching).
+
+Protocole : chaque message est précédé de deux entiers (taille de l'en-tête
+JSON, taille des données binaires) ; les embeddings sont renvoyés en float32.
+
+Le processus est lancé par EmbeddingServerSupervisor depuis le premier
+worker qui ne trouve pas de serveur actif, via le module d'entrée
+intentlayer_aiserver.embedding_server.
+"""
+
+import argparse
+import asyncio
+import fcntl
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple, Union
+import logging
+
+import numpy as np
+
+from .embedding_executor import EmbeddingExecutor
+
+logger = logging.getLogger(__name__)
+
+_FRAME = struct.Struct("!II")
+
+
+def _encode_message(header: Dict[str, Any], payload: bytes = b"") -> bytes:
+    data = json.dumps(header).encode('utf-8')
+    return _FRAME.pack(len(data), len(payload)) + data + payload
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Connexion fermée par le serveur d'embeddings")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv_message(sock: socket.socket) -> Tuple[Dict[str, Any], bytes]:
+    header_size, payload_size = _FRAME.unpack(_recv_exact(sock, _FRAME.size))
+    header = json.loads(_recv_exact(sock, header_size))
+    return header, _recv_exact(sock, payload_size) if payload_size else b""
+
+
+async def _read_message(reader: asyncio.StreamReader) -> Tuple[Dict[str, Any], bytes]:
+    header_size, payload_size = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+    header = json.loads(await reader.readexactly(header_size))
+    return header, await reader.readexactly(payload_size) if payload_size else b""
+
+
+class EmbeddingServer:
+    """Processus propriétaire du modèle, à l'écoute sur une socket Unix"""
+
+    def __init__(self, socket_path: str, model_name: str, batch_window_ms: float = 5.0,
+                 max_batch_size: int = 32, idle_timeout: float = 300.0):
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self.batch_window_ms = batch_window_ms
+        self.max_batch_size = max_batch_size
+        self.idle_timeout = idle_timeout
+        self.executor: Optional[EmbeddingExecutor] = None
+        self.dimension: Optional[int] = None
+        self.max_seq_length: Optional[int] = None
+        self._last_request = time.monotonic()
+        self._started = time.monotonic()
+
+    async def serve(self):
+        """Charge le modèle puis sert les requêtes jusqu'à inactivité prolongée"""
+        from sentence_transformers import SentenceTransformer
+
+        logger.info(f"Chargement du modèle d'embedding: {self.model_name}")
+        model = await asyncio.to_thread(SentenceTransformer, self.model_name)
+        self.executor = EmbeddingExecutor(model, self.batch_window_ms, self.max_batch_size)
+        self.dimension = int((await self.executor.encode_texts(["dimension"])).shape[1])
+        self.max_seq_length = getattr(model, 'max_seq_length', None)
+
+        Path(self.socket_path).unlink(missing_ok=True)
+        # Socket créée directement en 0600 : jamais accessible aux autres utilisateurs, même brièvement
+        previous_umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        finally:
+            os.umask(previous_umask)
+        logger.info(f"Serveur d'embeddings prêt sur {self.socket_path} (pid {os.getpid()})")
+
+        try:
+            async with server:
+                # Sans requête (ni vérification de santé) d'aucun worker, le processus s'arrête
+                while not self.idle_timeout or time.monotonic() - self._last_request < self.idle_timeout:
+                    await asyncio.sleep(1.0)
+                logger.info("Serveur d'embeddings inactif, arrêt")
+        finally:
+            self.executor.shutdown()
+            Path(self.socket_path).unlink(missing_ok=True)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                header, _ = await _read_message(reader)
+                self._last_request = time.monotonic()
+                try:
+                    response, payload = await self._handle(header)
+                except Exception as e:
+                    logger.error(f"Erreur lors du traitement d'une requête d'embedding: {e}")
+                    response, payload = {'ok': False, 'error': str(e)}, b""
+                writer.write(_encode_message(response, payload))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, header: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        operation = header.get('op')
+        if operation == 'health':
+            return {
+                'ok': True,
+                'model': self.model_name,
+                'dimension': self.dimension,
+                'max_seq_length': self.max_seq_length,
+                'pid': os.getpid(),
+                'uptime_s': round(time.monotonic() - self._started, 1),
+                'stats': self.executor.get_stats()
+            }, b""
+
+        if operation == 'encode':
+            texts = header.get('texts', [])
+            if not texts:
+                embeddings = np.zeros((0, self.dimension), dtype=np.float32)
+            elif len(texts) <= self.max_batch_size:
+                # Requêtes courtes : regroupées avec celles des autres workers
+                rows = await asyncio.gather(*[self.executor.encode_query(text) for text in texts])
+                embeddings = np.stack(rows)
+            else:
+                embeddings = await self.executor.encode_texts(texts, header.get('batch_size'))
+            embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+            return {'ok': True, 'shape': list(embeddings.shape)}, embeddings.tobytes()
+
+        return {'ok': False, 'error': f"Opération inconnue: {operation}"}, b""
+
+
+class RemoteEmbeddingModel:
+    """Client du serveur d'embeddings, compatible avec SentenceTransformer.encode
+
+    Chaque thread garde sa connexion ; une requête échouée est rejouée une
+    fois sur une nouvelle connexion (serveur redémarré entre-temps).
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 60.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._sockets: List[socket.socket] = []
+        self._lock = threading.Lock()
+        self._dimension: Optional[int] = None
+        self._max_seq_length: Optional[int] = None
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+            with self._lock:
+                self._sockets.append(sock)
+        return sock
+
+    def _reset_connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            self._local.sock = None
+            with self._lock:
+                if sock in self._sockets:
+                    self._sockets.remove(sock)
+            sock.close()
+
+    def _request(self, header: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                sock.sendall(_encode_message(header))
+                response, payload = _recv_message(sock)
+                break
+            except (OSError, ConnectionError):
+                self._reset_connection()
+                if attempt:
+                    raise
+        if not response.get('ok'):
+            raise RuntimeError(f"Serveur d'embeddings: {response.get('error')}")
+        return response, payload
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32,
+               convert_to_numpy: bool = True, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        """Encode des textes via le serveur (mêmes paramètres que SentenceTransformer.encode)"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        response, payload = self._request({'op': 'encode', 'texts': texts, 'batch_size': batch_size})
+        embeddings = np.frombuffer(payload, dtype=np.float32).reshape(response['shape'])
+        return embeddings[0] if single else embeddings
+
+    def health(self) -> Dict[str, Any]:
+        """Informations de santé du serveur (lève une exception s'il ne répond pas)"""
+        response, _ = self._request({'op': 'health'})
+        self._dimension = response.get('dimension')
+        self._max_seq_length = response.get('max_seq_length')
+        return response
+
+    @property
+    def max_seq_length(self) -> Optional[int]:
+        if self._max_seq_length is None:
+            self.health()
+        return self._max_seq_length
+
+    def get_sentence_embedding_dimension(self) -> Optional[int]:
+        if self._dimension is None:
+            self.health()
+        return self._dimension
+
+    def close(self):
+        """Ferme toutes les connexions ouvertes par ce client"""
+        with self._lock:
+            sockets, self._sockets = self._sockets, []
+        for sock in sockets:
+            sock.close()
+        self._local = threading.local()
+
+
+class EmbeddingServerSupervisor:
+    """Démarre le serveur d'embeddings si besoin et le relance en cas d'arrêt
+
+    Un verrou fcntl à côté de la socket garantit qu'un seul worker lance le
+    processus ; les autres attendent qu'il soit prêt puis s'y connectent.
+    """
+
+    def __init__(self, socket_path: str, model_name: str, start_timeout: float = 120.0,
+                 idle_timeout: float = 300.0, batch_window_ms: float = 5.0, max_batch_size: int = 32):
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self.start_timeout = start_timeout
+        self.idle_timeout = idle_timeout
+        self.batch_window_ms = batch_window_ms
+        self.max_batch_size = max_batch_size
+        # Relances après l'arrêt d'un serveur déjà vu en service (pas le premier lancement)
+        self.restarts = 0
+        self._seen_running = False
+        self._process: Optional[subprocess.Popen] = None
+
+    def check_health(self) -> Optional[Dict[str, Any]]:
+        """Retourne la santé du serveur, ou None s'il ne répond pas"""
+        if self._process is not None and self._process.poll() is not None:
+            logger.warning(f"Serveur d'embeddings arrêté (code {self._process.returncode})")
+            self._process = None
+
+        client = RemoteEmbeddingModel(self.socket_path, timeout=5.0)
+        try:
+            health = client.health()
+        except (OSError, ConnectionError, RuntimeError, ValueError):
+            return None
+        finally:
+            client.close()
+
+        if health.get('model') != self.model_name:
+            logger.warning(f"Serveur d'embeddings avec un autre modèle: {health.get('model')}")
+            return None
+        self._seen_running = True
+        return health
+
+    def ensure_running(self) -> bool:
+        """Vérifie le serveur et le (re)lance si nécessaire ; retourne True s'il a été lancé"""
+        if self.check_health() is not None:
+            return False
+
+        lock_path = f"{self.socket_path}.lock"
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Lancé par un autre worker pendant l'attente du verrou
+                if self.check_health() is not None:
+                    return False
+
+                self._spawn()
+                deadline = time.monotonic() + self.start_timeout
+                while time.monotonic() < deadline:
+                    if self.check_health() is not None:
+                        return True
+                    if self._process is None:
+                        raise RuntimeError("Le serveur d'embeddings s'est arrêté au démarrage")
+                    time.sleep(0.5)
+                raise RuntimeError(f"Serveur d'embeddings non disponible après {self.start_timeout}s")
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _spawn(self):
+        logger.info(f"Lancement du serveur d'embeddings ({self.model_name}) sur {self.socket_path}")
+        # Module d'entrée à la racine du paquet, importable quel que soit le répertoire courant du worker
+        package = __name__.rsplit('.', 2)[0]
+        root = Path(__file__).resolve().parents[len(__name__.split('.')) - 1]
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(root), env.get('PYTHONPATH')]))
+        self._process = subprocess.Popen(
+            [
+                sys.executable, "-m", f"{package}.embedding_server",
+                "--socket", os.path.abspath(self.socket_path),
+                "--model", self.model_name,
+                "--batch-window-ms", str(self.batch_window_ms),
+                "--max-batch-size", str(self.max_batch_size),
+                "--idle-timeout", str(self.idle_timeout)
+            ],
+            cwd=str(root),
+            env=env,
+            start_new_session=True
+        )
+        if self._seen_running:
+            self.restarts += 1
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serveur d'embeddings partagé (socket Unix)")
+    parser.add_argument("--socket", required=True, help="Chemin de la socket Unix")
+    parser.add_argument("--model", required=True, help="Modèle SentenceTransformer")
+    parser.add_argument("--batch-window-ms", type=float, default=5.0)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--idle-timeout", type=float, default=300.0,
+                        help="Arrêt après ce délai sans requête, en secondes (0 = jamais)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    server = EmbeddingServer(args.socket, args.model, args.batch_window_ms, args.max_batch_size, args.idle_timeout)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
@@ -0,0 +1,670 @@
+"""Artefact d'index pré-construit : segments projetés en mémoire partagés entre workers
+
+Un artefact est un répertoire contenant manifest.json et, pour chaque
+collection, un segment de base par génération :
+
+- {nom}.g{génération}.vectors.npy : vecteurs float32 normalisés (artefact non quantifié)
+- {nom}.g{génération}.records.bin : enregistrements JSON {document, metadata} concaténés
+- {nom}.g{génération}.offsets.npy : positions des enregistrements (int64, N + 1)
+- {nom}.g{génération}.ids.json : ids des lignes
+- {nom}.g{génération}.filters.json : métadonnées filtrables des lignes (sans
+  les objets sérialisés), chargées une fois à l'ouverture pour les filtres where
+- {nom}.g{génération}.codes.npy (+ .scales.npy) : vecteurs quantifiés (float16
+  ou int8), représentation parcourue par la recherche d'un artefact quantifié
+- {nom}.g{génération}.rescore.npy : vecteurs float32 froids d'un artefact
+  quantifié, lus ligne à ligne (pread) pour les seuls candidats recalculés
+
+Les vecteurs (ou les codes) et les enregistrements sont ouverts avec mmap :
+les workers uvicorn d'un même nœud partagent une seule copie en cache de
+pages. Dans un artefact quantifié, seuls les codes sont projetés en mémoire ;
+les vecteurs float32 ne sont jamais projetés et n'entrent pas dans la mémoire
+résidente des workers. Chaque worker écrit ses ajouts dans un petit segment
+delta en mémoire, fusionné périodiquement dans une nouvelle génération du
+segment de base.
+"""
+
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple
+from pathlib import Path
+import logging
+
+import numpy as np
+
+from .ingestion_manifest import hash_text, hash_metadata
+from .matrix_index import MatrixIndex
+from .quantization import quantize, approximate_scores
+from .vector_store import VectorCollection, VectorStore, DEFAULT_INCLUDE, matches_where
+
+logger = logging.getLogger(__name__)
+
+# 2 : segments projetés en mémoire, générations et vecteurs normalisés à l'écriture
+# 3 : segments quantifiés sans vectors.npy, float32 dans un fichier froid rescore.npy
+ARTIFACT_FORMAT_VERSION = 3
+# Versions lisibles (un segment de version 2 est relu tel quel, réécrit en 3 à la fusion)
+SUPPORTED_FORMAT_VERSIONS = (2, 3)
+ARTIFACT_MANIFEST = "manifest.json"
+ARTIFACT_LOCK = ".artifact.lock"
+SEGMENT_FILES = ('vectors', 'rescore', 'records', 'offsets', 'ids', 'filters', 'codes', 'scales')
+# Métadonnées volumineuses (objets sérialisés) exclues de la colonne des filtres
+UNFILTERED_METADATA = ('data', 'duplicates')
+# Masques de filtres where gardés par segment (les segments sont immuables)
+FILTER_MASK_CACHE_SIZE = 256
+
+
+def compute_corpus_hash(collections: Dict[str, Dict[str, Any]]) -> str:
+    """Empreinte du corpus indexé : ids, contenus et métadonnées de toutes les collections"""
+    fingerprints = []
+    for name in sorted(collections):
+        records = collections[name]
+        for chunk_id, document, metadata in sorted(
+            zip(records['ids'], records['documents'], records['metadatas']),
+            key=lambda record: record[0]
+        ):
+            fingerprints.append(f"{name}\t{chunk_id}\t{hash_text(document or '')}\t{hash_metadata(metadata or {})}")
+    return hash_text("\n".join(fingerprints))
+
+
+def filterable_metadata(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Métadonnées d'une ligne utiles aux filtres where"""
+    return {key: value for key, value in (metadata or {}).items() if key not in UNFILTERED_METADATA}
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def write_segment(directory: Path, name: str, generation: int, ids: List[str], vectors,
+                  documents: List[Optional[str]], metadatas: List[Dict[str, Any]],
+                  dimension: Optional[int] = None, quantization: str = "none") -> Dict[str, Any]:
+    """Écrit le segment de base d'une collection et retourne sa description pour le manifeste"""
+    prefix = f"{name}.g{generation}"
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = _normalize(vectors) if len(ids) else vectors.reshape(0, dimension or 0)
+
+    description = {'count': len(ids), 'generation': generation, 'quantization': quantization}
+    if quantization == "none":
+        np.save(directory / f"{prefix}.vectors.npy", np.ascontiguousarray(vectors))
+        description['vectors'] = f"{prefix}.vectors.npy"
+    else:
+        codes, scales = quantize(vectors, quantization)
+        np.save(directory / f"{prefix}.codes.npy", codes)
+        description['codes'] = f"{prefix}.codes.npy"
+        if scales is not None:
+            np.save(directory / f"{prefix}.scales.npy", scales)
+            description['scales'] = f"{prefix}.scales.npy"
+        # Format .npy version 1.0 : en-tête lu par ColdVectors
+        with open(directory / f"{prefix}.rescore.npy", 'wb') as f:
+            np.lib.format.write_array(f, np.ascontiguousarray(vectors), version=(1, 0))
+        description['rescore'] = f"{prefix}.rescore.npy"
+
+    offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    with open(directory / f"{prefix}.records.bin", 'wb') as f:
+        for row, (document, metadata) in enumerate(zip(documents, metadatas)):
+            record = json.dumps({'document': document, 'metadata': metadata}, ensure_ascii=False).encode('utf-8')
+            f.write(record)
+            offsets[row + 1] = offsets[row] + len(record)
+    np.save(directory / f"{prefix}.offsets.npy", offsets)
+
+    with open(directory / f"{prefix}.ids.json", 'w', encoding='utf-8') as f:
+        json.dump(list(ids), f, ensure_ascii=False)
+
+    with open(directory / f"{prefix}.filters.json", 'w', encoding='utf-8') as f:
+        json.dump([filterable_metadata(metadata) for metadata in metadatas], f, ensure_ascii=False)
+
+    description.update({
+        'records': f"{prefix}.records.bin",
+        'offsets': f"{prefix}.offsets.npy",
+        'ids': f"{prefix}.ids.json",
+        'filters': f"{prefix}.filters.json"
+    })
+    return description
+
+
+def _write_manifest(directory: Path, manifest: Dict[str, Any]):
+    """Écrit le manifeste de façon atomique"""
+    temp_path = directory / f"{ARTIFACT_MANIFEST}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, directory / ARTIFACT_MANIFEST)
+
+
+def write_index_artifact(output_path: str, collections: Dict[str, Dict[str, Any]],
+                         embedding_model: str, quantization: str = "none") -> Dict[str, Any]:
+    """Écrit un artefact versionné et auto-descriptif
+
+    `collections` associe à chaque nom un dict {ids, embeddings, documents,
+    metadatas} (format de VectorCollection.get). `quantization` (none,
+    float16, int8) ajoute des codes compacts pour le premier passage des
+    recherches. L'artefact est écrit dans un répertoire temporaire puis mis
+    en place par renommage.
+    """
+    output = Path(output_path)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{output.name}.", dir=output.parent))
+
+    try:
+        dimension = None
+        described = {}
+        for name, records in collections.items():
+            if len(records['ids']):
+                vector_dimension = int(np.asarray(records['embeddings']).shape[1])
+                if dimension is not None and vector_dimension != dimension:
+                    raise ValueError(f"Dimension incohérente pour {name}: {vector_dimension} au lieu de {dimension}")
+                dimension = vector_dimension
+
+        for name, records in collections.items():
+            described[name] = write_segment(
+                staging, name, 0, records['ids'], records['embeddings'],
+                records['documents'], records['metadatas'], dimension, quantization
+            )
+
+        manifest = {
+            'format_version': ARTIFACT_FORMAT_VERSION,
+            'embedding_model': embedding_model,
+            'dimension': dimension,
+            'distance': 'l2_squared_normalized',
+            'quantization': quantization,
+            'corpus_hash': compute_corpus_hash(collections),
+            'created_at': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            'collections': described
+        }
+        _write_manifest(staging, manifest)
+
+        # Remplacement de l'artefact précédent
+        if output.exists():
+            previous = output.with_name(f".{output.name}.old")
+            shutil.rmtree(previous, ignore_errors=True)
+            os.replace(output, previous)
+            os.replace(staging, output)
+            shutil.rmtree(previous, ignore_errors=True)
+        else:
+            os.replace(staging, output)
+
+        return manifest
+
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def read_artifact_manifest(artifact_path: str) -> Dict[str, Any]:
+    """Lit et valide le manifeste d'un artefact"""
+    manifest_path = Path(artifact_path) / ARTIFACT_MANIFEST
+    if not manifest_path.exists():
+        raise FileNotFoundError(f"Artefact d'index introuvable: {manifest_path}")
+
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    if manifest.get('format_version') not in SUPPORTED_FORMAT_VERSIONS:
+        raise ValueError(
+            f"Version d'artefact non supportée: {manifest.get('format_version')} "
+            f"(attendue: {ARTIFACT_FORMAT_VERSION})"
+        )
+    return manifest
+
+
+class ColdVectors:
+    """Vecteurs float32 d'un segment quantifié, lus à la demande sans projection en mémoire
+
+    S'indexe comme la matrice (ligne, liste de lignes) : chaque accès lit les
+    lignes demandées avec pread, regroupées en plages contiguës. Seuls les
+    candidats recalculés, les embeddings demandés et les fusions lisent ce
+    fichier.
+    """
+
+    def __init__(self, path: Path):
+        with open(path, 'rb') as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            self._data_offset = f.tell()
+        if fortran_order or dtype != np.float32 or len(shape) != 2:
+            raise ValueError(f"Vecteurs froids illisibles: {path} ({dtype}, {shape})")
+        self.shape = shape
+        self._row_bytes = shape[1] * 4
+        self._fd = os.open(path, os.O_RDONLY)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def _read(self, start: int, count: int) -> np.ndarray:
+        data = os.pread(self._fd, count * self._row_bytes, self._data_offset + start * self._row_bytes)
+        return np.frombuffer(data, dtype=np.float32).reshape(count, self.shape[1])
+
+    def __getitem__(self, rows) -> np.ndarray:
+        if isinstance(rows, (int, np.integer)):
+            return self._read(int(rows), 1)[0]
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1)
+        if len(rows) == 0:
+            return np.zeros((0, self.shape[1]), dtype=np.float32)
+        order = np.argsort(rows, kind='stable')
+        ordered = rows[order]
+        # Plages de lignes consécutives lues en un seul appel
+        breaks = np.flatnonzero(np.diff(ordered) != 1) + 1
+        blocks = [
+            self._read(int(run[0]), int(run[-1] - run[0] + 1))
+            for run in np.split(ordered, breaks)
+        ]
+        result = np.empty((len(rows), self.shape[1]), dtype=np.float32)
+        result[order] = np.concatenate(blocks) if len(blocks) > 1 else blocks[0]
+        return result
+
+    def __del__(self):
+        try:
+            os.close(self._fd)
+        except (AttributeError, OSError):
+            pass
+
+
+class MappedSegment:
+    """Segment de base en lecture seule, projeté en mémoire depuis l'artefact
+
+    `vectors` est la matrice float32 projetée (segment non quantifié) ou
+    ColdVectors (segment quantifié, dont seuls les codes sont projetés).
+    """
+
+    def __init__(self, directory: Optional[Path], description: Dict[str, Any], dimension: int):
+        self.generation = description['generation']
+        self.files = [description[key] for key in SEGMENT_FILES if description.get(key)] if directory else []
+        self.quantization = description.get('quantization', 'none')
+        if directory:
+            with open(directory / description['ids'], 'r', encoding='utf-8') as f:
+                self.ids: List[str] = json.load(f)
+        else:
+            self.ids = []
+        self.size = len(self.ids)
+        self.row_by_id = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+
+        if self.size:
+            if description.get('vectors'):
+                self.vectors = np.load(directory / description['vectors'], mmap_mode='r')
+            else:
+                self.vectors = ColdVectors(directory / description['rescore'])
+            self.offsets = np.load(directory / description['offsets'], mmap_mode='r')
+            self._records = np.memmap(directory / description['records'], dtype=np.uint8, mode='r')
+            self.codes = np.load(directory / description['codes'], mmap_mode='r') if description.get('codes') else None
+            self.scales = np.load(directory / description['scales'], mmap_mode='r') if description.get('scales') else None
+        else:
+            self.codes = None
+            self.scales = None
+            self.vectors = np.zeros((0, dimension or 0), dtype=np.float32)
+            self.offsets = np.zeros(1, dtype=np.int64)
+            self._records = np.zeros(0, dtype=np.uint8)
+
+        # Colonne des filtres : décodée une fois, et non à chaque recherche filtrée
+        if self.size and description.get('filters'):
+            with open(directory / description['filters'], 'r', encoding='utf-8') as f:
+                self.filter_metadata: List[Dict[str, Any]] = json.load(f)
+        else:
+            # Artefact écrit sans colonne des filtres
+            self.filter_metadata = [filterable_metadata(self.record(row)[1]) for row in range(self.size)]
+        self._filter_masks: Dict[str, np.ndarray] = {}
+        self._filter_lock = threading.Lock()
+
+    @classmethod
+    def empty(cls, dimension: int) -> "MappedSegment":
+        """Segment vide d'une collection absente de l'artefact (génération -1)"""
+        return cls(None, {'generation': -1}, dimension)
+
+    def record(self, row: int) -> Tuple[Optional[str], Dict[str, Any]]:
+        """Décode (document, métadonnées) d'une ligne"""
+        record = json.loads(self._records[self.offsets[row]:self.offsets[row + 1]].tobytes())
+        return record['document'], record['metadata']
+
+    def filter_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        """Lignes (toutes générations confondues) satisfaisant un filtre where, en masque booléen
+
+        Évalué sur la colonne des filtres puis mis en cache : les mêmes
+        filtres (namespace, catégorie) reviennent d'une requête à l'autre.
+        """
+        key = json.dumps(where, sort_keys=True, default=str)
+        with self._filter_lock:
+            mask = self._filter_masks.get(key)
+        if mask is None:
+            mask = np.fromiter(
+                (matches_where(metadata, where) for metadata in self.filter_metadata), dtype=bool, count=self.size
+            )
+            with self._filter_lock:
+                if len(self._filter_masks) >= FILTER_MASK_CACHE_SIZE:
+                    self._filter_masks.clear()
+                self._filter_masks[key] = mask
+        return mask
+
+
+class ArtifactCollection(VectorCollection):
+    """Collection d'un artefact : segment de base partagé + segment delta propre au worker
+
+    Les écritures vont dans le delta (MatrixIndex en mémoire) ; les lignes de
+    base remplacées ou supprimées sont masquées par id jusqu'à la prochaine
+    fusion. Les distances retournées valent 2 - 2·cos, comme MatrixIndex.
+
+    Si la base est quantifiée, la recherche classe d'abord toutes les lignes
+    sur les codes compacts puis recalcule en float32 les scores des
+    n_results * rescore_factor meilleurs candidats, lus dans le fichier froid.
+    """
+
+    def __init__(self, name: str, base: MappedSegment, rescore_factor: int = 4):
+        self.name = name
+        self.rescore_factor = max(1, rescore_factor)
+        self.delta = MatrixIndex(name)
+        self.deleted_ids: set = set()
+        self._lock = threading.RLock()
+        self._set_base(base)
+
+    def _set_base(self, base: MappedSegment):
+        """Installe un segment de base en conservant le delta et les suppressions"""
+        self.base = base
+        self._dead = np.zeros(base.size, dtype=bool)
+        for chunk_id in set(self.deleted_ids) | set(self.delta.row_by_id):
+            row = base.row_by_id.get(chunk_id)
+            if row is not None:
+                self._dead[row] = True
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.delta.size or self.deleted_ids)
+
+    def _mask_base(self, ids: List[str], deleted: bool):
+        for chunk_id in ids:
+            row = self.base.row_by_id.get(chunk_id)
+            if row is not None:
+                self._dead[row] = True
+                if deleted:
+                    self.deleted_ids.add(chunk_id)
+
+    def _live_base_rows(self) -> np.ndarray:
+        return np.flatnonzero(~self._dead)
+
+    def count(self) -> int:
+        with self._lock:
+            return int(self.base.size - self._dead.sum()) + self.delta.size
+
+    def _contains(self, chunk_id: str) -> bool:
+        if chunk_id in self.delta.row_by_id:
+            return True
+        row = self.base.row_by_id.get(chunk_id)
+        return row is not None and not self._dead[row]
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        with self._lock:
+            new = [i for i, chunk_id in enumerate(ids) if not self._contains(chunk_id)]
+            self.upsert(
+                [ids[i] for i in new],
+                [embeddings[i] for i in new],
+                [documents[i] for i in new] if documents is not None else None,
+                [metadatas[i] for i in new] if metadatas is not None else None
+            )
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        if not ids:
+            return
+        with self._lock:
+            self._mask_base(ids, deleted=False)
+            self.deleted_ids.difference_update(ids)
+            self.delta.upsert(ids, embeddings, documents, metadatas)
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        with self._lock:
+            for i, chunk_id in enumerate(ids):
+                if chunk_id in self.delta.row_by_id:
+                    row = self.delta.row_by_id[chunk_id]
+                    vector = self.delta.matrix[row]
+                    document, metadata = self.delta.documents[row], self.delta.metadatas[row]
+                else:
+                    row = self.base.row_by_id.get(chunk_id)
+                    if row is None or self._dead[row]:
+                        continue
+                    vector = self.base.vectors[row]
+                    document, metadata = self.base.record(row)
+
+                # Une ligne de base mise à jour est recopiée dans le delta
+                self.upsert(
+                    [chunk_id],
+                    [embeddings[i] if embeddings is not None else vector],
+                    [documents[i] if documents is not None else document],
+                    [metadatas[i] if metadatas is not None else metadata]
+                )
+
+    def delete(self, ids=None, where=None):
+        with self._lock:
+            if where is not None:
+                ids = self.get(ids=ids, where=where, include=[])['ids']
+            if not ids:
+                return
+            self._mask_base(ids, deleted=True)
+            self.delta.delete(ids)
+
+    def get(self, ids=None, where=None, include=("metadatas", "documents"), limit=None, offset=None):
+        with self._lock:
+            if ids is not None:
+                base_rows = [
+                    self.base.row_by_id[chunk_id] for chunk_id in ids
+                    if chunk_id in self.base.row_by_id and not self._dead[self.base.row_by_id[chunk_id]]
+                ]
+                delta_rows = [self.delta.row_by_id[chunk_id] for chunk_id in ids if chunk_id in self.delta.row_by_id]
+            else:
+                base_rows = self._live_base_rows().tolist()
+                delta_rows = list(range(self.delta.size))
+
+            if where:
+                mask = self.base.filter_mask(where)
+                base_rows = [row for row in base_rows if mask[row]]
+            needs_records = "documents" in include or "metadatas" in include
+            vectors = self.base.vectors[base_rows] if "embeddings" in include and base_rows else None
+            rows = []
+            for i, row in enumerate(base_rows):
+                document, metadata = self.base.record(row) if needs_records else (None, None)
+                rows.append((self.base.ids[row], document, metadata, vectors[i] if vectors is not None else None))
+            for row in delta_rows:
+                metadata = self.delta.metadatas[row]
+                if where and not matches_where(metadata, where):
+                    continue
+                rows.append((self.delta.ids[row], self.delta.documents[row], metadata, self.delta.matrix[row]))
+
+        rows = rows[offset or 0:]
+        if limit is not None:
+            rows = rows[:limit]
+        return {
+            'ids': [row[0] for row in rows],
+            'documents': [row[1] for row in rows] if "documents" in include else None,
+            'metadatas': [row[2] for row in rows] if "metadatas" in include else None,
+            'embeddings': np.array([row[3] for row in rows], dtype=np.float32) if "embeddings" in include else None
+        }
+
+    def _search_base(self, query: np.ndarray, n_results: int,
+                     where: Optional[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        if where:
+            rows = np.flatnonzero(~self._dead & self.base.filter_mask(where))
+        else:
+            rows = self._live_base_rows()
+        if len(rows) == 0 or n_results <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        all_rows = len(rows) == self.base.size
+        if self.base.codes is not None:
+            approximate = approximate_scores(self.base.codes, self.base.scales, query, None if all_rows else rows)
+            candidates = min(n_results * self.rescore_factor, len(rows))
+            if candidates < len(rows):
+                rows = np.sort(rows[np.argpartition(-approximate, candidates - 1)[:candidates]])
+            # Lecture des seules lignes candidates dans le fichier froid
+            scores = self.base.vectors[rows] @ query
+        else:
+            scores = self.base.vectors @ query if all_rows else self.base.vectors[rows] @ query
+        k = min(n_results, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        return rows[top], scores[top]
+
+    def query(self, query_embeddings, n_results=10, where=None, include=DEFAULT_INCLUDE):
+        results = {'ids': [], 'distances': [], 'documents': [], 'metadatas': [], 'embeddings': []}
+        with self._lock:
+            for query_embedding in query_embeddings:
+                query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+                norm = np.linalg.norm(query)
+                if norm > 0:
+                    query = query / norm
+
+                base_rows, base_scores = self._search_base(query, n_results, where)
+                delta_rows, delta_scores = self.delta.search(query, n_results, where)
+                hits = [(float(score), 'base', int(row)) for row, score in zip(base_rows, base_scores)]
+                hits += [(float(score), 'delta', int(row)) for row, score in zip(delta_rows, delta_scores)]
+                hits = sorted(hits, key=lambda hit: hit[0], reverse=True)[:n_results]
+
+                ids, documents, metadatas, embeddings = [], [], [], []
+                for _, segment, row in hits:
+                    if segment == 'base':
+                        ids.append(self.base.ids[row])
+                        document, metadata = self.base.record(row) if (
+                            "documents" in include or "metadatas" in include
+                        ) else (None, None)
+                        vector = self.base.vectors[row] if "embeddings" in include else None
+                    else:
+                        ids.append(self.delta.ids[row])
+                        document, metadata = self.delta.documents[row], self.delta.metadatas[row]
+                        vector = self.delta.matrix[row]
+                    documents.append(document)
+                    metadatas.append(metadata)
+                    embeddings.append(vector)
+
+                results['ids'].append(ids)
+                results['distances'].append([2.0 - 2.0 * score for score, _, _ in hits])
+                results['documents'].append(documents)
+                results['metadatas'].append(metadatas)
+                results['embeddings'].append(np.array(embeddings, dtype=np.float32) if "embeddings" in include else None)
+
+        for key in ("distances", "documents", "metadatas", "embeddings"):
+            if key not in include:
+                results[key] = None
+        return results
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Contenu vivant complet (base + delta), pour l'écriture d'une nouvelle génération"""
+        return self.get(include=["embeddings", "documents", "metadatas"])
+
+
+class ArtifactVectorStore(VectorStore):
+    """Base vectorielle ouverte depuis un artefact pré-construit, partagée entre workers
+
+    merge() écrit le delta de ce worker dans une nouvelle génération des
+    segments modifiés et recharge les générations écrites par les autres
+    workers. Les opérations sur les fichiers sont sérialisées entre processus
+    par un verrou fcntl (partagé à la lecture, exclusif à la fusion).
+    """
+
+    backend_type = "artifact"
+    prebuilt = True
+
+    def __init__(self, path: str, embedding_model: Optional[str] = None, rescore_factor: int = 4):
+        super().__init__(path)
+        self.rescore_factor = rescore_factor
+        with self._file_lock(exclusive=False):
+            self.manifest = read_artifact_manifest(path)
+        if embedding_model and self.manifest['embedding_model'] != embedding_model:
+            raise ValueError(
+                f"Artefact construit avec {self.manifest['embedding_model']}, "
+                f"modèle configuré: {embedding_model}"
+            )
+        self._collections: Dict[str, ArtifactCollection] = {}
+        self._merge_lock = threading.Lock()
+        logger.info(
+            f"Artefact d'index {path}: corpus {self.manifest['corpus_hash'][:12]}, "
+            f"construit le {self.manifest['created_at']}, "
+            f"quantification {self.manifest.get('quantization', 'none')}"
+        )
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        with open(self.path / ARTIFACT_LOCK, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _open_segment(self, name: str, manifest: Dict[str, Any]) -> MappedSegment:
+        description = manifest['collections'].get(name)
+        if description is None:
+            return MappedSegment.empty(manifest['dimension'])
+        return MappedSegment(self.path, description, manifest['dimension'])
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> ArtifactCollection:
+        if name not in self._collections:
+            with self._file_lock(exclusive=False):
+                if name not in self.manifest['collections']:
+                    logger.warning(f"Collection {name} absente de l'artefact, ouverte vide")
+                self._collections[name] = ArtifactCollection(
+                    name, self._open_segment(name, self.manifest), self.rescore_factor
+                )
+        return self._collections[name]
+
+    def delta_rows(self) -> int:
+        """Nombre de lignes en attente de fusion dans les deltas de ce worker"""
+        return sum(collection.delta.size + len(collection.deleted_ids) for collection in self._collections.values())
+
+    def merge(self) -> List[str]:
+        """Fusionne les deltas dans de nouvelles générations et recharge celles des autres workers
+
+        Retourne les noms des collections dont le segment de base a changé
+        (les index dérivés de ces collections doivent être reconstruits).
+        """
+        with self._merge_lock, self._file_lock(exclusive=True):
+            manifest = read_artifact_manifest(str(self.path))
+            reloaded, written, obsolete = [], [], []
+
+            for name, collection in self._collections.items():
+                description = manifest['collections'].get(name)
+                on_disk = description['generation'] if description else -1
+
+                with collection._lock:
+                    # Génération écrite par un autre worker : rechargement sous le delta courant
+                    if on_disk != collection.base.generation:
+                        collection._set_base(self._open_segment(name, manifest))
+                        reloaded.append(name)
+
+                    if not collection.dirty:
+                        continue
+
+                    snapshot = collection.snapshot()
+                    if manifest['dimension'] is None and snapshot['ids']:
+                        manifest['dimension'] = int(snapshot['embeddings'].shape[1])
+                    previous = collection.base
+                    manifest['collections'][name] = write_segment(
+                        self.path, name, on_disk + 1, snapshot['ids'], snapshot['embeddings'],
+                        snapshot['documents'], snapshot['metadatas'], manifest['dimension'],
+                        manifest.get('quantization', 'none')
+                    )
+                    collection.delta = MatrixIndex(name)
+                    collection.deleted_ids = set()
+                    collection._set_base(MappedSegment(self.path, manifest['collections'][name], manifest['dimension']))
+                    obsolete.extend(previous.files)
+                    written.append(name)
+
+            if written:
+                manifest['format_version'] = ARTIFACT_FORMAT_VERSION
+                manifest['updated_at'] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+                _write_manifest(self.path, manifest)
+                # Les projections existantes restent valides après suppression (POSIX)
+                for file_name in obsolete:
+                    (self.path / file_name).unlink(missing_ok=True)
+                logger.info(f"Deltas fusionnés dans l'artefact: {', '.join(written)}")
+            self.manifest = manifest
+
+        return reloaded
+
+    def persist(self):
+        """Rien à écrire immédiatement : les deltas sont fusionnés par merge()"""
+
+    def close(self):
+        """Fusionne les deltas restants avant l'arrêt du worker"""
+        self.merge()
@@ -0,0 +1,377 @@
+"""Ingestion en flux de documents de connaissances, suivie par identifiant de job"""
+
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+import logging
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Erreurs conservées dans le rapport d'un job (les suivantes sont seulement comptées)
+MAX_REPORTED_ERRORS = 20
+
+# Identifiant de job fourni par le client (nom du fichier d'état du job)
+_JOB_ID_RE = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]{0,127}$")
+
+_END = object()
+
+
+class IngestionError(ValueError):
+    """Flux d'ingestion illisible (ligne trop longue, document invalide)"""
+
+
+def _decode_line(line: bytes) -> Any:
+    """Objet JSON d'une ligne, ou l'exception de décodage"""
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return e
+
+
+def _split_lines(buffer: bytes, max_line_bytes: int) -> Tuple[List[bytes], bytes]:
+    """Lignes complètes (non vides) d'un tampon et reste à compléter"""
+    *lines, rest = buffer.split(b"\n")
+    if len(rest) > max_line_bytes:
+        raise IngestionError(f"Ligne de plus de {max_line_bytes} octets")
+    return [line for line in lines if line.strip()], rest
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[Any]:
+    """Décode un flux NDJSON ligne par ligne sans le charger entièrement
+
+    Produit l'objet de chaque ligne, ou l'exception de décodage pour une
+    ligne invalide (le flux continue). Une ligne plus longue que
+    `max_line_bytes` interrompt le flux.
+    """
+    buffer = b""
+    async for chunk in chunks:
+        lines, buffer = _split_lines(buffer + chunk, max_line_bytes)
+        for line in lines:
+            yield _decode_line(line)
+    if buffer.strip():
+        yield _decode_line(buffer)
+
+
+def multipart_boundary(content_type: str) -> Optional[bytes]:
+    """Délimiteur d'un corps multipart/form-data (None si absent)"""
+    _, params = parse_options_header(content_type)
+    return params.get(b'boundary') or None
+
+
+async def iter_multipart(chunks: AsyncIterator[bytes], boundary: bytes, max_line_bytes: int) -> AsyncIterator[Any]:
+    """Décode un corps multipart au fil de sa réception
+
+    Les fichiers .ndjson/.jsonl produisent un document par ligne, les autres
+    fichiers un document chacun (la source est le nom du fichier, limité à
+    `max_line_bytes`) ; les champs simples sont ignorés. Le corps n'est lu
+    qu'au rythme de la consommation des documents : rien n'est mis en
+    mémoire ni sur disque au-delà d'un morceau et du document en cours.
+    """
+    events: List[Tuple[str, Any]] = []
+    header: Dict[str, bytes] = {'field': b"", 'value': b""}
+    headers: Dict[bytes, bytes] = {}
+
+    def on_header_field(data, start, end):
+        header['field'] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header['value'] += data[start:end]
+
+    def on_header_end():
+        headers[header['field'].strip().lower()] = header['value'].strip()
+        header['field'], header['value'] = b"", b""
+
+    def on_headers_finished():
+        events.append(('begin', dict(headers)))
+        headers.clear()
+
+    parser = MultipartParser(boundary, {
+        'on_header_field': on_header_field,
+        'on_header_value': on_header_value,
+        'on_header_end': on_header_end,
+        'on_headers_finished': on_headers_finished,
+        'on_part_data': lambda data, start, end: events.append(('data', data[start:end])),
+        'on_part_end': lambda: events.append(('end', None))
+    })
+
+    filename = None
+    ndjson = False
+    buffer = b""
+    oversized = False
+    async for chunk in chunks:
+        parser.write(chunk)
+        pending, events[:] = list(events), []
+        for event, value in pending:
+            if event == 'begin':
+                _, params = parse_options_header(value.get(b'content-disposition', b""))
+                raw_name = params.get(b'filename')
+                filename = raw_name.decode('utf-8', 'replace') if raw_name else None
+                ndjson = bool(filename) and filename.endswith((".ndjson", ".jsonl"))
+                buffer, oversized = b"", False
+            elif filename is None:
+                # Champ de formulaire simple
+                continue
+            elif event == 'data':
+                if ndjson:
+                    lines, buffer = _split_lines(buffer + value, max_line_bytes)
+                    for line in lines:
+                        yield _decode_line(line)
+                elif not oversized:
+                    buffer += value
+                    if len(buffer) > max_line_bytes:
+                        oversized, buffer = True, b""
+                        yield IngestionError(f"{filename}: fichier de plus de {max_line_bytes} octets")
+            else:
+                if ndjson:
+                    if buffer.strip():
+                        yield _decode_line(buffer)
+                elif not oversized:
+                    try:
+                        yield {'content': buffer.decode("utf-8"), 'source': filename}
+                    except UnicodeDecodeError as e:
+                        yield IngestionError(f"{filename} n'est pas un fichier texte UTF-8: {e}")
+                filename, buffer = None, b""
+    parser.finalize()
+
+
+def parse_document(raw: Any, namespace: Optional[str] = None) -> Dict[str, Any]:
+    """Valide une ligne {content, source, metadata, version, namespace} du flux"""
+    if not isinstance(raw, dict):
+        raise IngestionError("Document attendu sous forme d'objet JSON")
+    content = raw.get('content')
+    source = raw.get('source')
+    if not isinstance(content, str) or not content.strip():
+        raise IngestionError("Champ 'content' manquant ou vide")
+    if not isinstance(source, str) or not source:
+        raise IngestionError("Champ 'source' manquant")
+
+    metadata = raw.get('metadata') or {}
+    if not isinstance(metadata, dict):
+        raise IngestionError("Champ 'metadata' attendu sous forme d'objet")
+    # ChromaDB n'accepte que des métadonnées de types simples
+    metadata = {
+        key: value if isinstance(value, (str, int, float, bool)) else json.dumps(value, ensure_ascii=False)
+        for key, value in metadata.items() if value is not None
+    }
+    namespace = raw.get('namespace') or namespace
+    if namespace:
+        metadata['namespace'] = str(namespace)
+
+    version = raw.get('version')
+    # bool est une sous-classe de int : true/false ne sont pas des versions
+    if version is not None and (isinstance(version, bool) or not isinstance(version, int)):
+        raise IngestionError("Champ 'version' attendu sous forme d'entier")
+
+    return {'content': content, 'source': source, 'metadata': metadata, 'version': version}
+
+
+class IngestionJobManager:
+    """Exécute les ingestions en flux et conserve leur avancement
+
+    La lecture du flux et l'écriture dans la base de connaissances sont
+    reliées par une file bornée : quand l'encodage prend du retard, la
+    lecture du corps de la requête est suspendue (contre-pression jusqu'au
+    client) et la mémoire reste bornée quelle que soit la taille du corpus.
+    Les documents sont écrits par lots via le remplacement versionné des
+    sources du service RAG.
+
+    L'état de chaque job est écrit dans `jobs_path` (un fichier JSON par
+    job, à la création, après chaque lot et à la fin) : tous les workers
+    d'un nœud répondent sur l'avancement d'un job, quel que soit celui qui
+    reçoit l'envoi. Un job en cours dont le processus a disparu est
+    rapporté comme interrompu.
+    """
+
+    def __init__(self, rag_service, jobs_path: str):
+        self.rag_service = rag_service
+        self.jobs_path = Path(jobs_path)
+        # Jobs en cours dans ce worker (avancement à jour sans relire le disque)
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def _job_file(self, job_id: str) -> Path:
+        return self.jobs_path / f"{job_id}.json"
+
+    def _save(self, job: Dict[str, Any]):
+        """Écrit l'état d'un job de manière atomique"""
+        try:
+            self.jobs_path.mkdir(parents=True, exist_ok=True)
+            path = self._job_file(job['job_id'])
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(job, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Erreur lors de la sauvegarde du job d'ingestion {job['job_id']}: {e}")
+
+    def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """État d'un job écrit par n'importe quel worker (None s'il est inconnu)"""
+        if job_id in self.jobs:
+            return self.jobs[job_id]
+        try:
+            with open(self._job_file(job_id), 'r', encoding='utf-8') as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if job['status'] == "running" and not _process_alive(job.get('worker')):
+            job['status'] = "interrupted"
+        return job
+
+    def create_job(self, job_id: Optional[str] = None) -> Dict[str, Any]:
+        """Enregistre un job (identifiant fourni par le client ou généré)"""
+        job_id = job_id or uuid.uuid4().hex
+        if not _JOB_ID_RE.match(job_id):
+            raise ValueError(f"Identifiant de job invalide: {job_id} (lettres, chiffres, '.', '_', '-')")
+        previous = self._load(job_id)
+        if previous is not None and previous['status'] == "running":
+            raise IngestionError(f"Le job {job_id} est déjà en cours")
+
+        job = {
+            'job_id': job_id,
+            'status': "running",
+            'worker': os.getpid(),
+            'documents_received': 0,
+            'documents_indexed': 0,
+            'documents_skipped': 0,
+            'documents_failed': 0,
+            'chunks_encoded': 0,
+            'chunks_unchanged': 0,
+            'chunks_deleted': 0,
+            'errors': [],
+            'started_at': time.time(),
+            'finished_at': None
+        }
+        self.jobs[job_id] = job
+        self._save(job)
+        self._prune()
+        return job
+
+    def _saved_jobs(self) -> List[Dict[str, Any]]:
+        """Jobs enregistrés par tous les workers, du plus récent au plus ancien"""
+        jobs = []
+        for path in self.jobs_path.glob("*.json") if self.jobs_path.exists() else []:
+            job = self._load(path.stem)
+            if job is not None:
+                jobs.append(job)
+        return sorted(jobs, key=lambda job: job['started_at'], reverse=True)
+
+    def _prune(self):
+        """Oublie les jobs terminés les plus anciens au-delà de settings.rag_ingest_jobs_kept"""
+        jobs = self._saved_jobs()
+        finished = [job for job in jobs if job['status'] != "running"]
+        for job in finished[max(0, settings.rag_ingest_jobs_kept - (len(jobs) - len(finished))):]:
+            self._job_file(job['job_id']).unlink(missing_ok=True)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Avancement d'un job (None s'il est inconnu ou oublié)"""
+        job = self._load(job_id) if _JOB_ID_RE.match(job_id) else None
+        if job is None:
+            return None
+        end = job['finished_at'] or time.time()
+        return {**job, 'errors': list(job['errors']), 'elapsed': round(end - job['started_at'], 3)}
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        return [self.get_job(job['job_id']) for job in self._saved_jobs()]
+
+    def _record_error(self, job: Dict[str, Any], position: int, error: Exception):
+        job['documents_failed'] += 1
+        if len(job['errors']) < MAX_REPORTED_ERRORS:
+            job['errors'].append({'document': position, 'error': str(error)})
+
+    async def run(self, job: Dict[str, Any], documents: AsyncIterator[Any],
+                  namespace: Optional[str] = None) -> Dict[str, Any]:
+        """Ingère un flux de documents bruts (dict ou exception de décodage)"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, settings.rag_ingest_queue_size))
+        batch_size = max(1, settings.rag_ingest_batch_documents)
+
+        async def write():
+            while True:
+                batch = []
+                item = await queue.get()
+                while item is not _END:
+                    batch.append(item)
+                    if len(batch) >= batch_size or queue.empty():
+                        break
+                    item = queue.get_nowait()
+                if batch:
+                    stats = await self.rag_service.replace_knowledge_sources(batch)
+                    job['documents_skipped'] += stats['skipped']
+                    job['documents_indexed'] += len({document['source'] for document in batch}) - stats['skipped']
+                    job['chunks_encoded'] += stats['encoded']
+                    job['chunks_unchanged'] += stats['updated']
+                    job['chunks_deleted'] += stats['deleted']
+                    self._save(job)
+                if item is _END:
+                    return
+
+        writer = asyncio.create_task(write())
+        try:
+            async for raw in documents:
+                position = job['documents_received']
+                job['documents_received'] += 1
+                try:
+                    if isinstance(raw, IngestionError):
+                        raise raw
+                    if isinstance(raw, Exception):
+                        raise IngestionError(f"JSON invalide: {raw}")
+                    document = parse_document(raw, namespace)
+                except IngestionError as e:
+                    self._record_error(job, position, e)
+                    continue
+
+                # Bloque la lecture du flux tant que la file est pleine
+                put = asyncio.ensure_future(queue.put(document))
+                done, _ = await asyncio.wait({put, writer}, return_when=asyncio.FIRST_COMPLETED)
+                if put not in done:
+                    put.cancel()
+                    break
+
+            if not writer.done():
+                await queue.put(_END)
+            await writer
+            job['status'] = "completed"
+            logger.info(
+                f"Ingestion {job['job_id']} terminée: {job['documents_indexed']} documents indexés, "
+                f"{job['documents_skipped']} ignorés, {job['documents_failed']} en erreur"
+            )
+        except Exception as e:
+            writer.cancel()
+            job['status'] = "failed"
+            job['errors'].append({'document': None, 'error': str(e)})
+            logger.error(f"Erreur lors de l'ingestion {job['job_id']}: {e}")
+        finally:
+            job['finished_at'] = time.time()
+            self._save(job)
+            self.jobs.pop(job['job_id'], None)
+            try:
+                self.rag_service.vector_store.persist()
+            except Exception as e:
+                logger.error(f"Erreur lors de la persistance après l'ingestion {job['job_id']}: {e}")
+
+        end = job['finished_at']
+        return {**job, 'errors': list(job['errors']), 'elapsed': round(end - job['started_at'], 3)}
+
+
+def _process_alive(pid: Optional[int]) -> bool:
+    """Vrai si le processus (worker du même nœud) existe encore"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,170 @@
+"""Manifeste d'ingestion RAG : suivi des fichiers sources et de leurs chunks"""
+
+import os
+import json
+import hashlib
+from typing import Dict, Any, Optional, Set
+from pathlib import Path
+import logging
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def hash_bytes(data: bytes) -> str:
+    """Calcule l'empreinte SHA-256 d'un contenu binaire"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_text(text: str) -> str:
+    """Calcule l'empreinte SHA-256 d'un texte"""
+    return hash_bytes(text.encode('utf-8'))
+
+
+def hash_metadata(metadata: Dict[str, Any]) -> str:
+    """Calcule une empreinte stable des métadonnées d'un chunk"""
+    return hash_text(json.dumps(metadata, ensure_ascii=False, sort_keys=True, default=str))
+
+
+class IngestionManifest:
+    """Manifeste persistant : source -> empreinte du fichier -> ids et empreintes des chunks
+
+    Chaque entrée est indexée par (collection, source) et contient :
+    - file_hash : empreinte du contenu brut du fichier
+    - chunks : {chunk_id: {"content": empreinte du texte, "metadata": empreinte des métadonnées}}
+
+    Le manifeste garde aussi, par collection, l'empreinte de la configuration
+    qui produit ses chunks (découpage) : si elle change, les sources de la
+    collection sont ré-ingérées.
+    """
+
+    def __init__(self, manifest_path: str, embedding_model: str):
+        self.manifest_path = Path(manifest_path)
+        self.embedding_model = embedding_model
+        self.sources: Dict[str, Dict[str, Any]] = {}
+        self.collection_settings: Dict[str, str] = {}
+        self.dirty = False
+
+    @staticmethod
+    def _key(collection_name: str, source: str) -> str:
+        return f"{collection_name}:{source}"
+
+    def load(self):
+        """Charge le manifeste depuis le disque"""
+        self.sources = {}
+        self.collection_settings = {}
+        self.dirty = False
+
+        if not self.manifest_path.exists():
+            logger.info("Aucun manifeste d'ingestion trouvé, ingestion complète")
+            return
+
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+
+            if data.get('version') != MANIFEST_VERSION:
+                logger.warning("Version de manifeste incompatible, ingestion complète")
+                self.dirty = True
+                return
+
+            if data.get('embedding_model') != self.embedding_model:
+                logger.warning(
+                    f"Modèle d'embedding modifié ({data.get('embedding_model')} -> {self.embedding_model}), "
+                    "ingestion complète"
+                )
+                self.dirty = True
+                return
+
+            self.sources = data.get('sources', {})
+            self.collection_settings = data.get('collection_settings', {})
+            logger.info(f"Manifeste d'ingestion chargé: {len(self.sources)} sources suivies")
+
+        except Exception as e:
+            logger.error(f"Erreur lors du chargement du manifeste d'ingestion: {e}")
+            self.sources = {}
+
+    def save(self):
+        """Sauvegarde le manifeste de manière atomique"""
+        if not self.dirty:
+            return
+
+        try:
+            self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.manifest_path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'version': MANIFEST_VERSION,
+                    'embedding_model': self.embedding_model,
+                    'collection_settings': self.collection_settings,
+                    'sources': self.sources
+                }, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.manifest_path)
+            self.dirty = False
+            logger.debug(f"Manifeste d'ingestion sauvegardé: {len(self.sources)} sources")
+
+        except Exception as e:
+            logger.error(f"Erreur lors de la sauvegarde du manifeste d'ingestion: {e}")
+
+    def get(self, collection_name: str, source: str) -> Optional[Dict[str, Any]]:
+        """Retourne l'entrée d'une source, ou None si elle n'est pas suivie"""
+        return self.sources.get(self._key(collection_name, source))
+
+    def is_unchanged(self, collection_name: str, source: str, file_hash: str) -> bool:
+        """Indique si le fichier source est identique à la dernière ingestion"""
+        entry = self.get(collection_name, source)
+        return entry is not None and entry.get('file_hash') == file_hash
+
+    def update(self, collection_name: str, source: str, file_hash: str,
+               chunks: Dict[str, Dict[str, str]]):
+        """Enregistre l'état ingéré d'une source"""
+        self.sources[self._key(collection_name, source)] = {
+            'collection': collection_name,
+            'source': source,
+            'file_hash': file_hash,
+            'chunks': chunks
+        }
+        self.dirty = True
+
+    def remove(self, collection_name: str, source: str):
+        """Retire une source du manifeste"""
+        if self.sources.pop(self._key(collection_name, source), None) is not None:
+            self.dirty = True
+
+    def tracked_sources(self, collection_name: str) -> Set[str]:
+        """Retourne les sources suivies pour une collection"""
+        return {
+            entry['source'] for entry in self.sources.values()
+            if entry.get('collection') == collection_name
+        }
+
+    def tracked_chunk_ids(self, collection_name: str) -> Set[str]:
+        """Retourne les ids de chunks suivis pour une collection"""
+        chunk_ids = set()
+        for entry in self.sources.values():
+            if entry.get('collection') == collection_name:
+                chunk_ids.update(entry.get('chunks', {}).keys())
+        return chunk_ids
+
+    def ensure_collection_settings(self, collection_name: str, fingerprint: str):
+        """Force la ré-ingestion d'une collection si sa configuration de découpage a changé"""
+        previous = self.collection_settings.get(collection_name)
+        if previous == fingerprint:
+            return
+        if self.tracked_sources(collection_name):
+            logger.warning(
+                f"Configuration de {collection_name} modifiée ({previous} -> {fingerprint}), "
+                "ré-ingestion de ses sources"
+            )
+            self.reset_collection(collection_name)
+        self.collection_settings[collection_name] = fingerprint
+        self.dirty = True
+
+    def reset_collection(self, collection_name: str):
+        """Oublie toutes les sources d'une collection (force leur ré-ingestion)"""
+        keys = [key for key, entry in self.sources.items() if entry.get('collection') == collection_name]
+        for key in keys:
+            del self.sources[key]
+        if keys:
+            self.dirty = True
@@ -0,0 +1,71 @@
+"""Registre des objets décodés des collections UI (composants, layouts, images)"""
+
+import json
+from typing import List, Dict, Any, Optional
+import logging
+
+from .vector_store import CollectionObserver
+
+logger = logging.getLogger(__name__)
+
+
+class ItemRegistry(CollectionObserver):
+    """Objets décodés une seule fois, indexés par (collection, id)
+
+    Le champ 'data' des métadonnées est désérialisé à l'écriture (ou au
+    chargement initial) et non plus à chaque résultat de recherche. Les
+    objets du registre sont partagés entre les requêtes : ils ne doivent pas
+    être modifiés ; chaque résultat en est une copie superficielle portant
+    son propre relevance_score.
+    """
+
+    def __init__(self):
+        self._items: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    @staticmethod
+    def decode(metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Désérialise les données complètes d'un item, avec repli sur les métadonnées simples"""
+        try:
+            return json.loads(metadata.get('data', '{}'))
+        except (json.JSONDecodeError, TypeError):
+            return {key: value for key, value in metadata.items() if key != 'data'}
+
+    def load_collection(self, collection):
+        """Charge et décode tous les items d'une collection"""
+        existing = collection.get(include=["metadatas"])
+        self._items[collection.name] = {}
+        self.on_upsert(collection.name, existing['ids'], None, existing['metadatas'])
+        logger.info(f"Registre {collection.name}: {len(existing['ids'])} objets décodés")
+
+    def get(self, collection_name: str, item_id: str) -> Optional[Dict[str, Any]]:
+        """Retourne l'objet partagé (lecture seule) d'un item"""
+        return self._items.get(collection_name, {}).get(item_id)
+
+    def size(self, collection_name: str) -> int:
+        return len(self._items.get(collection_name, {}))
+
+    def hydrate(self, collection_name: str, ids: List[str], scores: List[float]) -> List[Dict[str, Any]]:
+        """Construit les résultats de recherche à partir des ids et des scores"""
+        items = self._items.get(collection_name, {})
+        results = []
+        for item_id, score in zip(ids, scores):
+            item = items.get(item_id)
+            if item is None:
+                continue
+            results.append({**item, 'relevance_score': score})
+        return results
+
+    def on_upsert(self, collection_name, ids, documents, metadatas):
+        if metadatas is None:
+            return
+        items = self._items.setdefault(collection_name, {})
+        for item_id, metadata in zip(ids, metadatas):
+            items[item_id] = self.decode(metadata)
+
+    def on_update(self, collection_name, ids, documents, metadatas):
+        self.on_upsert(collection_name, ids, documents, metadatas)
+
+    def on_delete(self, collection_name, ids):
+        items = self._items.get(collection_name, {})
+        for item_id in ids:
+            items.pop(item_id, None)
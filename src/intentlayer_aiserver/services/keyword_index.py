@@ -0,0 +1,134 @@
+"""Index inversé des mots-clés du catalogue d'images"""
+
+import re
+import threading
+from typing import List, Dict, Any, Optional, Set, Tuple
+import logging
+
+from .bm25_index import tokenize
+from .vector_store import CollectionObserver, matches_where
+
+logger = logging.getLogger(__name__)
+
+# Ids d'images écrits tels quels dans une requête ("smartphone_iphone15")
+_QUERY_ID_RE = re.compile(r"[\w\-./]+")
+
+# relevance_score d'une image couvrant tous les termes de la requête, sans
+# embedding : un classement par mots-clés seul n'est jamais une correspondance parfaite
+KEYWORD_MATCH_SCORE = 0.8
+
+
+def keyword_terms(metadata: Dict[str, Any]) -> Set[str]:
+    """Termes normalisés (casse, accents) des mots-clés d'une image"""
+    return set(tokenize(str(metadata.get('keywords', '')).replace(',', ' ')))
+
+
+def _id_key(value: Any) -> str:
+    return str(value).strip().lower()
+
+
+class KeywordIndex(CollectionObserver):
+    """Index inversé terme -> images, sur les mots-clés et l'id exact
+
+    Les mots-clés du catalogue sont choisis à la main : une image dont un
+    mot-clé, ou l'id complet, figure dans la requête est un candidat certain.
+    Le texte alternatif, rédigé librement, n'est pas indexé : un mot courant
+    ("photo", "fond") ne doit pas court-circuiter la recherche vectorielle.
+    La recherche ne fait que des lectures de dictionnaire sur les termes de
+    la requête, sans modèle d'embedding. L'index est tenu à jour par les
+    notifications d'écriture de la collection, comme l'index BM25.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Set[str]] = {}
+        self.ids: Dict[str, str] = {}
+        self.terms: Dict[str, Set[str]] = {}
+        self.metadatas: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def load_collection(self, collection):
+        """Indexe toutes les images existantes d'une collection"""
+        existing = collection.get(include=["metadatas"])
+        with self._lock:
+            self.postings.clear()
+            self.ids.clear()
+            self.terms.clear()
+            self.metadatas.clear()
+            self.on_upsert(collection.name, existing['ids'], None, existing['metadatas'])
+        logger.info(f"Index des mots-clés {collection.name}: {len(self)} images, {len(self.postings)} termes")
+
+    def _add(self, item_id: str, metadata: Dict[str, Any]):
+        terms = keyword_terms(metadata)
+        for term in terms:
+            self.postings.setdefault(term, set()).add(item_id)
+        if metadata.get('id'):
+            self.ids[_id_key(metadata['id'])] = item_id
+        self.terms[item_id] = terms
+        self.metadatas[item_id] = metadata
+
+    def _remove(self, item_id: str):
+        terms = self.terms.pop(item_id, None)
+        if terms is None:
+            return
+        metadata = self.metadatas.pop(item_id, {})
+        key = _id_key(metadata.get('id', ''))
+        if self.ids.get(key) == item_id:
+            del self.ids[key]
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.discard(item_id)
+            if not postings:
+                del self.postings[term]
+
+    def match(self, query: str, where: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """Retourne les (id, score) des images dont un mot-clé ou l'id figure dans la requête, par score décroissant
+
+        Le score est la part des termes de la requête couverts par les
+        mots-clés de l'image (tous pour un id exact), multipliée par
+        KEYWORD_MATCH_SCORE : il ne dépend pas des autres images trouvées.
+        """
+        query_terms = set(tokenize(query))
+        with self._lock:
+            matched: Dict[str, Set[str]] = {}
+            for term in query_terms:
+                for item_id in self.postings.get(term, ()):
+                    matched.setdefault(item_id, set()).add(term)
+            for token in _QUERY_ID_RE.findall(query.lower()):
+                item_id = self.ids.get(token.strip(".-/"))
+                if item_id is not None:
+                    matched[item_id] = query_terms
+            if where:
+                matched = {
+                    item_id: terms for item_id, terms in matched.items()
+                    if matches_where(self.metadatas[item_id], where)
+                }
+        scores = {
+            item_id: KEYWORD_MATCH_SCORE * len(terms) / max(len(query_terms), 1)
+            for item_id, terms in matched.items()
+        }
+        return sorted(scores.items(), key=lambda hit: hit[1], reverse=True)
+
+    def on_upsert(self, collection_name, ids, documents, metadatas):
+        if metadatas is None:
+            return
+        with self._lock:
+            for item_id, metadata in zip(ids, metadatas):
+                self._remove(item_id)
+                self._add(item_id, metadata or {})
+
+    def on_update(self, collection_name, ids, documents, metadatas):
+        self.on_upsert(collection_name, ids, documents, metadatas)
+
+    def on_delete(self, collection_name, ids):
+        with self._lock:
+            for item_id in ids:
+                self._remove(item_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'items': len(self.terms), 'terms': len(self.postings)}
@@ -0,0 +1,108 @@
+"""Assemblage des résultats de la base de connaissances en contexte compact pour le LLM"""
+
+from typing import List, Dict, Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Longueur du début d'un chunk recherchée dans le précédent pour détecter un recouvrement
+OVERLAP_PROBE_CHARS = 32
+
+
+def _strip_common_header(previous: str, following: str) -> str:
+    """Retire du chunk suivant les lignes d'en-tête qu'il répète (titre, en-tête de tableau)"""
+    previous_lines = previous.split("\n")
+    following_lines = following.split("\n")
+    common = 0
+    while (common < len(previous_lines) and common < len(following_lines) - 1
+           and previous_lines[common] == following_lines[common]):
+        common += 1
+    return "\n".join(following_lines[common:]).lstrip("\n") if common else following
+
+
+def _strip_overlap(previous: str, following: str) -> str:
+    """Retire du chunk suivant le début qu'il partage avec la fin du précédent"""
+    probe = following[:OVERLAP_PROBE_CHARS]
+    if not probe:
+        return following
+    position = previous.find(probe)
+    while position != -1:
+        # Le plus long recouvrement correspond à la première occurrence valide
+        overlap = len(previous) - position
+        if following[:overlap] == previous[position:]:
+            return following[overlap:].lstrip()
+        position = previous.find(probe, position + 1)
+    return following
+
+
+def merge_chunk_texts(previous: str, following: str) -> str:
+    """Concatène deux chunks consécutifs d'une même source sans leurs parties répétées"""
+    following = _strip_overlap(previous, _strip_common_header(previous, following))
+    if not following:
+        return previous
+    return f"{previous}\n{following}" if previous.endswith("\n") or following.startswith(("|", "-", "*")) \
+        else f"{previous}\n\n{following}"
+
+
+def build_knowledge_context(results: List[Dict[str, Any]],
+                            max_chars: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Fusionne les chunks contigus d'une même source et applique un budget de caractères
+
+    Les résultats (format de search_knowledge) sont regroupés par source ;
+    les chunks dont les chunk_index se suivent sont fusionnés en un passage,
+    débarrassé des recouvrements et des en-têtes répétés. Les passages sont
+    ensuite retenus par pertinence décroissante tant que le budget le permet
+    (le premier passage est tronqué s'il le dépasse seul).
+    """
+    groups: Dict[Any, List[Dict[str, Any]]] = {}
+    for position, result in enumerate(results):
+        metadata = result.get('metadata') or {}
+        if 'chunk_index' in metadata:
+            key = metadata.get('source')
+        else:
+            key = ('result', position)
+        groups.setdefault(key, []).append(result)
+
+    passages = []
+    for members in groups.values():
+        members.sort(key=lambda result: (result.get('metadata') or {}).get('chunk_index', 0))
+        current = None
+        for result in members:
+            metadata = result.get('metadata') or {}
+            index = metadata.get('chunk_index')
+            if current is not None and index is not None and index == current['metadata']['chunk_indexes'][-1] + 1:
+                current['content'] = merge_chunk_texts(current['content'], result['content'])
+                current['metadata']['chunk_indexes'].append(index)
+                current['relevance_score'] = max(current['relevance_score'], result.get('relevance_score', 0))
+                continue
+            current = {
+                **result,
+                'metadata': {**metadata, 'chunk_indexes': [index] if index is not None else []},
+                'relevance_score': result.get('relevance_score', 0)
+            }
+            passages.append(current)
+
+    passages.sort(key=lambda passage: passage['relevance_score'], reverse=True)
+
+    # Passages entièrement contenus dans un passage plus pertinent
+    unique = []
+    for passage in passages:
+        if not any(passage['content'] in kept['content'] for kept in unique):
+            unique.append(passage)
+
+    if max_chars is None or max_chars <= 0:
+        return unique
+
+    selected = []
+    used = 0
+    for passage in unique:
+        if used + len(passage['content']) <= max_chars:
+            selected.append(passage)
+            used += len(passage['content'])
+        elif not selected:
+            selected.append({**passage, 'content': passage['content'][:max(0, max_chars - 3)].rstrip() + "..."})
+            used = max_chars
+
+    if len(selected) < len(unique):
+        logger.debug(f"Contexte de connaissances: {len(selected)}/{len(unique)} passages retenus ({used} caractères)")
+    return selected
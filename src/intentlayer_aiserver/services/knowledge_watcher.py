@@ -0,0 +1,102 @@
+"""Surveillance du répertoire des connaissances pour le rechargement à chaud"""
+
+import asyncio
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, List, Dict, Any, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Signature d'un fichier : (date de modification en ns, taille)
+Signature = Tuple[int, int]
+
+
+class KnowledgeWatcher:
+    """Détecte par scrutation les fichiers de connaissances ajoutés, modifiés ou supprimés
+
+    Chaque scrutation ne lit que les métadonnées des fichiers (os.stat). Un
+    fichier modifié n'est transmis à `reload` qu'une fois sa signature
+    identique sur deux scrutations successives, pour ne pas ingérer un
+    fichier en cours d'écriture par l'éditeur. Le contenu est ensuite
+    comparé au manifeste d'ingestion : un fichier seulement touché ne
+    déclenche aucun encodage.
+    """
+
+    def __init__(self, root: Path, reload: Callable[[List[Path], List[Path]], Awaitable[Any]],
+                 interval: float, pattern: str = "**/*.md"):
+        self.root = Path(root)
+        self.reload = reload
+        self.interval = interval
+        self.pattern = pattern
+        self.known: Dict[str, Signature] = {}
+        self._previous: Dict[str, Signature] = {}
+        self.stats = {
+            'polls': 0,
+            'reloads': 0,
+            'files_changed': 0,
+            'files_removed': 0,
+            'last_reload': None
+        }
+
+    def snapshot(self) -> Dict[str, Signature]:
+        """Signatures des fichiers surveillés"""
+        signatures = {}
+        for file_path in self.root.glob(self.pattern):
+            try:
+                stat = file_path.stat()
+            except OSError:
+                # Fichier supprimé entre le parcours et la lecture de ses métadonnées
+                continue
+            signatures[str(file_path)] = (stat.st_mtime_ns, stat.st_size)
+        return signatures
+
+    def start(self):
+        """Prend l'état de référence, avant l'ingestion initiale
+
+        Un fichier modifié pendant l'ingestion est ainsi revu à la première
+        scrutation (sans encodage s'il avait déjà été ingéré dans son état final).
+        """
+        self.known = self.snapshot()
+        self._previous = dict(self.known)
+
+    async def poll(self):
+        """Compare l'état courant à l'état traité et recharge les fichiers concernés"""
+        current = await asyncio.to_thread(self.snapshot)
+        self.stats['polls'] += 1
+
+        changed = [
+            path for path, signature in current.items()
+            if signature != self.known.get(path) and signature == self._previous.get(path)
+        ]
+        removed = [path for path in self.known if path not in current]
+        self._previous = current
+        if not changed and not removed:
+            return
+
+        logger.info(f"Connaissances modifiées: {len(changed)} fichiers à recharger, {len(removed)} supprimés")
+        await self.reload([Path(path) for path in changed], [Path(path) for path in removed])
+
+        # En cas d'erreur, l'état traité n'avance pas : les fichiers seront revus
+        for path in changed:
+            self.known[path] = current[path]
+        for path in removed:
+            del self.known[path]
+        self.stats['reloads'] += 1
+        self.stats['files_changed'] += len(changed)
+        self.stats['files_removed'] += len(removed)
+        self.stats['last_reload'] = time.time()
+
+    async def run(self):
+        """Boucle de scrutation, jusqu'à l'annulation de la tâche"""
+        while True:
+            try:
+                await asyncio.sleep(self.interval)
+                await self.poll()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Erreur lors du rechargement à chaud des connaissances: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'files': len(self.known), 'interval': self.interval}
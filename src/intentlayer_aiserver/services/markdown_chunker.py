@@ -0,0 +1,228 @@
+"""Découpage des documents Markdown en chunks dimensionnés en tokens"""
+
+import re
+from typing import Callable, List, Dict, Any, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_LIST_ITEM_RE = re.compile(r"^(\s*)(?:[-*+]|\d+[.)])\s+")
+_TABLE_ROW_RE = re.compile(r"^\s*\|")
+_TABLE_SEPARATOR_RE = re.compile(r"^\s*\|?[\s:|-]+\|?\s*$")
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+")
+
+HEADING_SEPARATOR = " > "
+# Tokens ajoutés par le modèle autour de chaque texte ([CLS], [SEP])
+SPECIAL_TOKENS = 2
+
+
+def approximate_token_count(text: str) -> int:
+    """Estimation du nombre de tokens sans tokenizer (~4 caractères par token)"""
+    return (len(text) + 3) // 4
+
+
+def load_token_counter(model, model_name: str) -> Callable[[str], int]:
+    """Compteur de tokens basé sur le tokenizer du modèle d'embedding
+
+    Le client du serveur d'embeddings n'embarque pas de tokenizer : il est
+    alors chargé seul via transformers (quelques Mo, pas les poids du modèle).
+    """
+    tokenizer = getattr(model, 'tokenizer', None)
+    if tokenizer is None:
+        try:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+        except Exception as e:
+            logger.warning(f"Tokenizer de {model_name} indisponible, estimation du nombre de tokens: {e}")
+            return approximate_token_count
+
+    def count_tokens(text: str) -> int:
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    return count_tokens
+
+
+def model_token_window(model) -> Optional[int]:
+    """Nombre maximal de tokens encodés par le modèle (au-delà, le texte est tronqué)"""
+    window = getattr(model, 'max_seq_length', None)
+    return int(window) if window else None
+
+
+def parse_markdown(content: str) -> List[Dict[str, Any]]:
+    """Découpe un document en sections {path, heading, blocks}
+
+    Chaque bloc est un tuple (type, texte) avec type parmi paragraph, list,
+    table et code ; les blocs de code et les tableaux ne sont jamais coupés
+    par le parseur.
+    """
+    lines = content.splitlines()
+    sections = [{'path': [], 'heading': None, 'blocks': []}]
+    stack: List[Tuple[int, str]] = []
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if not line.strip():
+            i += 1
+            continue
+
+        fence = _FENCE_RE.match(line)
+        if fence:
+            end = i + 1
+            while end < len(lines) and not lines[end].lstrip().startswith(fence.group(1)):
+                end += 1
+            sections[-1]['blocks'].append(('code', "\n".join(lines[i:end + 1])))
+            i = end + 1
+            continue
+
+        heading = _HEADING_RE.match(line)
+        if heading:
+            level = len(heading.group(1))
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            stack.append((level, heading.group(2).strip()))
+            sections.append({'path': [title for _, title in stack], 'heading': line.strip(), 'blocks': []})
+            i += 1
+            continue
+
+        if _TABLE_ROW_RE.match(line):
+            kind = 'table'
+            continues = lambda next_line: _TABLE_ROW_RE.match(next_line)
+        elif _LIST_ITEM_RE.match(line):
+            kind = 'list'
+            continues = lambda next_line: _LIST_ITEM_RE.match(next_line) or (
+                next_line[:1].isspace() and next_line.strip()
+            )
+        else:
+            kind = 'paragraph'
+            continues = lambda next_line: next_line.strip() and not (
+                _HEADING_RE.match(next_line) or _FENCE_RE.match(next_line)
+                or _TABLE_ROW_RE.match(next_line) or _LIST_ITEM_RE.match(next_line)
+            )
+
+        end = i + 1
+        while end < len(lines) and continues(lines[end]):
+            end += 1
+        sections[-1]['blocks'].append((kind, "\n".join(lines[i:end])))
+        i = end
+
+    return sections
+
+
+class MarkdownChunker:
+    """Découpe un document Markdown en respectant titres, listes et tableaux
+
+    Un chunk ne déborde jamais de sa section : il commence par le titre de la
+    section et porte le chemin des titres parents dans `heading_path`. Les
+    blocs trop longs pour le budget sont coupés à leurs frontières naturelles
+    (lignes d'un tableau, en répétant l'en-tête ; éléments d'une liste ;
+    phrases d'un paragraphe, avec un recouvrement de `overlap_tokens`).
+    """
+
+    def __init__(self, max_tokens: int, overlap_tokens: int = 0,
+                 count_tokens: Callable[[str], int] = approximate_token_count):
+        self.max_tokens = max(16, max_tokens)
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 2))
+        self.count_tokens = count_tokens
+
+    def split(self, content: str) -> List[Dict[str, Any]]:
+        """Retourne les chunks {text, heading_path, token_count} d'un document"""
+        chunks = []
+        for section in parse_markdown(content):
+            if not section['blocks']:
+                continue
+
+            heading = section['heading']
+            budget = self.max_tokens - (self.count_tokens(heading) + 1 if heading else 0)
+            pieces = []
+            for kind, text in section['blocks']:
+                pieces.extend(self._split_block(kind, text, max(8, budget)))
+
+            for body in self._pack(pieces, "\n\n", max(8, budget)):
+                text = f"{heading}\n\n{body}" if heading else body
+                chunks.append({
+                    'text': text,
+                    'heading_path': HEADING_SEPARATOR.join(section['path']),
+                    'token_count': self.count_tokens(text)
+                })
+
+        return chunks
+
+    def _split_block(self, kind: str, text: str, budget: int) -> List[str]:
+        if self.count_tokens(text) <= budget:
+            return [text]
+
+        lines = text.splitlines()
+        if kind == 'table':
+            header_size = 2 if len(lines) > 1 and _TABLE_SEPARATOR_RE.match(lines[1]) else 1
+            header = "\n".join(lines[:header_size])
+            return self._pack(lines[header_size:], "\n", budget, prefix=header)
+
+        if kind == 'list':
+            indent = len(_LIST_ITEM_RE.match(lines[0]).group(1))
+            items = []
+            for line in lines:
+                item = _LIST_ITEM_RE.match(line)
+                if item and len(item.group(1)) <= indent or not items:
+                    items.append(line)
+                else:
+                    items[-1] += "\n" + line
+            return self._pack(items, "\n", budget)
+
+        if kind == 'code':
+            return self._pack(lines, "\n", budget)
+
+        sentences = [sentence for sentence in _SENTENCE_RE.split(text) if sentence.strip()]
+        return self._pack(sentences, " ", budget, overlap=self.overlap_tokens)
+
+    def _hard_split(self, text: str, budget: int) -> List[str]:
+        """Coupe un texte sans frontière naturelle (phrase ou ligne trop longue) mot à mot"""
+        pieces, current, size = [], [], 0
+        for word in text.split():
+            tokens = self.count_tokens(word) + 1
+            if current and size + tokens > budget:
+                pieces.append(" ".join(current))
+                current, size = [], 0
+            current.append(word)
+            size += tokens
+        if current:
+            pieces.append(" ".join(current))
+        return pieces
+
+    def _pack(self, units: List[str], joiner: str, budget: int,
+              prefix: Optional[str] = None, overlap: int = 0) -> List[str]:
+        """Regroupe des unités consécutives en morceaux d'au plus `budget` tokens"""
+        prefix_tokens = self.count_tokens(prefix) + 1 if prefix else 0
+        limit = max(8, budget - prefix_tokens)
+
+        sized = []
+        for unit in units:
+            tokens = self.count_tokens(unit)
+            if tokens <= limit:
+                sized.append((unit, tokens))
+            else:
+                sized.extend((piece, self.count_tokens(piece)) for piece in self._hard_split(unit, limit))
+
+        pieces: List[List[Tuple[str, int]]] = []
+        current: List[Tuple[str, int]] = []
+        size = 0
+        for unit, tokens in sized:
+            if current and size + tokens + 1 > limit:
+                pieces.append(current)
+                # Recouvrement : dernières unités du morceau précédent
+                carried, carried_size = [], 0
+                for previous in reversed(current):
+                    if carried_size + previous[1] + 1 > overlap or carried_size + previous[1] + tokens + 2 > limit:
+                        break
+                    carried.insert(0, previous)
+                    carried_size += previous[1] + 1
+                current, size = carried, carried_size
+            current.append((unit, tokens))
+            size += tokens + 1
+        if current:
+            pieces.append(current)
+
+        texts = [joiner.join(unit for unit, _ in piece) for piece in pieces]
+        return [f"{prefix}\n{text}" for text in texts] if prefix else texts
@@ -0,0 +1,269 @@
+"""Index vectoriel en mémoire (matrice NumPy) pour les petites collections"""
+
+import threading
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+
+from .vector_store import VectorCollection, DEFAULT_INCLUDE, matches_where
+
+logger = logging.getLogger(__name__)
+
+
+class MatrixIndex:
+    """Matrice float32 contiguë de vecteurs normalisés, interrogée par produit scalaire
+
+    Le top-k est obtenu par un seul produit matrice-vecteur suivi d'un
+    argpartition. Les distances retournées valent 2 - 2·cos, soit la distance
+    L2 au carré entre vecteurs unitaires : elles sont donc comparables à
+    celles de ChromaDB/FAISS pour un modèle d'embedding normalisé.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.dim: Optional[int] = None
+        self.size = 0
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self.ids: List[str] = []
+        self.documents: List[Optional[str]] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.row_by_id: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_arrays(cls, name: str, ids: List[str], vectors: np.ndarray,
+                    documents: List[Optional[str]], metadatas: List[Dict[str, Any]]) -> "MatrixIndex":
+        """Construit un index en une passe à partir de tableaux déjà alignés"""
+        index = cls(name)
+        if not ids:
+            return index
+        index.dim = int(vectors.shape[1])
+        index._matrix = np.ascontiguousarray(cls._normalize(np.asarray(vectors, dtype=np.float32)))
+        index.size = len(ids)
+        index.ids = list(ids)
+        index.documents = list(documents)
+        index.metadatas = list(metadatas)
+        index.row_by_id = {chunk_id: row for row, chunk_id in enumerate(index.ids)}
+        return index
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Vue sur les lignes occupées de la matrice"""
+        return self._matrix[:self.size]
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _reserve(self, capacity: int):
+        """Agrandit la matrice (capacité doublée) pour amortir les ajouts"""
+        if capacity <= self._matrix.shape[0]:
+            return
+        new_capacity = max(capacity, 2 * self._matrix.shape[0], 16)
+        matrix = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        matrix[:self.size] = self._matrix[:self.size]
+        self._matrix = matrix
+
+    def upsert(self, ids: List[str], embeddings, documents: Optional[List[str]] = None,
+               metadatas: Optional[List[Dict[str, Any]]] = None):
+        """Ajoute ou remplace des vecteurs"""
+        if not ids:
+            return
+
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+
+            self._reserve(self.size + len(ids))
+            for i, chunk_id in enumerate(ids):
+                row = self.row_by_id.get(chunk_id)
+                if row is None:
+                    row = self.size
+                    self.size += 1
+                    self.row_by_id[chunk_id] = row
+                    self.ids.append(chunk_id)
+                    self.documents.append(None)
+                    self.metadatas.append({})
+                self._matrix[row] = vectors[i]
+                if documents is not None:
+                    self.documents[row] = documents[i]
+                if metadatas is not None:
+                    self.metadatas[row] = metadatas[i]
+
+    def update(self, ids: List[str], documents: Optional[List[str]] = None,
+               metadatas: Optional[List[Dict[str, Any]]] = None):
+        """Met à jour documents et métadonnées sans toucher aux vecteurs"""
+        with self._lock:
+            for i, chunk_id in enumerate(ids):
+                row = self.row_by_id.get(chunk_id)
+                if row is None:
+                    continue
+                if documents is not None:
+                    self.documents[row] = documents[i]
+                if metadatas is not None:
+                    self.metadatas[row] = metadatas[i]
+
+    def delete(self, ids: List[str]):
+        """Supprime des vecteurs (la dernière ligne prend la place de la ligne supprimée)"""
+        with self._lock:
+            for chunk_id in ids:
+                row = self.row_by_id.pop(chunk_id, None)
+                if row is None:
+                    continue
+                last = self.size - 1
+                if row != last:
+                    moved_id = self.ids[last]
+                    self._matrix[row] = self._matrix[last]
+                    self.ids[row] = moved_id
+                    self.documents[row] = self.documents[last]
+                    self.metadatas[row] = self.metadatas[last]
+                    self.row_by_id[moved_id] = row
+                self.ids.pop()
+                self.documents.pop()
+                self.metadatas.pop()
+                self.size -= 1
+
+    def ids_matching(self, where: Optional[Dict[str, Any]]) -> List[str]:
+        """Ids dont les métadonnées satisfont le filtre"""
+        with self._lock:
+            return [self.ids[row] for row in range(self.size) if matches_where(self.metadatas[row], where)]
+
+    def search(self, query_embedding, n_results: int,
+               where: Optional[Dict[str, Any]] = None,
+               candidate_rows: Optional[np.ndarray] = None):
+        """Retourne (lignes, scores cosinus) des n_results meilleurs vecteurs"""
+        with self._lock:
+            if self.size == 0 or n_results <= 0:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+            query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+            norm = np.linalg.norm(query)
+            if norm > 0:
+                query = query / norm
+
+            rows = candidate_rows
+            if where:
+                allowed = [row for row in range(self.size) if matches_where(self.metadatas[row], where)]
+                rows = np.asarray(allowed, dtype=np.int64) if rows is None else np.intersect1d(rows, allowed)
+
+            if rows is None:
+                scores = self.matrix @ query
+                rows = np.arange(self.size)
+            else:
+                if len(rows) == 0:
+                    return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+                scores = self._matrix[rows] @ query
+
+            k = min(n_results, len(scores))
+            if k < len(scores):
+                top = np.argpartition(-scores, k - 1)[:k]
+            else:
+                top = np.arange(len(scores))
+            top = top[np.argsort(-scores[top])]
+            return rows[top], scores[top]
+
+    def search_ids(self, query_embedding, ids: List[str], n_results: int) -> List[Tuple[str, float]]:
+        """Retourne les (id, score cosinus) des n_results meilleurs vecteurs parmi des ids candidats"""
+        with self._lock:
+            rows = np.fromiter(
+                (self.row_by_id[chunk_id] for chunk_id in ids if chunk_id in self.row_by_id), dtype=np.int64
+            )
+            rows, scores = self.search(query_embedding, n_results, candidate_rows=rows)
+            return [(self.ids[row], float(score)) for row, score in zip(rows, scores)]
+
+    def query(self, query_embeddings, n_results: int = 10,
+              where: Optional[Dict[str, Any]] = None,
+              include: Sequence[str] = DEFAULT_INCLUDE) -> Dict[str, Any]:
+        """Recherche au format des résultats ChromaDB"""
+        results = {'ids': [], 'distances': [], 'documents': [], 'metadatas': [], 'embeddings': []}
+        with self._lock:
+            for query_embedding in query_embeddings:
+                rows, scores = self.search(query_embedding, n_results, where)
+                results['ids'].append([self.ids[row] for row in rows])
+                results['distances'].append([float(2.0 - 2.0 * score) for score in scores])
+                results['documents'].append([self.documents[row] for row in rows])
+                results['metadatas'].append([self.metadatas[row] for row in rows])
+                results['embeddings'].append(self._matrix[rows].copy() if "embeddings" in include else None)
+
+        for key in ("distances", "documents", "metadatas", "embeddings"):
+            if key not in include:
+                results[key] = None
+        return results
+
+
+class MirroredCollection(VectorCollection):
+    """Collection persistante doublée d'un miroir MatrixIndex pour les recherches
+
+    Les écritures sont appliquées à la collection sous-jacente puis au
+    miroir ; les requêtes sont servies par le miroir uniquement.
+    """
+
+    def __init__(self, collection, matrix_index: MatrixIndex):
+        self.collection = collection
+        self.matrix_index = matrix_index
+        self.name = collection.name
+
+    @classmethod
+    def from_collection(cls, collection) -> "MirroredCollection":
+        """Charge les vecteurs existants de la collection dans un nouveau miroir"""
+        matrix_index = MatrixIndex(collection.name)
+        existing = collection.get(include=["embeddings", "documents", "metadatas"])
+        if existing['ids']:
+            matrix_index.upsert(
+                existing['ids'],
+                np.asarray(existing['embeddings'], dtype=np.float32),
+                existing['documents'],
+                existing['metadatas']
+            )
+        logger.info(f"Miroir en mémoire de {collection.name}: {matrix_index.size} vecteurs")
+        return cls(collection, matrix_index)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        new = [i for i, chunk_id in enumerate(ids) if chunk_id not in self.matrix_index.row_by_id]
+        self.collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        self.matrix_index.upsert(
+            [ids[i] for i in new],
+            [embeddings[i] for i in new],
+            [documents[i] for i in new] if documents is not None else None,
+            [metadatas[i] for i in new] if metadatas is not None else None
+        )
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        self.matrix_index.upsert(ids, embeddings, documents, metadatas)
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        self.collection.update(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        if embeddings is not None:
+            rows = [self.matrix_index.row_by_id.get(chunk_id) for chunk_id in ids]
+            self.matrix_index.upsert(
+                ids,
+                embeddings,
+                documents if documents is not None else [self.matrix_index.documents[row] for row in rows],
+                metadatas if metadatas is not None else [self.matrix_index.metadatas[row] for row in rows]
+            )
+        else:
+            self.matrix_index.update(ids, documents, metadatas)
+
+    def delete(self, ids=None, where=None):
+        if where is not None:
+            matching = set(self.matrix_index.ids_matching(where))
+            ids = [chunk_id for chunk_id in (ids if ids is not None else matching) if chunk_id in matching]
+        if not ids:
+            return
+        self.collection.delete(ids=ids)
+        self.matrix_index.delete(ids)
+
+    def get(self, ids=None, where=None, include=("metadatas", "documents"), limit=None, offset=None):
+        return self.collection.get(ids=ids, where=where, include=include, limit=limit, offset=offset)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=DEFAULT_INCLUDE):
+        return self.matrix_index.query(query_embeddings, n_results=n_results, where=where, include=include)
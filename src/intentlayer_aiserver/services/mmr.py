@@ -0,0 +1,41 @@
+"""Reranking par maximal marginal relevance (diversité des résultats)"""
+
+from typing import List
+
+import numpy as np
+
+
+def mmr_select(vectors, relevance, top_k: int, lambda_mult: float = 0.7) -> List[int]:
+    """Indices des candidats retenus par MMR, dans l'ordre de sélection
+
+    Chaque étape retient le candidat qui maximise
+    lambda × pertinence − (1 − lambda) × similarité maximale aux candidats
+    déjà retenus. Les similarités cosinus entre candidats sont calculées en
+    un seul produit matriciel ; la redondance de chaque candidat est tenue à
+    jour par un maximum vectoriel, sans boucle sur les paires.
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    top_k = min(top_k, len(relevance))
+    if top_k <= 0:
+        return []
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms > 0, norms, 1)
+    similarity = vectors @ vectors.T
+
+    first = int(np.argmax(relevance))
+    selected = [first]
+    redundancy = similarity[first].copy()
+    available = np.ones(len(relevance), dtype=bool)
+    available[first] = False
+
+    for _ in range(1, top_k):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+
+    return selected
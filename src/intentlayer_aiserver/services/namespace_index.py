@@ -0,0 +1,216 @@
+"""Index par namespace (domaine ou boutique), chargés à la première requête"""
+
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+import logging
+
+import numpy as np
+
+from .vector_store import VectorCollection, DEFAULT_INCLUDE
+from .matrix_index import MatrixIndex
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE_KEY = "namespace"
+
+
+def namespace_filter(where: Optional[Dict[str, Any]], namespace: Optional[str],
+                     shared_namespace: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Combine un filtre de métadonnées et un namespace en un filtre au format ChromaDB
+
+    Si `shared_namespace` est fourni, le contenu partagé qu'il contient reste
+    visible depuis tous les namespaces.
+    """
+    if not namespace:
+        return where or None
+    if shared_namespace and shared_namespace != namespace:
+        clause = {NAMESPACE_KEY: {"$in": [namespace, shared_namespace]}}
+    else:
+        clause = {NAMESPACE_KEY: namespace}
+    if not where:
+        return clause
+    return {"$and": [clause, where]}
+
+
+def split_namespace_filter(where: Optional[Dict[str, Any]]) -> Tuple[Optional[List[str]], Optional[Dict[str, Any]]]:
+    """Extrait d'un filtre les namespaces ciblés ($eq ou $in) et le reste du filtre
+
+    Retourne (None, where) si le filtre ne restreint pas la recherche à une
+    liste de namespaces.
+    """
+    if not where:
+        return None, where
+
+    if list(where) == ["$and"]:
+        clauses = list(where["$and"])
+    else:
+        clauses = [{key: value} for key, value in where.items()]
+
+    namespaces = None
+    remaining = []
+    for clause in clauses:
+        value = clause.get(NAMESPACE_KEY) if len(clause) == 1 else None
+        if isinstance(value, dict) and list(value) == ["$eq"]:
+            value = value["$eq"]
+        if isinstance(value, dict) and list(value) == ["$in"]:
+            value = list(value["$in"])
+        if isinstance(value, str):
+            value = [value]
+        if namespaces is None and isinstance(value, list) and all(isinstance(item, str) for item in value):
+            namespaces = value
+        else:
+            remaining.append(clause)
+
+    if namespaces is None:
+        return None, where
+    if not remaining:
+        return namespaces, None
+    return namespaces, remaining[0] if len(remaining) == 1 else {"$and": remaining}
+
+
+class NamespacedCollection(VectorCollection):
+    """Collection doublée d'un MatrixIndex par namespace pour les recherches filtrées
+
+    Une requête dont le filtre cible un namespace est servie par l'index de
+    ce namespace, chargé depuis la collection à la première requête : son
+    coût dépend du corpus du namespace, pas de la collection entière. Les
+    écritures sont appliquées à la collection puis aux index déjà chargés ;
+    les autres requêtes sont déléguées à la collection.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.name = collection.name
+        self.partitions: Dict[str, MatrixIndex] = {}
+        self._lock = threading.RLock()
+
+    def _partition(self, namespace: str) -> MatrixIndex:
+        with self._lock:
+            partition = self.partitions.get(namespace)
+            if partition is None:
+                existing = self.collection.get(
+                    where={NAMESPACE_KEY: namespace},
+                    include=["embeddings", "documents", "metadatas"]
+                )
+                partition = MatrixIndex.from_arrays(
+                    f"{self.name}:{namespace}",
+                    existing['ids'],
+                    np.asarray(existing['embeddings'], dtype=np.float32) if existing['ids'] else None,
+                    existing['documents'],
+                    existing['metadatas']
+                )
+                self.partitions[namespace] = partition
+                logger.info(f"Index du namespace {namespace} chargé pour {self.name}: {partition.size} vecteurs")
+            return partition
+
+    def reset(self):
+        """Oublie les index chargés (rechargés à la prochaine requête)"""
+        with self._lock:
+            self.partitions.clear()
+
+    def _locate(self, chunk_id: str) -> Optional[MatrixIndex]:
+        for partition in self.partitions.values():
+            if chunk_id in partition.row_by_id:
+                return partition
+        return None
+
+    def _place(self, ids, embeddings, documents, metadatas):
+        """Range des items dans les index chargés de leur namespace"""
+        with self._lock:
+            if not self.partitions:
+                return
+            for i, chunk_id in enumerate(ids):
+                previous = self._locate(chunk_id)
+                if previous is not None:
+                    row = previous.row_by_id[chunk_id]
+                    vector = previous.matrix[row].copy() if embeddings is None else embeddings[i]
+                    document = documents[i] if documents is not None else previous.documents[row]
+                    metadata = metadatas[i] if metadatas is not None else previous.metadatas[row]
+                    previous.delete([chunk_id])
+                elif embeddings is not None and metadatas is not None:
+                    vector = embeddings[i]
+                    document = documents[i] if documents is not None else None
+                    metadata = metadatas[i]
+                else:
+                    # Namespace inconnu : l'item sera présent au prochain chargement de son index
+                    continue
+
+                partition = self.partitions.get((metadata or {}).get(NAMESPACE_KEY))
+                if partition is not None:
+                    partition.upsert([chunk_id], [vector], [document], [metadata])
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        with self._lock:
+            existing = set(self.collection.get(ids=ids, include=[])['ids']) if self.partitions else set()
+            self.collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+            new = [i for i, chunk_id in enumerate(ids) if chunk_id not in existing]
+            self._place(
+                [ids[i] for i in new],
+                [embeddings[i] for i in new],
+                [documents[i] for i in new] if documents is not None else None,
+                [metadatas[i] for i in new] if metadatas is not None else None
+            )
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        with self._lock:
+            self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+            self._place(ids, embeddings, documents, metadatas)
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        with self._lock:
+            self.collection.update(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+            self._place(ids, embeddings, documents, metadatas)
+
+    def delete(self, ids=None, where=None):
+        with self._lock:
+            if where is not None:
+                ids = self.collection.get(ids=ids, where=where, include=[])['ids']
+            if not ids:
+                return
+            self.collection.delete(ids=ids)
+            for partition in self.partitions.values():
+                partition.delete(ids)
+
+    def get(self, ids=None, where=None, include=("metadatas", "documents"), limit=None, offset=None):
+        return self.collection.get(ids=ids, where=where, include=include, limit=limit, offset=offset)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=DEFAULT_INCLUDE):
+        namespaces, remaining = split_namespace_filter(where)
+        if namespaces is None:
+            return self.collection.query(query_embeddings=query_embeddings, n_results=n_results,
+                                         where=where, include=include)
+        if len(namespaces) == 1:
+            return self._partition(namespaces[0]).query(query_embeddings, n_results=n_results,
+                                                        where=remaining, include=include)
+
+        # Plusieurs namespaces : top-k de chaque index puis fusion par distance
+        partials = [
+            self._partition(namespace).query(query_embeddings, n_results=n_results,
+                                             where=remaining, include=tuple(include) + ("distances",))
+            for namespace in dict.fromkeys(namespaces)
+        ]
+        keys = [key for key in ('ids', 'distances', 'documents', 'metadatas', 'embeddings')
+                if key == 'ids' or key in include]
+        results = {key: [] if key in keys else None
+                   for key in ('ids', 'distances', 'documents', 'metadatas', 'embeddings')}
+        for i in range(len(query_embeddings)):
+            hits = sorted(
+                (
+                    (partial['distances'][i][j], {key: partial[key][i][j] for key in keys})
+                    for partial in partials
+                    for j in range(len(partial['ids'][i]))
+                ),
+                key=lambda hit: hit[0]
+            )[:n_results]
+            for key in keys:
+                values = [hit[key] for _, hit in hits]
+                results[key].append(np.asarray(values) if key == 'embeddings' else values)
+        return results
+
+    def get_stats(self) -> Dict[str, int]:
+        """Taille des index de namespace chargés"""
+        with self._lock:
+            return {namespace: partition.size for namespace, partition in self.partitions.items()}
@@ -0,0 +1,385 @@
+"""Index structuré des produits du catalogue (table en colonnes, filtres exacts par facette)"""
+
+import re
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+import logging
+
+import numpy as np
+
+from .bm25_index import tokenize
+from .rag_cache import fold_accents
+
+logger = logging.getLogger(__name__)
+
+# Caractéristiques du catalogue portant le prix et la marque d'un produit
+PRICE_SPEC = "prix"
+BRAND_SPEC = "marque"
+
+# Tris acceptés par ProductIndex.search
+SORTS = ("relevance", "price_asc", "price_desc", "name")
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_SPEC_RE = re.compile(r"^\s*[-*+]\s+\*\*(.+?)\*\*\s*:?\s*(.*?)\s*$")
+
+# Montant : "1 229€", "1.229 €", "9,99 euros", "1000" (pas "1" de "1.5 pouces")
+_AMOUNT = (
+    r"(?<![\d.,])(\d+(?:[ .\u00a0\u202f]\d{3})*(?:[.,]\d{1,2})?)(?![ .,\u00a0\u202f]?\d)"
+    r"(?:\s*(?:€|euros?\b|eur\b))?"
+)
+# Unités qui font d'un nombre une caractéristique ou une durée et non un prix
+# ("plus de 16 GB", "sous 2 semaines", "sous 3 jours ouvrés")
+_UNITS = (
+    r"(?!\s*(?:[gmkt]?[bo]|mp|mah|g?hz|w|kg|g|cm|mm|po|pouces?|s|sec|secondes?|min|minutes?|h|heures?"
+    r"|j|jours?|nuits?|sem|semaines?|mois|ans?|annees?|personnes?|pers|couverts?|places?|x|%)\b)"
+)
+_AMOUNT_RE = re.compile(_AMOUNT + _UNITS)
+_THOUSANDS_RE = re.compile(r"(?<=\d)[ .\u00a0\u202f](?=\d{3}(?!\d))")
+# Devise d'un montant : sans elle, un nombre n'est un prix que si la requête parle de prix
+_CURRENCY_RE = re.compile(r"€|\beuros?\b|\beur\b")
+_PRICE_WORD_RE = re.compile(r"\b(?:prix|tarifs?|budget|coute|coutent|cout|price|cost)\b")
+
+# Contraintes de prix d'une requête (texte en minuscules, sans accents)
+_PRICE_RANGE_RE = re.compile(rf"\b(?:entre|between|de|from)\s+{_AMOUNT}{_UNITS}\s*(?:et|and|a|to|-)\s*{_AMOUNT_RE.pattern}")
+_PRICE_MAX_RE = re.compile(
+    rf"(?:\b(?:moins de|pas plus de|sous|max(?:imum)?|jusqu'a|jusqu a|inferieurs? a|budget(?: de| max(?:imum)?)?"
+    rf"|under|below|less than|up to)|<=?)\s*{_AMOUNT_RE.pattern}"
+)
+_PRICE_MIN_RE = re.compile(
+    rf"(?:\b(?:plus de|au moins|a partir de|min(?:imum)?|superieurs? a|over|above|more than|from)|>=?)\s*{_AMOUNT_RE.pattern}"
+)
+_SORT_PATTERNS = (
+    (re.compile(r"\b(?:les? moins chers?|moins chere?s?|cheapest|pas cher)\b"), "price_asc"),
+    (re.compile(r"\b(?:les? plus chers?|most expensive|haut de gamme)\b"), "price_desc"),
+)
+
+
+def _price_match(pattern: re.Pattern, text: str, price_context: bool) -> Optional[re.Match]:
+    """Première contrainte de prix d'une requête : montant avec devise, ou nombre dans une question de prix"""
+    for match in pattern.finditer(text):
+        if price_context or _CURRENCY_RE.search(match.group(0)):
+            return match
+    return None
+
+# Mots d'une requête produit qui ne relèvent pas de la recherche en texte libre
+FILLER_TERMS = frozenset("""
+prix cout coute coutent tarif euro euros eur cher chers chere cheres produit produits article articles
+moins plus entre sous max maximum min minimum jusqu dessous dessus budget quels quelles montre montrez
+voir cherche recherche veux voudrais avez propose proposez disponible disponibles
+price cost cheap cheapest expensive under below over above between less more than show find
+""".split())
+
+
+def parse_price(text: str) -> Optional[float]:
+    """Premier montant d'un texte ("1 229€" -> 1229.0), None sans montant"""
+    match = _AMOUNT_RE.search(text)
+    return _amount(match.group(1)) if match else None
+
+
+def _amount(number: str) -> Optional[float]:
+    try:
+        return float(_THOUSANDS_RE.sub('', number.strip()).replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def _stem(term: str) -> str:
+    """Forme singulière approximative d'un terme ("portables" -> "portable")"""
+    if len(term) > 3 and term[-1] in "sx":
+        return term[:-1]
+    return term
+
+
+def _terms(text: str) -> List[str]:
+    return [_stem(term) for term in tokenize(text)]
+
+
+def parse_product_catalog(content: str, source: str) -> List[Dict[str, Any]]:
+    """Extrait les produits d'un catalogue Markdown
+
+    Un titre de niveau 2 ouvre une catégorie, un titre de niveau 3 un
+    produit dont les caractéristiques sont les lignes `- **Clé**: valeur`.
+    Seules les entrées ayant un prix lisible sont des produits (les
+    rubriques de services n'en ont pas).
+    """
+    products = []
+    category = None
+    current = None
+    for line in content.splitlines():
+        heading = _HEADING_RE.match(line)
+        if heading:
+            level, title = len(heading.group(1)), heading.group(2)
+            if level <= 2:
+                category = title if level == 2 else None
+                current = None
+            elif level == 3:
+                current = {'name': title, 'category': category, 'specs': {}}
+                products.append(current)
+            continue
+        spec = _SPEC_RE.match(line)
+        if spec and current is not None:
+            current['specs'][spec.group(1).strip()] = spec.group(2)
+
+    stem = Path(source).stem
+    parsed = []
+    for product in products:
+        specs = {fold_accents(key).lower(): value for key, value in product['specs'].items()}
+        price = parse_price(specs.get(PRICE_SPEC, ""))
+        if price is None:
+            continue
+        parsed.append({
+            'id': f"{stem}:{product['name']}",
+            'name': product['name'],
+            'category': product['category'],
+            'brand': specs.get(BRAND_SPEC),
+            'price': price,
+            'specs': product['specs'],
+            'source': source
+        })
+    return parsed
+
+
+class ProductIndex:
+    """Table en colonnes des produits, avec un index par facette
+
+    Les prix sont un tableau numpy trié une fois (une tranche de prix est
+    deux recherches dichotomiques), la catégorie et la marque des codes
+    entiers avec, pour chaque valeur, les lignes qui la portent. Une requête
+    ("portables à moins de 1000€") est filtrée et triée exactement sur ces
+    colonnes ; seul le texte libre restant est classé par similarité
+    vectorielle, sur les embeddings des produits calculés à la demande.
+
+    La table est reconstruite entièrement à chaque changement d'un
+    catalogue (quelques centaines de lignes) puis remplacée d'un bloc : une
+    recherche lit toujours une seule version cohérente, sans verrou.
+    """
+
+    def __init__(self, price_buckets: Optional[List[float]] = None,
+                 category_aliases: Optional[Dict[str, str]] = None):
+        self.price_buckets = sorted(price_buckets or [])
+        self.category_aliases = category_aliases or {}
+        self.sources: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._table = self._build([])
+
+    def __len__(self) -> int:
+        return len(self._table['products'])
+
+    def _build(self, products: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Construit les colonnes et les index de facettes d'une liste de produits"""
+        table = {
+            'products': products,
+            'prices': np.array([product['price'] for product in products], dtype=np.float64),
+            'embeddings': None
+        }
+        table['price_order'] = np.argsort(table['prices'], kind="stable")
+        table['sorted_prices'] = table['prices'][table['price_order']]
+
+        for facet, aliases in (('category', self.category_aliases), ('brand', {})):
+            values = sorted({product[facet] for product in products if product[facet]})
+            codes = {value: code for code, value in enumerate(values)}
+            column = np.array([codes.get(product[facet], -1) for product in products], dtype=np.int32)
+            table[facet] = {
+                'values': values,
+                'codes': column,
+                # Lignes de chaque valeur de la facette
+                'rows': {value: np.flatnonzero(column == code) for value, code in codes.items()},
+                # Termes reconnus dans les requêtes -> valeurs de la facette
+                'terms': self._facet_terms(values, aliases)
+            }
+        return table
+
+    @staticmethod
+    def _facet_terms(values: List[str], aliases: Dict[str, str]) -> Dict[str, set]:
+        terms: Dict[str, set] = {}
+        for value in values:
+            for term in _terms(value):
+                terms.setdefault(term, set()).add(value)
+        for alias, value in aliases.items():
+            if value in values:
+                for term in _terms(alias):
+                    terms.setdefault(term, set()).add(value)
+        return terms
+
+    def _rebuild(self):
+        self._table = self._build([product for products in self.sources.values() for product in products])
+
+    def set_source(self, source: str, content: str) -> int:
+        """(Re)charge les produits d'un fichier de catalogue ; retourne leur nombre"""
+        products = parse_product_catalog(content, source)
+        with self._lock:
+            self.sources[source] = products
+            self._rebuild()
+        logger.info(f"Index produits: {len(products)} produits chargés depuis {source}")
+        return len(products)
+
+    def remove_source(self, source: str):
+        """Retire les produits d'un fichier de catalogue supprimé"""
+        with self._lock:
+            if self.sources.pop(source, None) is not None:
+                self._rebuild()
+
+    def pending_embeddings(self) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+        """(table, textes des produits) si les embeddings de la table courante restent à calculer"""
+        table = self._table
+        if table['embeddings'] is not None or not table['products']:
+            return None, []
+        texts = [
+            f"{product['name']} ({product['category'] or ''}). "
+            + ". ".join(f"{key}: {value}" for key, value in product['specs'].items())
+            for product in table['products']
+        ]
+        return table, texts
+
+    def set_embeddings(self, table: Dict[str, Any], embeddings):
+        """Enregistre les embeddings (normalisés) des produits d'une table"""
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(table['products']), -1)
+        table['embeddings'] = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def parse_query(self, text: str) -> Dict[str, Any]:
+        """Sépare une requête en filtres exacts, tri et texte libre
+
+        "ordinateurs portables Apple à moins de 1500€" donne
+        {'filters': {'category': ['Ordinateurs Portables'], 'brand': ['Apple'],
+        'max_price': 1500.0}, 'sort': None, 'text': '', 'intent': True}.
+
+        Un nombre sans devise n'est un prix que dans une question de prix
+        ("budget de 800"), jamais suivi d'une unité ("sous 2 semaines").
+        `intent` indique une question sur le catalogue : contrainte de prix,
+        catégorie, tri ou mot de prix ; une marque seule ("des écouteurs
+        Apple ?") ne suffit pas.
+        """
+        table = self._table
+        folded = fold_accents(text).lower()
+        price_context = bool(_PRICE_WORD_RE.search(folded))
+        filters: Dict[str, Any] = {}
+
+        match = _price_match(_PRICE_RANGE_RE, folded, price_context)
+        if match:
+            filters['min_price'], filters['max_price'] = sorted((_amount(match.group(1)), _amount(match.group(2))))
+            folded = folded.replace(match.group(0), " ")
+        for pattern, key in ((_PRICE_MAX_RE, 'max_price'), (_PRICE_MIN_RE, 'min_price')):
+            match = _price_match(pattern, folded, price_context)
+            if match and key not in filters:
+                filters[key] = _amount(match.group(1))
+                folded = folded.replace(match.group(0), " ")
+
+        sort = None
+        for pattern, value in _SORT_PATTERNS:
+            if pattern.search(folded):
+                sort = value
+                folded = pattern.sub(" ", folded)
+                break
+
+        free_terms = []
+        for term in tokenize(folded):
+            matched = False
+            for facet in ('category', 'brand'):
+                values = table[facet]['terms'].get(_stem(term))
+                if values:
+                    filters.setdefault(facet, set()).update(values)
+                    matched = True
+            if not matched and term not in FILLER_TERMS and not term.isdigit():
+                free_terms.append(term)
+        for facet in ('category', 'brand'):
+            if facet in filters:
+                filters[facet] = sorted(filters[facet])
+
+        intent = price_context or sort is not None or any(key != 'brand' for key in filters)
+        return {'filters': filters, 'sort': sort, 'text': " ".join(free_terms), 'intent': intent}
+
+    def search(self, filters: Optional[Dict[str, Any]] = None, query_embedding: Optional[List[float]] = None,
+               sort: Optional[str] = None, top_k: Optional[int] = None) -> Dict[str, Any]:
+        """Filtre, trie et limite la table des produits
+
+        - **filters**: {category: [..], brand: [..], min_price, max_price}, valeurs exactes
+        - **query_embedding**: classement des produits filtrés par similarité au texte libre
+        - **sort**: relevance (défaut avec query_embedding), price_asc (défaut), price_desc, name
+
+        Retourne {products, total, facets, sort} ; les facettes comptent les produits filtrés.
+        """
+        filters = filters or {}
+        if sort is not None and sort not in SORTS:
+            raise ValueError(f"Tri inconnu: {sort} (attendu: {', '.join(SORTS)})")
+
+        table = self._table
+        size = len(table['products'])
+        mask = np.ones(size, dtype=bool)
+        for facet in ('category', 'brand'):
+            wanted = filters.get(facet)
+            if not wanted:
+                continue
+            facet_mask = np.zeros(size, dtype=bool)
+            for value in ([wanted] if isinstance(wanted, str) else wanted):
+                rows = table[facet]['rows'].get(value)
+                if rows is not None:
+                    facet_mask[rows] = True
+            mask &= facet_mask
+
+        low, high = filters.get('min_price'), filters.get('max_price')
+        if low is not None or high is not None:
+            start = np.searchsorted(table['sorted_prices'], low, side="left") if low is not None else 0
+            end = np.searchsorted(table['sorted_prices'], high, side="right") if high is not None else size
+            price_mask = np.zeros(size, dtype=bool)
+            price_mask[table['price_order'][start:end]] = True
+            mask &= price_mask
+
+        rows = np.flatnonzero(mask)
+        scores = None
+        if query_embedding is not None and table['embeddings'] is not None and len(rows):
+            query = np.asarray(query_embedding, dtype=np.float32)
+            scores = table['embeddings'][rows] @ (query / max(float(np.linalg.norm(query)), 1e-12))
+
+        if sort is None or (sort == "relevance" and scores is None):
+            # Sans texte libre à classer, tri par prix croissant
+            sort = "relevance" if scores is not None else "price_asc"
+        if sort == "relevance":
+            order = np.argsort(-scores, kind="stable")
+        elif sort == "price_desc":
+            order = np.argsort(-table['prices'][rows], kind="stable")
+        elif sort == "name":
+            order = np.argsort([table['products'][row]['name'].lower() for row in rows], kind="stable")
+        else:
+            order = np.argsort(table['prices'][rows], kind="stable")
+
+        products = []
+        for position in (order if top_k is None else order[:top_k]):
+            product = dict(table['products'][rows[position]])
+            if scores is not None:
+                # Distance L2 au carré entre vecteurs unitaires : 1 - (2 - 2·cos)
+                product['relevance_score'] = float(2 * scores[position] - 1)
+            products.append(product)
+
+        return {
+            'products': products,
+            'total': int(len(rows)),
+            'facets': self._facet_counts(table, rows),
+            'sort': sort
+        }
+
+    def _facet_counts(self, table: Dict[str, Any], rows: np.ndarray) -> Dict[str, Dict[str, int]]:
+        """Nombre de produits par catégorie, marque et tranche de prix"""
+        facets = {}
+        for facet in ('category', 'brand'):
+            values = table[facet]['values']
+            codes = table[facet]['codes'][rows]
+            counts = np.bincount(codes[codes >= 0], minlength=len(values))
+            facets[facet] = {value: int(count) for value, count in zip(values, counts) if count}
+
+        bounds = self.price_buckets
+        labels = [f"< {bounds[0]:g}"] + [f"{low:g} - {high:g}" for low, high in zip(bounds, bounds[1:])] \
+            + [f">= {bounds[-1]:g}"] if bounds else ["all"]
+        buckets = np.bincount(np.searchsorted(bounds, table['prices'][rows], side="right"), minlength=len(labels))
+        facets['price'] = {label: int(count) for label, count in zip(labels, buckets) if count}
+        return facets
+
+    def get_stats(self) -> Dict[str, Any]:
+        table = self._table
+        return {
+            'products': len(table['products']),
+            'sources': len(self.sources),
+            'categories': len(table['category']['values']),
+            'brands': len(table['brand']['values']),
+            'embedded': table['embeddings'] is not None
+        }
@@ -0,0 +1,52 @@
+"""Quantification des embeddings (float16, int8 avec échelle par vecteur)"""
+
+from typing import Optional, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_TYPES = ("none", "float16", "int8")
+
+# Lignes déquantifiées à la fois lors du premier passage (borne la mémoire temporaire)
+SCORE_CHUNK_ROWS = 16384
+
+
+def quantize(vectors: np.ndarray, quantization: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Retourne (codes, échelles) ; les échelles ne concernent que int8
+
+    int8 : chaque vecteur est divisé par max(|v|) / 127 puis arrondi, l'échelle
+    float32 du vecteur est conservée pour reconstruire les produits scalaires.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if quantization == "float16":
+        return vectors.astype(np.float16), None
+
+    if quantization == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0 if len(vectors) else np.zeros(0, dtype=np.float32)
+        scales = scales.astype(np.float32)
+        safe_scales = np.where(scales == 0, 1.0, scales)[:, None]
+        codes = np.clip(np.rint(vectors / safe_scales), -127, 127).astype(np.int8)
+        return codes, scales
+
+    raise ValueError(f"Quantification inconnue: {quantization} (attendue: {', '.join(QUANTIZATION_TYPES[1:])})")
+
+
+def approximate_scores(codes: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray,
+                       rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """Produits scalaires approchés entre la requête et les vecteurs quantifiés
+
+    Le calcul est fait par blocs de SCORE_CHUNK_ROWS lignes pour ne jamais
+    déquantifier toute la matrice en float32.
+    """
+    total = len(rows) if rows is not None else len(codes)
+    scores = np.empty(total, dtype=np.float32)
+    for start in range(0, total, SCORE_CHUNK_ROWS):
+        stop = min(start + SCORE_CHUNK_ROWS, total)
+        block_rows = rows[start:stop] if rows is not None else slice(start, stop)
+        block = np.asarray(codes[block_rows], dtype=np.float32) @ query
+        if scales is not None:
+            block *= scales[block_rows]
+        scores[start:stop] = block
+    return scores
@@ -0,0 +1,167 @@
+"""Caches du service RAG"""
+
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+
+from .vector_store import CollectionObserver
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def fold_accents(text: str) -> str:
+    """Supprime les accents (é -> e, ç -> c, œ reste œ)"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def normalize_query(text: str) -> str:
+    """Normalise une requête : casse, espaces et accents
+
+    "  Quels sont vos HORAIRES ? " et "quels sont vos horaires ?" donnent la
+    même clé. Le modèle par défaut (all-MiniLM-L6-v2, non sensible à la casse)
+    applique déjà ces transformations à la tokenisation.
+    """
+    return _WHITESPACE_RE.sub(' ', fold_accents(text).lower()).strip()
+
+
+class EmbeddingCache:
+    """Cache LRU borné : requête normalisée -> embedding"""
+
+    def __init__(self, max_size: int = 2048):
+        self.max_size = max(0, max_size)
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """Retourne l'embedding mis en cache, ou None"""
+        embedding = self._entries.get(key)
+        if embedding is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return embedding
+
+    def put(self, key: str, embedding: List[float]):
+        """Ajoute un embedding, en évinçant les entrées les moins récemment utilisées"""
+        if self.max_size == 0:
+            return
+
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Vide le cache"""
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Statistiques du cache"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class SearchResultCache(CollectionObserver):
+    """Cache LRU borné des résultats de recherche, avec TTL et invalidation par collection
+
+    Les clés commencent par le nom de la collection interrogée. Toute écriture
+    dans une collection (notifiée via ObservedCollection) supprime ses entrées
+    et incrémente sa génération : un résultat calculé avant l'écriture mais
+    stocké après est ignoré.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0):
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl_seconds
+        self._entries: "OrderedDict[Tuple, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def generation(self, collection_name: str) -> int:
+        """Génération courante d'une collection, à relever avant de lancer la recherche"""
+        return self._generations.get(collection_name, 0)
+
+    def get(self, key: Tuple) -> Optional[List[Dict[str, Any]]]:
+        """Retourne une copie des résultats en cache, ou None (absents ou expirés)"""
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl > 0 and time.monotonic() - entry[0] > self.ttl:
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return [dict(item) for item in entry[1]]
+
+    def put(self, key: Tuple, results: List[Dict[str, Any]], generation: int):
+        """Stocke des résultats si la collection n'a pas été modifiée depuis `generation`"""
+        if self.max_entries == 0 or generation != self.generation(key[0]):
+            return
+
+        self._entries[key] = (time.monotonic(), [dict(item) for item in results])
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, collection_name: str):
+        """Supprime les résultats d'une collection"""
+        self._generations[collection_name] = self.generation(collection_name) + 1
+        stale = [key for key in self._entries if key[0] == collection_name]
+        for key in stale:
+            del self._entries[key]
+        if stale:
+            self.invalidations += 1
+            logger.debug(f"Cache de résultats: {len(stale)} entrées de {collection_name} invalidées")
+
+    def clear(self):
+        """Vide le cache"""
+        for collection_name in {key[0] for key in self._entries}:
+            self._generations[collection_name] = self.generation(collection_name) + 1
+        self._entries.clear()
+
+    def on_upsert(self, collection_name, ids, documents, metadatas):
+        self.invalidate(collection_name)
+
+    def on_update(self, collection_name, ids, documents, metadatas):
+        self.invalidate(collection_name)
+
+    def on_delete(self, collection_name, ids):
+        self.invalidate(collection_name)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Statistiques du cache"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
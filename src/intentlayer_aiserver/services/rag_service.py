@@ -3,110 +3,363 @@
 import os
 import json
 import asyncio
+import time
 from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 import logging
 
-import chromadb
-from chromadb.config import Settings as ChromaSettings
 from sentence_transformers import SentenceTransformer
 import numpy as np
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 
 from ..core.config import settings
+from .ingestion_manifest import IngestionManifest, hash_bytes, hash_text, hash_metadata
+from .embedding_executor import EmbeddingExecutor
+from .embedding_server import EmbeddingServerSupervisor, RemoteEmbeddingModel
+from .rag_cache import EmbeddingCache, SearchResultCache, normalize_query
+from .vector_store import create_vector_store, ObservedCollection
+from .matrix_index import MatrixIndex, MirroredCollection
+from .item_registry import ItemRegistry
+from .index_artifact import ArtifactVectorStore
+from .bm25_index import BM25Index
+from .keyword_index import KeywordIndex
+from .markdown_chunker import MarkdownChunker, load_token_counter, model_token_window
+from .knowledge_context import build_knowledge_context
+from .namespace_index import NamespacedCollection, namespace_filter
+from .chunk_dedup import DeduplicatedCollection, with_source_references
+from .mmr import mmr_select
+from .product_index import ProductIndex
+from .knowledge_watcher import KnowledgeWatcher
 
 logger = logging.getLogger(__name__)
 
+
+class RAGNotReadyError(RuntimeError):
+    """Recherche demandée avant la fin de l'initialisation du service RAG"""
+
+    def __init__(self, phase: str):
+        super().__init__(f"Service RAG non initialisé (phase: {phase})")
+        self.phase = phase
+
+
 class RAGService:
     """Service de Retrieval-Augmented Generation"""
     
+    # Collections dont les items sont des objets sérialisés dans la métadonnée 'data'
+    DATA_COLLECTIONS = ("ui_components", "ui_layouts", "image_catalog")
+    
+    # Modes de recherche dans la base de connaissances
+    KNOWLEDGE_SEARCH_MODES = ("vector", "hybrid", "lexical")
+    
+    # Phases de l'initialisation, exposées par /health
+    PHASES = ("pending", "loading_model", "opening_index", "ingesting", "ready", "failed")
+    
     def __init__(self):
         self.embedding_model = None
-        self.chroma_client = None
+        self.embedding_executor = None
+        self.embedding_cache = EmbeddingCache(settings.rag_embedding_cache_size)
+        self.result_cache = SearchResultCache(
+            settings.rag_result_cache_size,
+            settings.rag_result_cache_ttl
+        )
+        self.vector_store = None
         self.ui_components_collection = None
         self.layouts_collection = None
         self.knowledge_collection = None
         self.images_collection = None
+        self.collections = {}
+        self.item_registry = ItemRegistry()
+        self.bm25_index = BM25Index()
+        self.image_keywords = KeywordIndex()
+        self.matrix_indexes: Dict[str, MatrixIndex] = {}
+        self.namespace_indexes: Dict[str, NamespacedCollection] = {}
+        self.knowledge_dedup: Optional[DeduplicatedCollection] = None
+        self.product_index = ProductIndex(settings.rag_product_price_buckets, settings.rag_product_category_aliases)
+        self._product_embedding_lock = asyncio.Lock()
         self.text_splitter = None
+        self.chunking_fingerprint = None
+        self.manifest = None
         self.initialized = False
+        self.phase = "pending"
+        self.error: Optional[str] = None
+        self.phase_durations: Dict[str, float] = {}
+        self._phase_started = time.monotonic()
+        self._init_task: Optional[asyncio.Task] = None
+        self._merge_task: Optional[asyncio.Task] = None
+        self.embedding_supervisor: Optional[EmbeddingServerSupervisor] = None
+        self._embedding_health_task: Optional[asyncio.Task] = None
+        self.knowledge_watcher: Optional[KnowledgeWatcher] = None
+        self._watch_task: Optional[asyncio.Task] = None
+        self._runtime_write_lock = asyncio.Lock()
+    
+    def _set_phase(self, phase: str):
+        """Passe à la phase d'initialisation suivante en mémorisant la durée de la précédente"""
+        now = time.monotonic()
+        self.phase_durations[self.phase] = round(now - self._phase_started, 3)
+        self.phase = phase
+        self._phase_started = now
+        logger.info(f"Service RAG: phase {phase}")
+    
+    def get_status(self) -> Dict[str, Any]:
+        """État de l'initialisation (phase courante, durées des phases terminées, erreur)"""
+        return {
+            'phase': self.phase,
+            'ready': self.initialized,
+            'phase_elapsed_s': round(time.monotonic() - self._phase_started, 3),
+            'phase_durations_s': dict(self.phase_durations),
+            'error': self.error
+        }
+    
+    def start_background_initialization(self) -> asyncio.Task:
+        """Lance l'initialisation dans une tâche de fond et rend la main immédiatement
+        
+        Les recherches lèvent RAGNotReadyError tant que la phase "ready" n'est
+        pas atteinte ; un appel à initialize() attend la même tâche.
+        """
+        if self._init_task is None or (self._init_task.done() and not self.initialized):
+            self._init_task = asyncio.create_task(self._initialize())
+            # L'erreur est déjà journalisée et exposée par get_status()
+            self._init_task.add_done_callback(
+                lambda task: task.cancelled() or task.exception()
+            )
+        return self._init_task
     
     async def initialize(self):
-        """Initialise le service RAG"""
+        """Initialise le service RAG (idempotent : attend une initialisation déjà en cours)"""
+        if self.initialized:
+            return
+        await asyncio.shield(self.start_background_initialization())
+    
+    async def _initialize(self):
+        """Charge le modèle, ouvre les collections puis ingère les données initiales"""
         try:
             logger.info("Initialisation du service RAG...")
+            self.error = None
             
-            # Initialisation du modèle d'embedding
-            logger.info(f"Chargement du modèle d'embedding: {settings.embedding_model}")
-            self.embedding_model = SentenceTransformer(settings.embedding_model)
+            # Initialisation du modèle d'embedding (hors boucle d'événements)
+            self._set_phase("loading_model")
+            if settings.embedding_server_enabled:
+                # Modèle porté par un processus partagé entre les workers
+                self.embedding_model = await asyncio.to_thread(self._connect_embedding_server)
+                self._embedding_health_task = asyncio.create_task(self._periodic_embedding_server_check())
+            else:
+                logger.info(f"Chargement du modèle d'embedding: {settings.embedding_model}")
+                self.embedding_model = await asyncio.to_thread(SentenceTransformer, settings.embedding_model)
+            self.embedding_executor = EmbeddingExecutor(
+                self.embedding_model,
+                batch_window_ms=settings.rag_encoder_batch_window_ms,
+                max_batch_size=settings.rag_encoder_max_batch_size,
+                max_workers=settings.rag_encoder_workers
+            )
             
-            # Initialisation de ChromaDB
-            await self._initialize_chromadb()
+            # Initialisation de la base vectorielle
+            self._set_phase("opening_index")
+            await self._initialize_vector_store()
             
-            # Initialisation du text splitter
-            self.text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=settings.rag_chunk_size,
-                chunk_overlap=settings.rag_chunk_overlap,
-                separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""]
-            )
+            # Initialisation du découpage (chargement éventuel du tokenizer hors boucle)
+            self.text_splitter = await asyncio.to_thread(self._create_text_splitter)
             
-            # Chargement des données initiales
-            await self._load_initial_data()
+            if self.vector_store.prebuilt:
+                # Artefact pré-construit : aucune ingestion, le modèle ne sert qu'aux requêtes
+                logger.info("Index ouvert depuis l'artefact, ingestion ignorée")
+                if settings.rag_watch_knowledge:
+                    logger.warning("Rechargement à chaud ignoré : les connaissances sont portées par l'artefact")
+                self._merge_task = asyncio.create_task(self._periodic_delta_merge())
+            else:
+                # Chargement du manifeste d'ingestion
+                self.manifest = IngestionManifest(
+                    str(self.vector_store.path / "ingestion_manifest.json"),
+                    settings.embedding_model
+                )
+                self.manifest.load()
+                
+                # État de référence du rechargement à chaud, pris avant l'ingestion
+                if settings.rag_watch_knowledge:
+                    self.knowledge_watcher = KnowledgeWatcher(
+                        Path(settings.knowledge_base_path),
+                        self._reload_knowledge_files,
+                        settings.rag_watch_interval
+                    )
+                    await asyncio.to_thread(self.knowledge_watcher.start)
+                
+                # Chargement des données initiales
+                self._set_phase("ingesting")
+                await self._load_initial_data()
+            
+            # Table des produits, reconstruite à chaque démarrage depuis les catalogues
+            await asyncio.to_thread(self._load_product_catalogs)
+            
+            if self.knowledge_watcher:
+                self._watch_task = asyncio.create_task(self.knowledge_watcher.run())
             
             self.initialized = True
+            self._set_phase("ready")
             logger.info("Service RAG initialisé avec succès")
             
         except Exception as e:
             logger.error(f"Erreur lors de l'initialisation du service RAG: {e}")
+            self.error = str(e)
+            self._set_phase("failed")
             raise
     
-    async def _initialize_chromadb(self):
-        """Initialise ChromaDB"""
-        try:
-            # Création du répertoire de données
-            os.makedirs(settings.vector_db_path, exist_ok=True)
-            
-            # Configuration ChromaDB
-            chroma_settings = ChromaSettings(
-                persist_directory=settings.vector_db_path,
-                anonymized_telemetry=False
-            )
-            
-            self.chroma_client = chromadb.PersistentClient(
-                path=settings.vector_db_path,
-                settings=chroma_settings
+    def _create_text_splitter(self):
+        """Crée le découpeur de documents selon settings.rag_chunking_strategy"""
+        if settings.rag_chunking_strategy == "recursive":
+            self.chunking_fingerprint = f"recursive:{settings.rag_chunk_size}:{settings.rag_chunk_overlap}"
+            return RecursiveCharacterTextSplitter(
+                chunk_size=settings.rag_chunk_size,
+                chunk_overlap=settings.rag_chunk_overlap,
+                separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""]
             )
+
+        # Les chunks ne doivent pas dépasser la fenêtre du modèle (sinon tronqués à l'encodage)
+        max_tokens = settings.rag_chunk_max_tokens
+        window = model_token_window(self.embedding_model)
+        if window:
+            max_tokens = min(max_tokens, window - 2)
+        self.chunking_fingerprint = f"markdown:{settings.embedding_model}:{max_tokens}:{settings.rag_chunk_overlap_tokens}"
+        logger.info(f"Découpage Markdown: {max_tokens} tokens max par chunk")
+        return MarkdownChunker(
+            max_tokens,
+            settings.rag_chunk_overlap_tokens,
+            load_token_counter(self.embedding_model, settings.embedding_model)
+        )
+
+    def _split_document(self, content: str) -> List[Dict[str, Any]]:
+        """Découpe un document en chunks {text, heading_path?, token_count?}"""
+        if isinstance(self.text_splitter, MarkdownChunker):
+            return self.text_splitter.split(content)
+        return [{'text': text} for text in self.text_splitter.split_text(content)]
+
+    def _connect_embedding_server(self) -> RemoteEmbeddingModel:
+        """Démarre (si besoin) le serveur d'embeddings et retourne un client compatible encode()"""
+        self.embedding_supervisor = EmbeddingServerSupervisor(
+            settings.embedding_server_socket,
+            settings.embedding_model,
+            start_timeout=settings.embedding_server_start_timeout,
+            idle_timeout=settings.embedding_server_idle_timeout,
+            batch_window_ms=settings.rag_encoder_batch_window_ms,
+            max_batch_size=settings.rag_encoder_max_batch_size
+        )
+        self.embedding_supervisor.ensure_running()
+        logger.info(f"Connecté au serveur d'embeddings: {settings.embedding_server_socket}")
+        return RemoteEmbeddingModel(settings.embedding_server_socket)
+    
+    async def _periodic_embedding_server_check(self):
+        """Vérification périodique du serveur d'embeddings, relancé s'il ne répond plus"""
+        while True:
+            try:
+                await asyncio.sleep(settings.embedding_server_health_interval)
+                if await asyncio.to_thread(self.embedding_supervisor.ensure_running):
+                    logger.warning("Serveur d'embeddings relancé")
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Erreur lors de la vérification du serveur d'embeddings: {e}")
+    
+    async def _initialize_vector_store(self):
+        """Initialise la base vectorielle hors boucle d'événements (chargement des index et miroirs)"""
+        await asyncio.to_thread(self._open_vector_store)
+    
+    def _open_vector_store(self):
+        """Ouvre la base vectorielle (artefact pré-construit, sinon ChromaDB ou FAISS selon settings.vector_db_type)"""
+        try:
+            if settings.rag_index_artifact_path:
+                self.vector_store = ArtifactVectorStore(
+                    settings.rag_index_artifact_path, settings.embedding_model, settings.rag_rescore_factor
+                )
+            else:
+                self.vector_store = create_vector_store(settings.vector_db_type, settings.vector_db_path)
             
             # Création des collections
-            self.ui_components_collection = self.chroma_client.get_or_create_collection(
+            self.ui_components_collection = self.vector_store.get_or_create_collection(
                 name="ui_components",
                 metadata={"description": "Documentation des composants UI"}
             )
             
-            self.layouts_collection = self.chroma_client.get_or_create_collection(
+            self.layouts_collection = self.vector_store.get_or_create_collection(
                 name="ui_layouts",
                 metadata={"description": "Layouts et positionnements des composants"}
             )
             
-            self.knowledge_collection = self.chroma_client.get_or_create_collection(
+            self.knowledge_collection = self.vector_store.get_or_create_collection(
                 name="knowledge_base",
                 metadata={"description": "Base de connaissances du site"}
             )
             
-            self.images_collection = self.chroma_client.get_or_create_collection(
+            self.images_collection = self.vector_store.get_or_create_collection(
                 name="image_catalog",
                 metadata={"description": "Catalogue d'images avec descriptions"}
             )
             
-            logger.info("ChromaDB initialisé avec succès")
+            collections = {
+                "ui_components": self.ui_components_collection,
+                "ui_layouts": self.layouts_collection,
+                "knowledge_base": self.knowledge_collection,
+                "image_catalog": self.images_collection
+            }
+            
+            for name, collection in collections.items():
+                # Miroir en mémoire des petites collections (recherche par produit matriciel) ;
+                # inutile pour un artefact, déjà recherché en mémoire
+                if name in settings.rag_matrix_index_collections and not self.vector_store.prebuilt:
+                    collection = MirroredCollection.from_collection(collection)
+                    self.matrix_indexes[name] = collection.matrix_index
+                
+                # Index par namespace, chargés à la première recherche filtrée sur un namespace ;
+                # un artefact filtre directement sur sa colonne de métadonnées (filter_mask)
+                # sans copier les vecteurs du namespace dans chaque worker
+                if name in settings.rag_namespace_index_collections and not self.vector_store.prebuilt:
+                    collection = NamespacedCollection(collection)
+                    self.namespace_indexes[name] = collection
+                
+                # Notification des écritures aux index dérivés et au cache de résultats
+                collections[name] = ObservedCollection(collection, [self.result_cache])
+            
+            # Registre des objets décodés des collections UI
+            for name in self.DATA_COLLECTIONS:
+                self.item_registry.load_collection(collections[name])
+                collections[name].add_observer(self.item_registry)
+            
+            # Index des mots-clés du catalogue d'images
+            self.image_keywords.load_collection(collections["image_catalog"])
+            collections["image_catalog"].add_observer(self.image_keywords)
+            
+            # Index lexical BM25 de la base de connaissances
+            self.bm25_index.load_collection(collections["knowledge_base"])
+            collections["knowledge_base"].add_observer(self.bm25_index)
+            
+            # Chunks quasi identiques de la base de connaissances stockés une seule fois
+            if settings.rag_dedup_enabled:
+                self.knowledge_dedup = DeduplicatedCollection(
+                    collections["knowledge_base"], settings.rag_dedup_similarity, settings.rag_dedup_max_hamming
+                )
+                self.knowledge_dedup.load()
+                collections["knowledge_base"] = self.knowledge_dedup
+            
+            self.collections = collections
+            self.ui_components_collection = collections["ui_components"]
+            self.layouts_collection = collections["ui_layouts"]
+            self.knowledge_collection = collections["knowledge_base"]
+            self.images_collection = collections["image_catalog"]
+            
+            logger.info(f"Base vectorielle initialisée avec succès ({self.vector_store.backend_type})")
             
         except Exception as e:
-            logger.error(f"Erreur lors de l'initialisation de ChromaDB: {e}")
+            logger.error(f"Erreur lors de l'initialisation de la base vectorielle: {e}")
             raise
     
     async def _load_initial_data(self):
         """Charge les données initiales dans les collections"""
         try:
+            # Vérification de la cohérence entre le manifeste et la base vectorielle
+            self._check_manifest_consistency()
+            
+            # Une configuration modifiée (découpage, namespaces) invalide les chunks de la collection
+            for name in self.collections:
+                self.manifest.ensure_collection_settings(name, self._collection_fingerprint(name))
+
             # Chargement des composants UI
             await self._load_ui_components()
             
@@ -118,11 +371,170 @@ class RAGService:
             
             # Chargement du catalogue d'images
             await self._load_image_catalog()
-            
+
         except Exception as e:
             logger.error(f"Erreur lors du chargement des données initiales: {e}")
             # Ne pas lever l'exception pour permettre le démarrage même sans données
-    
+        finally:
+            self.vector_store.persist()
+            self.manifest.save()
+
+    def _check_manifest_consistency(self):
+        """Invalide les entrées du manifeste dont les vecteurs ont disparu de la base"""
+        for collection in (
+            self.ui_components_collection,
+            self.layouts_collection,
+            self.knowledge_collection,
+            self.images_collection
+        ):
+            tracked_ids = self.manifest.tracked_chunk_ids(collection.name)
+            if tracked_ids and collection.count() < len(tracked_ids):
+                logger.warning(
+                    f"Collection {collection.name} incomplète par rapport au manifeste, "
+                    "ré-ingestion de ses sources"
+                )
+                self.manifest.reset_collection(collection.name)
+
+    def _collection_fingerprint(self, collection_name: str) -> str:
+        """Empreinte de la configuration qui détermine les chunks et métadonnées d'une collection"""
+        fingerprint = f"namespace:{settings.rag_default_namespace}"
+        if collection_name == "knowledge_base":
+            namespace_map = json.dumps(settings.rag_namespace_map, sort_keys=True)
+            fingerprint = f"{self.chunking_fingerprint}|{fingerprint}|{namespace_map}"
+            if settings.rag_dedup_enabled:
+                fingerprint += f"|dedup:{settings.rag_dedup_similarity}:{settings.rag_dedup_max_hamming}"
+        return fingerprint
+
+    def _read_source_file(self, collection, file_path: Path) -> Tuple[str, Optional[bytes]]:
+        """Lit un fichier source et retourne (empreinte, contenu) ; contenu None si inchangé"""
+        raw = file_path.read_bytes()
+        file_hash = hash_bytes(raw)
+        if self.manifest.is_unchanged(collection.name, str(file_path), file_hash):
+            return file_hash, None
+        return file_hash, raw
+
+    async def _sync_sources(self, collection, sources: List[Dict[str, Any]], background: bool = False):
+        """Synchronise les chunks de plusieurs sources avec la collection
+
+        Chaque source est un dict {source, file_hash, items, purge_legacy}.
+        Seuls les chunks nouveaux ou modifiés sont ré-encodés (par lots, toutes
+        sources confondues) ; les chunks dont seules les métadonnées changent
+        sont mis à jour sans embedding, et les chunks disparus sont supprimés.
+        En arrière-plan (background), l'encodage cède la place aux requêtes.
+        """
+        to_embed = {}
+        to_update = {}
+        removed_ids = set()
+
+        for source_data in sources:
+            source = source_data['source']
+            entry = self.manifest.get(collection.name, source)
+            previous_chunks = entry.get('chunks', {}) if entry else {}
+
+            # Première ingestion suivie : purge des chunks d'une version antérieure sans manifeste
+            if entry is None and source_data.get('purge_legacy'):
+                collection.delete(where={"source": source})
+
+            chunks = {}
+            for item in source_data['items']:
+                fingerprint = {
+                    'content': hash_text(item['text']),
+                    'metadata': hash_metadata(item['metadata'])
+                }
+                chunks[item['id']] = fingerprint
+
+                previous = previous_chunks.get(item['id'])
+                if previous is None or previous.get('content') != fingerprint['content']:
+                    to_embed[item['id']] = item
+                elif previous.get('metadata') != fingerprint['metadata']:
+                    to_update[item['id']] = item
+
+            removed_ids.update(chunk_id for chunk_id in previous_chunks if chunk_id not in chunks)
+            self.manifest.update(collection.name, source, source_data['file_hash'], chunks)
+
+        # Les ids encore référencés par une autre source ne sont pas supprimés
+        still_tracked = self.manifest.tracked_chunk_ids(collection.name)
+        to_delete = [chunk_id for chunk_id in removed_ids if chunk_id not in still_tracked]
+
+        if to_embed:
+            await self._upsert_items(collection, list(to_embed.values()), background)
+        if to_update:
+            items = list(to_update.values())
+            collection.update(
+                ids=[item['id'] for item in items],
+                documents=[item['text'] for item in items],
+                metadatas=[item['metadata'] for item in items]
+            )
+        if to_delete:
+            collection.delete(ids=to_delete)
+
+        if sources:
+            logger.info(
+                f"{collection.name}: {len(sources)} sources synchronisées ({len(to_embed)} chunks encodés, "
+                f"{len(to_update)} mis à jour, {len(to_delete)} supprimés)"
+            )
+
+    async def _remove_deleted_sources(self, collection, seen_sources: set):
+        """Supprime les vecteurs des sources qui n'existent plus sur le disque"""
+        for source in self.manifest.tracked_sources(collection.name) - seen_sources:
+            entry = self.manifest.get(collection.name, source)
+            self.manifest.remove(collection.name, source)
+            still_tracked = self.manifest.tracked_chunk_ids(collection.name)
+            stale_ids = [chunk_id for chunk_id in entry.get('chunks', {}) if chunk_id not in still_tracked]
+            if stale_ids:
+                collection.delete(ids=stale_ids)
+            logger.info(f"Source supprimée de {collection.name}: {source} ({len(stale_ids)} vecteurs retirés)")
+
+    async def _embed_texts(self, texts: List[str], background: bool = False) -> List[List[float]]:
+        """Encode une liste de textes en un seul appel au modèle, hors boucle d'événements
+
+        En arrière-plan (background), les textes sont encodés par petits lots
+        lancés seulement quand aucune requête n'attend le modèle.
+        """
+        if not texts:
+            return []
+        if background:
+            embeddings = await self.embedding_executor.encode_background(
+                texts, settings.rag_watch_batch_size, settings.rag_watch_idle_ms
+            )
+        else:
+            embeddings = await self.embedding_executor.encode_texts(texts)
+        return embeddings.tolist()
+
+    async def _embed_query(self, query: str) -> List[float]:
+        """Encode une requête de recherche via le cache LRU puis l'exécuteur (micro-batching)"""
+        cache_key = normalize_query(query)
+        embedding = self.embedding_cache.get(cache_key)
+        if embedding is not None:
+            return embedding
+        
+        embedding = (await self.embedding_executor.encode_query(query)).tolist()
+        self.embedding_cache.put(cache_key, embedding)
+        return embedding
+
+    async def _upsert_items(self, collection, items: List[Dict[str, Any]], background: bool = False):
+        """Encode et écrit des items {id, text, metadata} dans une collection par lots
+
+        Les items sont triés par longueur de texte pour que chaque lot regroupe
+        des textes de taille voisine et limite le padding du modèle. Chaque lot
+        est encodé en un appel et écrit en un seul upsert.
+        """
+        batch_size = max(1, settings.rag_embedding_batch_size)
+        sorted_items = sorted(items, key=lambda item: len(item['text']))
+
+        for start in range(0, len(sorted_items), batch_size):
+            batch = sorted_items[start:start + batch_size]
+            embeddings = await self._embed_texts([item['text'] for item in batch], background)
+            collection.upsert(
+                embeddings=embeddings,
+                documents=[item['text'] for item in batch],
+                metadatas=[item['metadata'] for item in batch],
+                ids=[item['id'] for item in batch]
+            )
+
+        if items:
+            logger.debug(f"{len(items)} items écrits dans {collection.name} par lots de {batch_size}")
+
     async def _load_ui_components(self):
         """Charge la documentation des composants UI"""
         ui_components_path = Path(settings.ui_components_path)
@@ -134,27 +546,41 @@ class RAGService:
             return
         
         # Parcourir les fichiers de composants
+        seen_sources = set()
+        pending_sources = []
         for file_path in ui_components_path.glob("**/*.json"):
+            seen_sources.add(str(file_path))
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    component_data = json.load(f)
+                file_hash, raw = self._read_source_file(self.ui_components_collection, file_path)
+                if raw is None:
+                    logger.debug(f"Fichier de composants inchangé: {file_path}")
+                    continue
+                
+                component_data = json.loads(raw.decode('utf-8'))
                 
                 # Vérifier si c'est un array ou un objet unique
-                if isinstance(component_data, list):
-                    # Si c'est un array, traiter chaque composant
-                    for component in component_data:
-                        await self._add_ui_component(component)
-                else:
-                    # Si c'est un objet unique, le traiter directement
-                    await self._add_ui_component(component_data)
+                components = component_data if isinstance(component_data, list) else [component_data]
+                pending_sources.append({
+                    'source': str(file_path),
+                    'file_hash': file_hash,
+                    'items': self._build_entry_items(self._build_ui_component_item, components, "composant UI")
+                })
                 
             except Exception as e:
                 logger.error(f"Erreur lors du chargement du composant {file_path}: {e}")
+        
+        await self._sync_sources(self.ui_components_collection, pending_sources)
+        await self._remove_deleted_sources(self.ui_components_collection, seen_sources)
     
     async def _load_ui_layouts(self):
         """Charge les layouts UI"""
         layouts_file = Path(settings.ui_components_path) / "layouts.json"
         
+        # Vecteurs d'un fichier de layouts supprimé ou déplacé
+        await self._remove_deleted_sources(
+            self.layouts_collection, {str(layouts_file)} if layouts_file.exists() else set()
+        )
+        
         if not layouts_file.exists():
             logger.warning(f"Fichier des layouts non trouvé: {layouts_file}")
             # Créer des layouts par défaut
@@ -162,17 +588,20 @@ class RAGService:
             return
         
         try:
-            with open(layouts_file, 'r', encoding='utf-8') as f:
-                layouts_data = json.load(f)
+            file_hash, raw = self._read_source_file(self.layouts_collection, layouts_file)
+            if raw is None:
+                logger.debug(f"Fichier des layouts inchangé: {layouts_file}")
+                return
+            
+            layouts_data = json.loads(raw.decode('utf-8'))
             
             # Vérifier si c'est un array ou un objet unique
-            if isinstance(layouts_data, list):
-                # Si c'est un array, traiter chaque layout
-                for layout in layouts_data:
-                    await self._add_ui_layout(layout)
-            else:
-                # Si c'est un objet unique, le traiter directement
-                await self._add_ui_layout(layouts_data)
+            layouts = layouts_data if isinstance(layouts_data, list) else [layouts_data]
+            await self._sync_sources(self.layouts_collection, [{
+                'source': str(layouts_file),
+                'file_hash': file_hash,
+                'items': self._build_entry_items(self._build_ui_layout_item, layouts, "layout UI")
+            }])
                 
         except Exception as e:
             logger.error(f"Erreur lors du chargement des layouts: {e}")
@@ -227,62 +656,87 @@ class RAGService:
             }
         ]
         
-        for component in default_components:
-            await self._add_ui_component(component)
+        await self._add_ui_components(default_components)
     
-    async def _add_ui_component(self, component_data: Dict[str, Any]):
-        """Ajoute un composant UI à la collection"""
-        try:
-            # Création du texte descriptif pour l'embedding
-            description_text = f"""
+    def _build_ui_component_item(self, component_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Construit l'item indexable (id, texte, métadonnées) d'un composant UI"""
+        # Création du texte descriptif pour l'embedding
+        description_text = f"""
             Composant: {component_data.get('name', '')}
             Type: {component_data.get('type', '')}
             Description: {component_data.get('description', '')}
             Usage: {component_data.get('usage', '')}
             Props: {json.dumps(component_data.get('props', {}), ensure_ascii=False)}
             """
-            
-            # Génération de l'embedding
-            embedding = self.embedding_model.encode(description_text).tolist()
-            
-            # Préparation des métadonnées (ChromaDB n'accepte que les types simples)
-            metadata = {
-                'name': str(component_data.get('name', '')),
-                'type': str(component_data.get('type', '')),
-                'description': str(component_data.get('description', '')),
-                'usage': str(component_data.get('usage', '')),
-                'category': str(component_data.get('category', '')),
-                'data': json.dumps(component_data, ensure_ascii=False)  # Sérialiser les données complètes
-            }
-            
-            # Ajout à la collection
-            self.ui_components_collection.add(
-                embeddings=[embedding],
-                documents=[description_text],
-                metadatas=[metadata],
-                ids=[f"component_{component_data.get('name', 'unknown')}"]
-            )
-            
-            logger.debug(f"Composant UI ajouté: {component_data.get('name')}")
-            
-        except Exception as e:
-            logger.error(f"Erreur lors de l'ajout du composant UI: {e}")
+        
+        # Préparation des métadonnées (ChromaDB n'accepte que les types simples)
+        metadata = {
+            'name': str(component_data.get('name', '')),
+            'type': str(component_data.get('type', '')),
+            'description': str(component_data.get('description', '')),
+            'usage': str(component_data.get('usage', '')),
+            'category': str(component_data.get('category', '')),
+            'namespace': str(component_data.get('namespace', settings.rag_default_namespace)),
+            'data': json.dumps(component_data, ensure_ascii=False)  # Sérialiser les données complètes
+        }
+        
+        return {
+            'id': f"component_{component_data.get('name', 'unknown')}",
+            'text': description_text,
+            'metadata': metadata
+        }
     
-    async def _add_ui_layout(self, layout_data: Dict[str, Any]):
-        """Ajoute un layout UI à la collection ChromaDB"""
+    @staticmethod
+    def _entry_id(entry: Any) -> Any:
+        """Identifiant d'une entrée de catalogue pour les journaux"""
+        return entry.get('id', entry.get('name')) if isinstance(entry, dict) else None
+    
+    def _build_entry_items(self, builder, entries: List[Dict[str, Any]], label: str) -> List[Dict[str, Any]]:
+        """Construit les items d'un lot d'entrées ; une entrée invalide est journalisée et ignorée"""
+        items = []
+        for entry in entries:
+            try:
+                items.append(builder(entry))
+            except Exception as e:
+                logger.error(f"Entrée {label} ignorée ({self._entry_id(entry)}): {e}")
+        return items
+    
+    async def _add_entries(self, collection, builder, entries: List[Dict[str, Any]], label: str):
+        """Ajoute des entrées de catalogue à une collection en un lot
+        
+        Même politique pour les composants, layouts et images : une entrée
+        invalide ou un lot en échec est journalisé avec les ids concernés,
+        sans interrompre le chargement.
+        """
+        items = self._build_entry_items(builder, entries, label)
         try:
-            # Création du texte descriptif pour l'embedding
-            # Gérer les deux formats: 'component_areas' (nouveau) et 'components' (existant)
-            areas = layout_data.get('component_areas', layout_data.get('components', []))
-            
-            components_desc = ""
-            if areas:
-                components_desc = " ".join([
-                    f"{comp.get('id', comp.get('name', ''))}: {comp.get('description', '')} (x:{comp.get('position', comp).get('x', comp.get('x', 0))}, y:{comp.get('position', comp).get('y', comp.get('y', 0))}, w:{comp.get('position', comp).get('width', comp.get('width', 0))}, h:{comp.get('position', comp).get('height', comp.get('height', 0))})"
-                    for comp in areas
-                ])
-            
-            description_text = f"""
+            await self._upsert_items(collection, items)
+            logger.debug(f"Entrées {label} ajoutées: {[self._entry_id(entry) for entry in entries]}")
+        except Exception as e:
+            logger.error(f"Erreur lors de l'ajout des entrées {label} {[item['id'] for item in items]}: {e}")
+    
+    async def _add_ui_component(self, component_data: Dict[str, Any]):
+        """Ajoute un composant UI à la collection"""
+        await self._add_ui_components([component_data])
+    
+    async def _add_ui_components(self, components: List[Dict[str, Any]]):
+        """Ajoute des composants UI à la collection en un lot"""
+        await self._add_entries(self.ui_components_collection, self._build_ui_component_item, components, "composant UI")
+    
+    def _build_ui_layout_item(self, layout_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Construit l'item indexable (id, texte, métadonnées) d'un layout UI"""
+        # Création du texte descriptif pour l'embedding
+        # Gérer les deux formats: 'component_areas' (nouveau) et 'components' (existant)
+        areas = layout_data.get('component_areas', layout_data.get('components', []))
+        
+        components_desc = ""
+        if areas:
+            components_desc = " ".join([
+                f"{comp.get('id', comp.get('name', ''))}: {comp.get('description', '')} (x:{comp.get('position', comp).get('x', comp.get('x', 0))}, y:{comp.get('position', comp).get('y', comp.get('y', 0))}, w:{comp.get('position', comp).get('width', comp.get('width', 0))}, h:{comp.get('position', comp).get('height', comp.get('height', 0))})"
+                for comp in areas
+            ])
+        
+        description_text = f"""
             Layout: {layout_data.get('name', '')}
             Type: {layout_data.get('type', '')}
             Description: {layout_data.get('description', '')}
@@ -290,92 +744,93 @@ class RAGService:
             Composants: {components_desc}
             Tags: {', '.join(layout_data.get('tags', []))}
             """
-            
-            # Génération de l'embedding
-            embedding = self.embedding_model.encode(description_text).tolist()
-            
-            # Préparation des métadonnées
-            metadata = {
-                'name': str(layout_data.get('name', '')),
-                'type': str(layout_data.get('type', '')),
-                'description': str(layout_data.get('description', '')),
-                'category': str(layout_data.get('category', '')),
-                'tags': ', '.join(layout_data.get('tags', [])),
-                'data': json.dumps(layout_data, ensure_ascii=False)  # Sérialiser les données complètes
-            }
-            
-            # Ajout à la collection
-            self.layouts_collection.add(
-                embeddings=[embedding],
-                documents=[description_text],
-                metadatas=[metadata],
-                ids=[f"layout_{layout_data.get('name', 'unknown')}"]
-            )
-            
-            logger.debug(f"Layout UI ajouté: {layout_data.get('name')}")
-            
-        except Exception as e:
-            logger.error(f"Erreur lors de l'ajout du layout UI: {e}")
+        
+        # Préparation des métadonnées
+        metadata = {
+            'name': str(layout_data.get('name', '')),
+            'type': str(layout_data.get('type', '')),
+            'description': str(layout_data.get('description', '')),
+            'category': str(layout_data.get('category', '')),
+            'tags': ', '.join(layout_data.get('tags', [])),
+            'namespace': str(layout_data.get('namespace', settings.rag_default_namespace)),
+            'data': json.dumps(layout_data, ensure_ascii=False)  # Sérialiser les données complètes
+        }
+        
+        return {
+            'id': f"layout_{layout_data.get('name', 'unknown')}",
+            'text': description_text,
+            'metadata': metadata
+        }
+    
+    async def _add_ui_layout(self, layout_data: Dict[str, Any]):
+        """Ajoute un layout UI à la collection ChromaDB"""
+        await self._add_entries(self.layouts_collection, self._build_ui_layout_item, [layout_data], "layout UI")
     
     async def _load_image_catalog(self):
         """Charge le catalogue d'images"""
         image_catalog_path = Path("data/knowledge/image_catalog.json")
         
+        # Vecteurs d'un catalogue d'images supprimé ou déplacé
+        await self._remove_deleted_sources(
+            self.images_collection, {str(image_catalog_path)} if image_catalog_path.exists() else set()
+        )
+        
         if not image_catalog_path.exists():
             logger.warning(f"Fichier catalogue d'images non trouvé: {image_catalog_path}")
             return
         
         try:
-            with open(image_catalog_path, 'r', encoding='utf-8') as f:
-                catalog_data = json.load(f)
+            file_hash, raw = self._read_source_file(self.images_collection, image_catalog_path)
+            if raw is None:
+                logger.info("Catalogue d'images inchangé, ingestion ignorée")
+                return
+            
+            catalog_data = json.loads(raw.decode('utf-8'))
             
             images = catalog_data.get('images', [])
             logger.info(f"Chargement de {len(images)} images du catalogue")
             
-            for image_data in images:
-                await self._add_image_to_catalog(image_data)
+            await self._sync_sources(self.images_collection, [{
+                'source': str(image_catalog_path),
+                'file_hash': file_hash,
+                'items': self._build_entry_items(self._build_image_item, images, "image")
+            }])
             
             logger.info(f"Catalogue d'images chargé avec succès: {len(images)} images")
             
         except Exception as e:
             logger.error(f"Erreur lors du chargement du catalogue d'images: {e}")
     
+    def _build_image_item(self, image_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Construit l'item indexable (id, texte, métadonnées) d'une image"""
+        # Création du texte de description pour l'embedding
+        description_parts = [
+            image_data.get('description', ''),
+            image_data.get('alt', ''),
+            ' '.join(image_data.get('keywords', []))
+        ]
+        description_text = ' '.join(filter(None, description_parts))
+        
+        # Métadonnées
+        metadata = {
+            'id': str(image_data.get('id', '')),
+            'url': str(image_data.get('url', '')),
+            'alt': str(image_data.get('alt', '')),
+            'description': str(image_data.get('description', '')),
+            'keywords': ', '.join(image_data.get('keywords', [])),
+            'namespace': str(image_data.get('namespace', settings.rag_default_namespace)),
+            'data': json.dumps(image_data, ensure_ascii=False)
+        }
+        
+        return {
+            'id': f"image_{image_data.get('id', 'unknown')}",
+            'text': description_text,
+            'metadata': metadata
+        }
+    
     async def _add_image_to_catalog(self, image_data: Dict[str, Any]):
         """Ajoute une image au catalogue"""
-        try:
-            # Création du texte de description pour l'embedding
-            description_parts = [
-                image_data.get('description', ''),
-                image_data.get('alt', ''),
-                ' '.join(image_data.get('keywords', []))
-            ]
-            description_text = ' '.join(filter(None, description_parts))
-            
-            # Génération de l'embedding
-            embedding = self.embedding_model.encode(description_text).tolist()
-            
-            # Métadonnées
-            metadata = {
-                'id': str(image_data.get('id', '')),
-                'url': str(image_data.get('url', '')),
-                'alt': str(image_data.get('alt', '')),
-                'description': str(image_data.get('description', '')),
-                'keywords': ', '.join(image_data.get('keywords', [])),
-                'data': json.dumps(image_data, ensure_ascii=False)
-            }
-            
-            # Ajout à la collection
-            self.images_collection.add(
-                embeddings=[embedding],
-                documents=[description_text],
-                metadatas=[metadata],
-                ids=[f"image_{image_data.get('id', 'unknown')}"]
-            )
-            
-            logger.debug(f"Image ajoutée au catalogue: {image_data.get('id')}")
-            
-        except Exception as e:
-            logger.error(f"Erreur lors de l'ajout de l'image au catalogue: {e}")
+        await self._add_entries(self.images_collection, self._build_image_item, [image_data], "image")
     
     async def _create_default_layouts(self):
         """Crée des layouts par défaut"""
@@ -409,8 +864,10 @@ class RAGService:
             }
         ]
         
-        for layout in default_layouts:
-            await self._add_ui_layout(layout)
+        await self._upsert_items(
+            self.layouts_collection,
+            self._build_entry_items(self._build_ui_layout_item, default_layouts, "layout UI")
+        )
     
     async def _load_knowledge_base(self):
         """Charge la base de connaissances"""
@@ -423,15 +880,107 @@ class RAGService:
             return
         
         # Parcourir les fichiers de connaissances
+        seen_sources = set()
+        pending_sources = []
+        skipped = 0
         for file_path in knowledge_path.glob("**/*.md"):
+            seen_sources.add(str(file_path))
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                await self._add_knowledge_document(content, str(file_path))
+                source_data = self._read_knowledge_source(knowledge_path, file_path)
+                if source_data is None:
+                    skipped += 1
+                    continue
+                pending_sources.append(source_data)
                 
             except Exception as e:
                 logger.error(f"Erreur lors du chargement du document {file_path}: {e}")
+        
+        await self._sync_sources(self.knowledge_collection, pending_sources)
+        await self._remove_deleted_sources(self.knowledge_collection, seen_sources)
+        
+        if skipped:
+            logger.info(f"Base de connaissances: {skipped} documents inchangés ignorés")
+    
+    def _read_knowledge_source(self, knowledge_path: Path, file_path: Path) -> Optional[Dict[str, Any]]:
+        """Lit et découpe un fichier de connaissances pour _sync_sources ; None s'il est inchangé"""
+        file_hash, raw = self._read_source_file(self.knowledge_collection, file_path)
+        if raw is None:
+            return None
+        
+        content = raw.decode('utf-8')
+        return {
+            'source': str(file_path),
+            'file_hash': file_hash,
+            'content': content,
+            'items': self._build_knowledge_items(
+                content, str(file_path), {'namespace': self._knowledge_namespace(knowledge_path, file_path)}
+            ),
+            'purge_legacy': True
+        }
+    
+    async def _reload_knowledge_files(self, changed: List[Path], removed: List[Path]):
+        """Rechargement à chaud de fichiers de connaissances modifiés ou supprimés
+        
+        Seuls les chunks dont le hash a changé sont ré-encodés, en arrière-plan
+        (voir EmbeddingExecutor.encode_background) ; les chunks disparus sont
+        supprimés. La table des produits suit ses fichiers de catalogue.
+        """
+        knowledge_path = Path(settings.knowledge_base_path)
+        pending_sources = []
+        for file_path in changed:
+            try:
+                # Découpage hors boucle d'événements (tokenizer)
+                source_data = await asyncio.to_thread(self._read_knowledge_source, knowledge_path, file_path)
+            except FileNotFoundError:
+                removed = [*removed, file_path]
+                continue
+            except Exception as e:
+                logger.error(f"Erreur lors du rechargement du document {file_path}: {e}")
+                continue
+            if source_data is None:
+                continue
+            pending_sources.append(source_data)
+            if file_path.stem in settings.rag_product_catalog_files:
+                self.product_index.set_source(str(file_path), source_data['content'])
+        
+        async with self._runtime_write_lock:
+            try:
+                await self._sync_sources(self.knowledge_collection, pending_sources, background=True)
+                if removed:
+                    gone = {str(file_path) for file_path in removed}
+                    tracked = self.manifest.tracked_sources(self.knowledge_collection.name)
+                    await self._remove_deleted_sources(self.knowledge_collection, tracked - gone)
+                    for source in gone:
+                        self.product_index.remove_source(source)
+            except Exception:
+                # Manifeste déjà avancé en mémoire : rétabli pour que les fichiers soient revus
+                self.manifest.load()
+                raise
+            
+            if pending_sources or removed:
+                await asyncio.to_thread(self.vector_store.persist)
+                self.manifest.save()
+    
+    def _load_product_catalogs(self):
+        """Charge la table des produits depuis les fichiers listés dans settings.rag_product_catalog_files"""
+        knowledge_path = Path(settings.knowledge_base_path)
+        if not knowledge_path.exists():
+            return
+        
+        for file_path in knowledge_path.glob("**/*.md"):
+            if file_path.stem not in settings.rag_product_catalog_files:
+                continue
+            try:
+                self.product_index.set_source(str(file_path), file_path.read_text(encoding='utf-8'))
+            except Exception as e:
+                logger.error(f"Erreur lors du chargement du catalogue produits {file_path}: {e}")
+    
+    def _knowledge_namespace(self, knowledge_path: Path, file_path: Path) -> str:
+        """Namespace d'un fichier : son premier sous-répertoire, sinon settings.rag_namespace_map par nom de fichier"""
+        relative = file_path.relative_to(knowledge_path)
+        if len(relative.parts) > 1:
+            return relative.parts[0]
+        return settings.rag_namespace_map.get(file_path.stem, settings.rag_default_namespace)
     
     async def _create_default_knowledge(self):
         """Crée une base de connaissances par défaut"""
@@ -453,223 +1002,866 @@ class RAGService:
             }
         ]
         
-        for knowledge in default_knowledge:
-            content = f"# {knowledge['title']}\n\n{knowledge['content']}"
-            await self._add_knowledge_document(content, knowledge['title'], knowledge)
+        await self._add_knowledge_documents([
+            {
+                'content': f"# {knowledge['title']}\n\n{knowledge['content']}",
+                'source': knowledge['title'],
+                'metadata': knowledge
+            }
+            for knowledge in default_knowledge
+        ])
+    
+    def _build_knowledge_items(self, content: str, source: str, metadata: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """Découpe un document en chunks indexables
+
+        Les ids des chunks dérivent de leur contenu : un chunk inchangé garde
+        son id (et son embedding) même si sa position dans le document évolue.
+        """
+        # Division du contenu en chunks
+        chunks = self._split_document(content)
+        
+        items = []
+        seen_ids = set()
+        for i, chunk in enumerate(chunks):
+            chunk_id = f"{source}_chunk_{hash_text(chunk['text'])[:16]}"
+            # Chunks identiques dans un même document
+            if chunk_id in seen_ids:
+                chunk_id = f"{chunk_id}_{i}"
+            seen_ids.add(chunk_id)
+            
+            # Métadonnées enrichies
+            doc_metadata = {
+                "source": source,
+                "chunk_index": i,
+                "total_chunks": len(chunks),
+                "namespace": settings.rag_default_namespace,
+                **{key: chunk[key] for key in ('heading_path', 'token_count') if key in chunk},
+                **(metadata or {})
+            }
+            
+            items.append({
+                'id': chunk_id,
+                'text': chunk['text'],
+                'metadata': doc_metadata
+            })
+        
+        return items
     
     async def _add_knowledge_document(self, content: str, source: str, metadata: Optional[Dict] = None):
         """Ajoute un document à la base de connaissances"""
+        await self._add_knowledge_documents([{'content': content, 'source': source, 'metadata': metadata}])
+    
+    async def _add_knowledge_documents(self, documents: List[Dict[str, Any]]):
+        """Ajoute des documents {content, source, metadata} à la base de connaissances en un lot"""
         try:
-            # Division du contenu en chunks
-            documents = self.text_splitter.create_documents([content], [metadata or {}])
-            
-            for i, doc in enumerate(documents):
-                # Génération de l'embedding
-                embedding = self.embedding_model.encode(doc.page_content).tolist()
-                
-                # Métadonnées enrichies
-                doc_metadata = {
-                    "source": source,
-                    "chunk_index": i,
-                    "total_chunks": len(documents),
-                    **(metadata or {})
-                }
-                
-                # Ajout à la collection
-                self.knowledge_collection.add(
-                    embeddings=[embedding],
-                    documents=[doc.page_content],
-                    metadatas=[doc_metadata],
-                    ids=[f"{source}_chunk_{i}"]
-                )
+            items = []
+            for document in documents:
+                items.extend(self._build_knowledge_items(
+                    document['content'], document['source'], document.get('metadata')
+                ))
+            await self._upsert_items(self.knowledge_collection, items)
             
-            logger.debug(f"Document ajouté à la base de connaissances: {source} ({len(documents)} chunks)")
+            logger.debug(f"Documents ajoutés à la base de connaissances: {len(documents)} ({len(items)} chunks)")
             
         except Exception as e:
-            logger.error(f"Erreur lors de l'ajout du document: {e}")
+            logger.error(f"Erreur lors de l'ajout des documents: {e}")
+            raise
+    
+    def _format_knowledge_results(self, results: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Formate les résultats de la base de connaissances"""
+        knowledge_items = []
+        if results['documents'] and results['documents'][0]:
+            for doc, metadata, distance in zip(
+                results['documents'][0], 
+                results['metadatas'][0], 
+                results['distances'][0]
+            ):
+                if distance <= (1 - settings.rag_similarity_threshold):
+                    knowledge_items.append({
+                        'content': doc,
+                        'metadata': with_source_references(metadata),
+                        'relevance_score': 1 - distance
+                    })
+        
+        return knowledge_items
+    
+    def _candidate_count(self, top_k: int, diversify: bool) -> int:
+        """Nombre de candidats à récupérer (sur-échantillonnage avant le reranking MMR)"""
+        return top_k * max(1, settings.rag_mmr_fetch_factor) if diversify else top_k
+    
+    async def _diversify(self, collection_name: str, hits: List[Tuple[str, float]],
+                         top_k: int) -> List[Tuple[str, float]]:
+        """Sélectionne parmi des candidats (id, pertinence) top_k résultats pertinents et variés (MMR)"""
+        if len(hits) <= 1:
+            return hits[:top_k]
+        stored = await asyncio.to_thread(
+            self.collections[collection_name].get, ids=[item_id for item_id, _ in hits], include=["embeddings"]
+        )
+        vectors = dict(zip(stored['ids'], stored['embeddings']))
+        hits = [hit for hit in hits if hit[0] in vectors]
+        if not hits:
+            return []
+        selected = mmr_select(
+            [vectors[item_id] for item_id, _ in hits],
+            [score for _, score in hits],
+            top_k,
+            settings.rag_mmr_lambda
+        )
+        return [hits[i] for i in selected]
+    
+    async def _search_collection(self, collection_name: str, query_embedding: List[float],
+                                 top_k: int, where: Optional[Dict[str, Any]] = None,
+                                 diversify: bool = False) -> List[Dict[str, Any]]:
+        """Interroge une collection avec un embedding déjà calculé (requête hors boucle d'événements)
+        
+        Avec diversify, top_k × rag_mmr_fetch_factor candidats sont récupérés
+        puis réduits à top_k par MMR.
+        """
+        collection = self.collections[collection_name]
+        max_distance = 1 - settings.rag_similarity_threshold
+        
+        if collection_name not in self.DATA_COLLECTIONS:
+            results = await asyncio.to_thread(
+                collection.query,
+                query_embeddings=[query_embedding],
+                n_results=self._candidate_count(top_k, diversify),
+                where=where
+            )
+            if diversify and results['ids'] and results['ids'][0]:
+                positions = {chunk_id: i for i, chunk_id in enumerate(results['ids'][0])}
+                hits = [
+                    (chunk_id, 1 - distance)
+                    for chunk_id, distance in zip(results['ids'][0], results['distances'][0])
+                    if distance <= max_distance
+                ]
+                kept = [positions[chunk_id] for chunk_id, _ in await self._diversify(collection_name, hits, top_k)]
+                results = {
+                    key: [[results[key][0][i] for i in kept]]
+                    for key in ('ids', 'documents', 'metadatas', 'distances')
+                }
+            return self._format_knowledge_results(results)
+        
+        # Collections UI : la recherche ne retourne que ids et distances,
+        # les objets sont hydratés depuis le registre (sans json.loads)
+        results = await asyncio.to_thread(
+            collection.query,
+            query_embeddings=[query_embedding],
+            n_results=self._candidate_count(top_k, diversify),
+            where=where,
+            include=["distances"]
+        )
+        if not results['ids'] or not results['ids'][0]:
+            return []
+        
+        hits = [
+            (item_id, 1 - distance)
+            for item_id, distance in zip(results['ids'][0], results['distances'][0])
+            if distance <= max_distance
+        ]
+        if diversify:
+            hits = await self._diversify(collection_name, hits, top_k)
+        return self.item_registry.hydrate(
+            collection_name, [item_id for item_id, _ in hits], [score for _, score in hits]
+        )
+    
+    def _resolve_knowledge_mode(self, mode: Optional[str]) -> str:
+        """Valide le mode de recherche demandé (défaut: settings.rag_knowledge_search_mode)"""
+        mode = (mode or settings.rag_knowledge_search_mode).lower()
+        if mode not in self.KNOWLEDGE_SEARCH_MODES:
+            raise ValueError(
+                f"Mode de recherche inconnu: {mode} (attendu: {', '.join(self.KNOWLEDGE_SEARCH_MODES)})"
+            )
+        return mode
+    
+    def _build_knowledge_result(self, chunk_id: str, relevance_score: float,
+                                **scores: Optional[float]) -> Optional[Dict[str, Any]]:
+        """Construit un résultat de connaissance à partir du texte indexé par BM25"""
+        chunk = self.bm25_index.get(chunk_id)
+        if chunk is None:
+            return None
+        content, metadata = chunk
+        result = {'content': content, 'metadata': with_source_references(metadata), 'relevance_score': relevance_score}
+        result.update({name: score for name, score in scores.items() if score is not None})
+        return result
+    
+    async def _search_knowledge(self, query: str, query_embedding: Optional[List[float]],
+                                top_k: int, mode: str,
+                                where: Optional[Dict[str, Any]] = None,
+                                diversify: bool = False) -> List[Dict[str, Any]]:
+        """Recherche dans la base de connaissances selon le mode
+        
+        - vector: similarité des embeddings (seuil rag_similarity_threshold)
+        - lexical: BM25 seul, sans encodage de la requête ; relevance_score est
+          le score BM25 rapporté au meilleur résultat
+        - hybrid: fusion des deux classements par reciprocal rank fusion ;
+          relevance_score vaut 1 pour un chunk classé premier dans les deux
+        
+        Avec diversify, les candidats classés sont réduits à top_k par MMR.
+        """
+        if mode == "vector":
+            return await self._search_collection("knowledge_base", query_embedding, top_k, where, diversify)
+        
+        fetch = self._candidate_count(top_k, diversify)
+        if mode == "lexical":
+            hits = self.bm25_index.search(query, fetch, where)
+            if not hits:
+                return []
+            best_score = hits[0][1]
+            bm25_scores = dict(hits)
+            hits = [(chunk_id, score / best_score) for chunk_id, score in hits]
+            if diversify:
+                hits = await self._diversify("knowledge_base", hits, top_k)
+            results = [
+                self._build_knowledge_result(chunk_id, score, bm25_score=bm25_scores[chunk_id])
+                for chunk_id, score in hits
+            ]
+            return [result for result in results if result is not None]
+        
+        candidates = max(fetch, settings.rag_hybrid_candidates)
+        vector_results = await asyncio.to_thread(
+            self.knowledge_collection.query,
+            query_embeddings=[query_embedding],
+            n_results=candidates,
+            where=where,
+            include=["distances"]
+        )
+        max_distance = 1 - settings.rag_similarity_threshold
+        vector_hits = [
+            (chunk_id, 1 - distance)
+            for chunk_id, distance in zip(vector_results['ids'][0], vector_results['distances'][0])
+            if distance <= max_distance
+        ] if vector_results['ids'] else []
+        lexical_hits = self.bm25_index.search(query, candidates, where)
+        
+        rrf_k = settings.rag_rrf_k
+        fused: Dict[str, float] = {}
+        for ranking in (vector_hits, lexical_hits):
+            for rank, (chunk_id, _) in enumerate(ranking, start=1):
+                fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+        
+        vector_scores = dict(vector_hits)
+        lexical_scores = dict(lexical_hits)
+        best_possible = 2.0 / (rrf_k + 1)
+        ranked = [
+            (chunk_id, score / best_possible)
+            for chunk_id, score in sorted(fused.items(), key=lambda hit: hit[1], reverse=True)
+        ]
+        if diversify:
+            ranked = await self._diversify("knowledge_base", ranked[:fetch], top_k)
+        results = []
+        for chunk_id, score in ranked:
+            result = self._build_knowledge_result(
+                chunk_id,
+                score,
+                vector_score=vector_scores.get(chunk_id),
+                bm25_score=lexical_scores.get(chunk_id)
+            )
+            if result is not None:
+                results.append(result)
+            if len(results) >= top_k:
+                break
+        return results
     
-    async def search_ui_components(self, query: str, top_k: int = None) -> List[Dict[str, Any]]:
-        """Recherche des composants UI pertinents"""
+    async def _score_candidates(self, collection_name: str, query_embedding: List[float],
+                                ids: List[str], top_k: int) -> List[Tuple[str, float]]:
+        """Score vectoriel (même échelle que relevance_score) d'une liste d'ids candidats"""
+        matrix_index = self.matrix_indexes.get(collection_name)
+        if matrix_index is not None:
+            hits = matrix_index.search_ids(query_embedding, ids, top_k)
+        else:
+            stored = await asyncio.to_thread(
+                self.collections[collection_name].get, ids=ids, include=["embeddings"]
+            )
+            if not stored['ids']:
+                return []
+            vectors = np.asarray(stored['embeddings'], dtype=np.float32)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            query = np.asarray(query_embedding, dtype=np.float32)
+            scores = vectors @ (query / max(float(np.linalg.norm(query)), 1e-12))
+            order = np.argsort(-scores)[:top_k]
+            hits = [(stored['ids'][i], float(scores[i])) for i in order]
+        # Distance L2 au carré entre vecteurs unitaires : 1 - (2 - 2·cos)
+        return [(item_id, 2 * score - 1) for item_id, score in hits]
+    
+    async def _search_images(self, query: str, query_embedding: Optional[List[float]], top_k: int,
+                             where: Optional[Dict[str, Any]] = None,
+                             diversify: bool = False,
+                             mode: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Recherche dans le catalogue d'images, par mots-clés d'abord
+        
+        - aucun mot-clé ni id d'image dans la requête : recherche vectorielle
+        - mode "keywords" : images trouvées classées par mots-clés seuls, sans
+          modèle (relevance_score : part de la requête couverte, voir KeywordIndex.match)
+        - mode "vector" (recherche groupée dont la requête est encodée) : score
+          vectoriel calculé sur les seules images trouvées, avec le seuil de similarité
+        
+        Sans mode, le classement vectoriel est utilisé si la requête est encodée.
+        Le mode fait partie de la clé du cache de résultats.
+        """
+        if mode is None:
+            mode = "vector" if query_embedding is not None else "keywords"
+        hits = self.image_keywords.match(query, where)
+        if not hits:
+            if query_embedding is None:
+                query_embedding = await self._embed_query(query)
+            return await self._search_collection("image_catalog", query_embedding, top_k, where, diversify)
+        
+        if mode == "keywords":
+            hits = hits[:top_k]
+        else:
+            if query_embedding is None:
+                query_embedding = await self._embed_query(query)
+            hits = await self._score_candidates(
+                "image_catalog", query_embedding, [item_id for item_id, _ in hits],
+                self._candidate_count(top_k, diversify)
+            )
+            hits = [(item_id, score) for item_id, score in hits if score >= settings.rag_similarity_threshold]
+            hits = await self._diversify("image_catalog", hits, top_k) if diversify else hits[:top_k]
+        return self.item_registry.hydrate(
+            "image_catalog", [item_id for item_id, _ in hits], [score for _, score in hits]
+        )
+    
+    def _needs_query_embedding(self, collection_name: str, query: str, mode: Optional[str]) -> bool:
+        """Faux si la recherche peut être servie sans modèle (BM25 seul, mots-clés ou id d'images)
+        
+        Pour image_catalog, mode est le classement des images trouvées par
+        mots-clés : "keywords" (sans modèle) ou "vector" (score vectoriel et seuil).
+        """
+        if collection_name == "knowledge_base":
+            return mode != "lexical"
+        if collection_name == "image_catalog":
+            return mode == "vector" or not self.image_keywords.match(query)
+        return True
+    
+    def _namespace_where(self, where: Optional[Dict[str, Any]],
+                         namespace: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Filtre de recherche d'un namespace (avec le contenu partagé du namespace par défaut si configuré)"""
+        shared = settings.rag_default_namespace if settings.rag_namespace_include_default else None
+        return namespace_filter(where, namespace, shared)
+    
+    def _resolve_diversify(self, diversify: Optional[bool]) -> bool:
+        """Reranking MMR demandé (défaut: settings.rag_mmr_enabled)"""
+        return settings.rag_mmr_enabled if diversify is None else diversify
+    
+    def _result_cache_key(self, collection_name: str, query: str, top_k: int,
+                          mode: Optional[str] = None, where: Optional[Dict[str, Any]] = None,
+                          diversify: bool = False) -> Tuple:
+        """Clé du cache de résultats ; le nom de la collection doit rester en tête"""
+        return (
+            collection_name,
+            normalize_query(query),
+            top_k,
+            settings.rag_similarity_threshold,
+            # Mode de la base de connaissances, ou classement des images trouvées par mots-clés
+            mode if collection_name in ("knowledge_base", "image_catalog") else None,
+            json.dumps(where, sort_keys=True, default=str) if where else None,
+            (settings.rag_mmr_lambda, settings.rag_mmr_fetch_factor) if diversify else None
+        )
+    
+    async def _run_search(self, collection_name: str, query: str, query_embedding: Optional[List[float]],
+                          top_k: int, mode: Optional[str] = None,
+                          where: Optional[Dict[str, Any]] = None,
+                          diversify: bool = False) -> List[Dict[str, Any]]:
+        """Aiguille la recherche vers la base de connaissances ou une collection UI"""
+        if collection_name == "knowledge_base":
+            return await self._search_knowledge(query, query_embedding, top_k, mode, where, diversify)
+        if collection_name == "image_catalog":
+            return await self._search_images(query, query_embedding, top_k, where, diversify, mode)
+        return await self._search_collection(collection_name, query_embedding, top_k, where, diversify)
+    
+    async def _cached_search(self, collection_name: str, query: str, top_k: int,
+                             mode: Optional[str] = None,
+                             where: Optional[Dict[str, Any]] = None,
+                             diversify: bool = False) -> List[Dict[str, Any]]:
+        """Recherche dans une collection via le cache de résultats (sans encodage si trouvé)"""
+        if collection_name == "image_catalog" and mode is None:
+            mode = "keywords"
+        cache_key = self._result_cache_key(collection_name, query, top_k, mode, where, diversify)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        generation = self.result_cache.generation(collection_name)
+        query_embedding = await self._embed_query(query) \
+            if self._needs_query_embedding(collection_name, query, mode) else None
+        items = await self._run_search(collection_name, query, query_embedding, top_k, mode, where, diversify)
+        self.result_cache.put(cache_key, items, generation)
+        return items
+    
+    async def multi_search(self, query: str, requests: Dict[str, int],
+                           knowledge_mode: Optional[str] = None,
+                           where: Optional[Dict[str, Any]] = None,
+                           namespace: Optional[str] = None,
+                           diversify: Optional[bool] = None) -> Dict[str, Any]:
+        """Recherche dans plusieurs collections avec un seul encodage de la requête
+        
+        - **query**: Texte de la requête
+        - **requests**: {nom de collection: top_k}, parmi ui_components, ui_layouts,
+          knowledge_base et image_catalog
+        - **knowledge_mode**: Mode de recherche de knowledge_base (vector, hybrid, lexical)
+        - **where**: Filtre de métadonnées (format ChromaDB) appliqué à toutes les collections
+        - **namespace**: Restreint la recherche à un namespace (domaine, boutique) et au contenu partagé
+        - **diversify**: Reranking MMR de chaque collection (défaut: settings.rag_mmr_enabled)
+        
+        Retourne {"results": {collection: [...]}, "timings": {...}, "cached": [...]} ;
+        les temps sont en ms et "cached" liste les collections servies par le cache de résultats.
+        """
         if not self.initialized:
-            raise RuntimeError("Service RAG non initialisé")
+            raise RAGNotReadyError(self.phase)
+        
+        unknown = [name for name in requests if name not in self.collections]
+        if unknown:
+            raise ValueError(f"Collections inconnues: {', '.join(unknown)}")
+        knowledge_mode = self._resolve_knowledge_mode(knowledge_mode)
+        where = self._namespace_where(where, namespace)
+        diversify = self._resolve_diversify(diversify)
+        
+        # Les images trouvées par mots-clés sont classées par score vectoriel
+        # (avec seuil) dès que la requête est encodée pour une autre collection
+        encodes = any(
+            self._needs_query_embedding(name, query, knowledge_mode if name == "knowledge_base" else None)
+            for name in requests if name != "image_catalog"
+        )
+        modes = {"knowledge_base": knowledge_mode, "image_catalog": "vector" if encodes else "keywords"}
+        
+        start = time.perf_counter()
+        results = {}
+        pending = {}
+        for name, top_k in requests.items():
+            top_k = top_k or settings.rag_top_k
+            mode = modes.get(name)
+            cache_key = self._result_cache_key(name, query, top_k, mode, where, diversify)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                results[name] = cached
+            else:
+                pending[name] = (top_k, mode, cache_key, self.result_cache.generation(name))
+        
+        # Pas d'encodage si tout est en cache ou si les recherches restantes se
+        # passent du modèle (base de connaissances en mode lexical, mots-clés d'images)
+        query_embedding = None
+        if any(self._needs_query_embedding(name, query, mode) for name, (_, mode, _, _) in pending.items()):
+            query_embedding = await self._embed_query(query)
+        embedding_ms = (time.perf_counter() - start) * 1000
+        
+        async def timed_search(name: str, top_k: int, mode: Optional[str], cache_key: Tuple, generation: int):
+            search_start = time.perf_counter()
+            try:
+                items = await self._run_search(name, query, query_embedding, top_k, mode, where, diversify)
+                self.result_cache.put(cache_key, items, generation)
+            except Exception as e:
+                logger.error(f"Erreur lors de la recherche dans {name}: {e}")
+                items = []
+            return name, items, (time.perf_counter() - search_start) * 1000
+        
+        searches = await asyncio.gather(*[
+            timed_search(name, *search) for name, search in pending.items()
+        ])
+        
+        timings = {'embedding_ms': round(embedding_ms, 3)}
+        for name, items, elapsed_ms in searches:
+            results[name] = items
+            timings[f"{name}_ms"] = round(elapsed_ms, 3)
+        timings['total_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        
+        return {
+            'results': {name: results[name] for name in requests},
+            'timings': timings,
+            'cached': [name for name in requests if name not in pending]
+        }
+    
+    async def search_ui_components(self, query: str, top_k: int = None,
+                                   where: Optional[Dict[str, Any]] = None,
+                                   namespace: Optional[str] = None,
+                                   diversify: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """Recherche des composants UI pertinents
+        
+        - **where**: Filtre de métadonnées (format ChromaDB), appliqué dans la base vectorielle
+        - **namespace**: Restreint la recherche à un namespace (domaine, boutique) et au contenu partagé
+        - **diversify**: Écarte les composants quasi identiques par reranking MMR (défaut: settings.rag_mmr_enabled)
+        """
+        if not self.initialized:
+            raise RAGNotReadyError(self.phase)
         
         top_k = top_k or settings.rag_top_k
         
         try:
-            # Génération de l'embedding de la requête
-            query_embedding = self.embedding_model.encode(query).tolist()
-            
-            # Recherche dans la collection
-            results = self.ui_components_collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k
+            return await self._cached_search(
+                "ui_components", query, top_k, where=self._namespace_where(where, namespace),
+                diversify=self._resolve_diversify(diversify)
             )
             
-            # Formatage des résultats
-            components = []
-            if results['metadatas'] and results['metadatas'][0]:
-                for metadata, distance in zip(results['metadatas'][0], results['distances'][0]):
-                    if distance <= (1 - settings.rag_similarity_threshold):
-                        # Désérialiser les données complètes du composant
-                        try:
-                            component_data = json.loads(metadata.get('data', '{}'))
-                            component_data['relevance_score'] = 1 - distance
-                            components.append(component_data)
-                        except json.JSONDecodeError:
-                            # Fallback vers les métadonnées simples
-                            components.append({
-                                **metadata,
-                                'relevance_score': 1 - distance
-                            })
-            
-            return components
-            
         except Exception as e:
             logger.error(f"Erreur lors de la recherche de composants UI: {e}")
             return []
     
-    async def search_ui_layouts(self, query: str, top_k: int = None) -> List[Dict[str, Any]]:
-        """Recherche des layouts UI pertinents"""
+    async def search_ui_layouts(self, query: str, top_k: int = None,
+                                where: Optional[Dict[str, Any]] = None,
+                                namespace: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Recherche des layouts UI pertinents
+        
+        - **where**: Filtre de métadonnées (format ChromaDB), appliqué dans la base vectorielle
+        - **namespace**: Restreint la recherche à un namespace (domaine, boutique) et au contenu partagé
+        """
         if not self.initialized:
-            raise RuntimeError("Service RAG non initialisé")
+            raise RAGNotReadyError(self.phase)
         
         top_k = top_k or settings.rag_top_k
         
         try:
-            # Génération de l'embedding de la requête
-            query_embedding = self.embedding_model.encode(query).tolist()
-            
-            # Recherche dans la collection
-            results = self.layouts_collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k
-            )
-            
-            # Formatage des résultats
-            layouts = []
-            if results['metadatas'] and results['metadatas'][0]:
-                for metadata, distance in zip(results['metadatas'][0], results['distances'][0]):
-                    if distance <= (1 - settings.rag_similarity_threshold):
-                        # Désérialiser les données complètes du layout
-                        try:
-                            layout_data = json.loads(metadata.get('data', '{}'))
-                            layout_data['relevance_score'] = 1 - distance
-                            layouts.append(layout_data)
-                        except json.JSONDecodeError:
-                            # Fallback vers les métadonnées simples
-                            layouts.append({
-                                **metadata,
-                                'relevance_score': 1 - distance
-                            })
-            
-            return layouts
+            return await self._cached_search("ui_layouts", query, top_k, where=self._namespace_where(where, namespace))
             
         except Exception as e:
             logger.error(f"Erreur lors de la recherche de layouts UI: {e}")
             return []
     
-    async def search_images(self, query: str, top_k: int = None) -> List[Dict[str, Any]]:
-        """Recherche des images pertinentes dans le catalogue"""
+    async def search_images(self, query: str, top_k: int = None,
+                            where: Optional[Dict[str, Any]] = None,
+                            namespace: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Recherche des images pertinentes dans le catalogue
+        
+        Une requête contenant un mot-clé ou l'id exact d'une image est servie
+        par l'index des mots-clés, sans encodage.
+        
+        - **where**: Filtre de métadonnées (format ChromaDB), appliqué dans la base vectorielle
+        - **namespace**: Restreint la recherche à un namespace (domaine, boutique) et au contenu partagé
+        """
         if not self.initialized:
-            raise RuntimeError("Service RAG non initialisé")
+            raise RAGNotReadyError(self.phase)
         
         top_k = top_k or settings.rag_top_k
         
         try:
-            # Génération de l'embedding de la requête
-            query_embedding = self.embedding_model.encode(query).tolist()
-            
-            # Recherche dans la collection
-            results = self.images_collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k
-            )
-            
-            # Formatage des résultats
-            images = []
-            if results['metadatas'] and results['metadatas'][0]:
-                for metadata, distance in zip(results['metadatas'][0], results['distances'][0]):
-                    if distance <= (1 - settings.rag_similarity_threshold):
-                        # Désérialiser les données complètes de l'image
-                        try:
-                            image_data = json.loads(metadata.get('data', '{}'))
-                            image_data['relevance_score'] = 1 - distance
-                            images.append(image_data)
-                        except json.JSONDecodeError:
-                            # Fallback vers les métadonnées simples
-                            images.append({
-                                **metadata,
-                                'relevance_score': 1 - distance
-                            })
-            
-            return images
+            return await self._cached_search("image_catalog", query, top_k, where=self._namespace_where(where, namespace))
             
         except Exception as e:
             logger.error(f"Erreur lors de la recherche d'images: {e}")
             return []
     
-    async def search_knowledge(self, query: str, top_k: int = None) -> List[Dict[str, Any]]:
-        """Recherche dans la base de connaissances"""
+    async def search_knowledge(self, query: str, top_k: int = None,
+                               mode: Optional[str] = None,
+                               where: Optional[Dict[str, Any]] = None,
+                               namespace: Optional[str] = None,
+                               diversify: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """Recherche dans la base de connaissances
+        
+        - **mode**: vector, hybrid ou lexical (défaut: settings.rag_knowledge_search_mode).
+          Le mode lexical n'utilise pas le modèle d'embedding.
+        - **where**: Filtre de métadonnées (format ChromaDB), appliqué dans la base vectorielle
+        - **namespace**: Restreint la recherche à un namespace (domaine, boutique) et au contenu partagé
+        - **diversify**: Écarte les chunks redondants par reranking MMR (défaut: settings.rag_mmr_enabled)
+        """
         if not self.initialized:
-            raise RuntimeError("Service RAG non initialisé")
+            raise RAGNotReadyError(self.phase)
         
         top_k = top_k or settings.rag_top_k
+        mode = self._resolve_knowledge_mode(mode)
         
         try:
-            # Génération de l'embedding de la requête
-            query_embedding = self.embedding_model.encode(query).tolist()
-            
-            # Recherche dans la collection
-            results = self.knowledge_collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k
+            return await self._cached_search(
+                "knowledge_base", query, top_k, mode, self._namespace_where(where, namespace),
+                self._resolve_diversify(diversify)
             )
             
-            # Formatage des résultats
-            knowledge_items = []
-            if results['documents'] and results['documents'][0]:
-                for doc, metadata, distance in zip(
-                    results['documents'][0], 
-                    results['metadatas'][0], 
-                    results['distances'][0]
-                ):
-                    if distance <= (1 - settings.rag_similarity_threshold):
-                        knowledge_items.append({
-                            'content': doc,
-                            'metadata': metadata,
-                            'relevance_score': 1 - distance
-                        })
-            
-            return knowledge_items
-            
         except Exception as e:
             logger.error(f"Erreur lors de la recherche dans la base de connaissances: {e}")
             return []
     
+    async def _ensure_product_embeddings(self):
+        """Encode les produits de la table courante, une fois par reconstruction de la table"""
+        async with self._product_embedding_lock:
+            table, texts = self.product_index.pending_embeddings()
+            if texts:
+                self.product_index.set_embeddings(table, await self._embed_texts(texts))
+    
+    async def search_products(self, query: Optional[str] = None, top_k: int = None,
+                              category: Optional[List[str]] = None,
+                              brand: Optional[List[str]] = None,
+                              min_price: Optional[float] = None,
+                              max_price: Optional[float] = None,
+                              sort: Optional[str] = None,
+                              require_filters: bool = False) -> Optional[Dict[str, Any]]:
+        """Recherche structurée dans la table des produits
+        
+        Les contraintes de la requête ("portables à moins de 1000€") deviennent
+        des filtres exacts sur les colonnes (prix, catégorie, marque) ; seul le
+        texte libre restant est encodé et classe les produits filtrés.
+        
+        - **category**, **brand**, **min_price**, **max_price**: Filtres explicites,
+          prioritaires sur ceux lus dans la requête
+        - **sort**: relevance, price_asc, price_desc ou name (défaut: pertinence
+          s'il reste du texte libre, sinon prix croissant)
+        - **require_filters**: Retourne None, sans encodage, si la requête ne porte
+          pas sur le catalogue (ni contrainte de prix, ni catégorie, ni tri, ni
+          question de prix : une marque seule ne suffit pas) et qu'aucun filtre
+          explicite n'est donné
+        
+        Retourne {products, total, facets, filters, sort, text}.
+        """
+        if not self.initialized:
+            raise RAGNotReadyError(self.phase)
+        
+        parsed = self.product_index.parse_query(query) if query else \
+            {'filters': {}, 'sort': None, 'text': '', 'intent': False}
+        filters = parsed['filters']
+        explicit = {key: value for key, value in (
+            ('category', category), ('brand', brand), ('min_price', min_price), ('max_price', max_price)
+        ) if value is not None}
+        filters.update(explicit)
+        if require_filters and not parsed['intent'] and not explicit:
+            return None
+        
+        query_embedding = None
+        if parsed['text'] and len(self.product_index):
+            await self._ensure_product_embeddings()
+            query_embedding = await self._embed_query(parsed['text'])
+        
+        result = self.product_index.search(filters, query_embedding, sort or parsed['sort'], top_k or settings.rag_top_k)
+        return {**result, 'filters': filters, 'text': parsed['text']}
+    
+    def build_knowledge_context(self, results: List[Dict[str, Any]],
+                                max_chars: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Compacte des résultats de connaissances pour un prompt
+        
+        Fusionne les chunks contigus d'une même source (sans leurs recouvrements)
+        et limite le total à max_chars caractères (défaut: settings.rag_context_max_chars).
+        """
+        if max_chars is None:
+            max_chars = settings.rag_context_max_chars
+        return build_knowledge_context(results, max_chars)
+    
+    async def _periodic_delta_merge(self):
+        """Fusion périodique des ajouts de ce worker dans l'artefact partagé
+        
+        La fusion a lieu toutes les rag_delta_merge_interval secondes, ou plus
+        tôt si le delta atteint rag_delta_max_rows lignes.
+        """
+        tick = min(5.0, settings.rag_delta_merge_interval)
+        last_merge = time.monotonic()
+        while True:
+            try:
+                await asyncio.sleep(tick)
+                if (time.monotonic() - last_merge < settings.rag_delta_merge_interval
+                        and self.vector_store.delta_rows() < settings.rag_delta_max_rows):
+                    continue
+                last_merge = time.monotonic()
+                await self._merge_deltas()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Erreur dans la fusion périodique des deltas: {e}")
+    
+    async def _merge_deltas(self):
+        """Fusionne les deltas et reconstruit les index dérivés des collections rechargées"""
+        reloaded = await asyncio.to_thread(self.vector_store.merge)
+        for name in reloaded:
+            # Génération écrite par un autre worker : registre, BM25 et cache à rafraîchir
+            collection = self.collections[name]
+            if name in self.DATA_COLLECTIONS:
+                self.item_registry.load_collection(collection)
+            if name == "image_catalog":
+                self.image_keywords.load_collection(collection)
+            if name == "knowledge_base":
+                if self.knowledge_dedup:
+                    # BM25 n'indexe que les chunks canoniques, sans les doublons
+                    self.knowledge_dedup.load()
+                    collection = self.knowledge_dedup.collection
+                self.bm25_index.load_collection(collection)
+            if name in self.namespace_indexes:
+                self.namespace_indexes[name].reset()
+            self.result_cache.invalidate(name)
+        if reloaded:
+            logger.info(f"Collections rechargées depuis l'artefact: {', '.join(reloaded)}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Statistiques du service RAG (caches, index BM25, exécuteur)"""
+        return {
+            'embedding_cache': self.embedding_cache.get_stats(),
+            'result_cache': self.result_cache.get_stats(),
+            'bm25_index': self.bm25_index.get_stats(),
+            'image_keywords': self.image_keywords.get_stats(),
+            'product_index': self.product_index.get_stats(),
+            'knowledge_watcher': self.knowledge_watcher.get_stats() if self.knowledge_watcher else None,
+            'namespace_indexes': {name: index.get_stats() for name, index in self.namespace_indexes.items()},
+            'deduplication': self.knowledge_dedup.get_stats() if self.knowledge_dedup else None,
+            'embedding_executor': self.embedding_executor.get_stats() if self.embedding_executor else None,
+            'embedding_server': {
+                'socket': settings.embedding_server_socket,
+                'restarts': self.embedding_supervisor.restarts
+            } if self.embedding_supervisor else None
+        }
+    
+    async def _write_runtime_items(self, collection, items: List[Dict[str, Any]],
+                                   stale_ids: Optional[List[str]] = None) -> Dict[str, int]:
+        """Écrit des items à l'exécution sans vecteurs en double
+        
+        Un item dont le texte est déjà indexé sous le même id n'est pas ré-encodé
+        (seules ses métadonnées sont mises à jour). Les ids de stale_ids absents
+        des nouveaux items sont supprimés après l'écriture des nouveaux : une
+        source n'est jamais vide pendant son remplacement.
+        """
+        ids = [item['id'] for item in items]
+        existing = collection.get(ids=ids, include=["documents"]) if ids else {'ids': [], 'documents': []}
+        stored = dict(zip(existing['ids'], existing['documents'] or []))
+        
+        to_embed = [item for item in items if stored.get(item['id']) != item['text']]
+        to_update = [item for item in items if item['id'] in stored and stored[item['id']] == item['text']]
+        new_ids = set(ids)
+        to_delete = list(dict.fromkeys(chunk_id for chunk_id in stale_ids or [] if chunk_id not in new_ids))
+        
+        if to_embed:
+            await self._upsert_items(collection, to_embed)
+        if to_update:
+            collection.update(
+                ids=[item['id'] for item in to_update],
+                metadatas=[item['metadata'] for item in to_update]
+            )
+        if to_delete:
+            collection.delete(ids=to_delete)
+        
+        return {'encoded': len(to_embed), 'updated': len(to_update), 'deleted': len(to_delete)}
+    
+    async def replace_knowledge_sources(self, documents: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Remplace tous les chunks de chaque source par ceux de sa nouvelle version
+        
+        Chaque document est un dict {content, source, metadata, version}. Sans
+        version explicite, la version indexée est incrémentée ; une version
+        inférieure ou égale à celle déjà indexée est ignorée (ré-envoi, ordre
+        d'arrivée inversé). Les chunks de l'ancienne version qui ne font plus
+        partie du document sont supprimés.
+        """
+        # Un seul document par source : le dernier du lot
+        latest = {document['source']: document for document in documents}
+        
+        async with self._runtime_write_lock:
+            items = []
+            stale_ids = []
+            skipped = 0
+            for source, document in latest.items():
+                existing = self.knowledge_collection.get(where={"source": source}, include=["metadatas"])
+                current = max((int(metadata.get('version', 0)) for metadata in existing['metadatas'] or []), default=0)
+                version = document.get('version')
+                if version is None:
+                    version = current + 1
+                elif existing['ids'] and int(version) <= current:
+                    logger.info(f"Source {source} ignorée: version {version} déjà indexée (version {current})")
+                    skipped += 1
+                    continue
+                
+                metadata = {**(document.get('metadata') or {}), 'version': int(version)}
+                items.extend(self._build_knowledge_items(document['content'], source, metadata))
+                stale_ids.extend(existing['ids'])
+            
+            stats = await self._write_runtime_items(self.knowledge_collection, items, stale_ids)
+        
+        stats['skipped'] = skipped
+        logger.info(
+            f"Connaissances remplacées: {len(latest) - skipped} sources ({stats['encoded']} chunks encodés, "
+            f"{stats['updated']} inchangés, {stats['deleted']} obsolètes supprimés)"
+        )
+        return stats
+    
+    async def _replace_ui_components(self, components: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Remplace des composants UI ; un composant de version antérieure à celle indexée est ignoré"""
+        async with self._runtime_write_lock:
+            items = [self._build_ui_component_item(component) for component in components]
+            for item, component in zip(items, components):
+                if component.get('version') is not None:
+                    item['metadata']['version'] = int(component['version'])
+            
+            existing = self.ui_components_collection.get(ids=[item['id'] for item in items], include=["metadatas"])
+            indexed = {
+                item_id: metadata.get('version')
+                for item_id, metadata in zip(existing['ids'], existing['metadatas'] or [])
+            }
+            current = [
+                item for item in items
+                if item['metadata'].get('version') is None or indexed.get(item['id']) is None
+                or item['metadata']['version'] > indexed[item['id']]
+            ]
+            
+            stats = await self._write_runtime_items(self.ui_components_collection, current)
+        
+        stats['skipped'] = len(items) - len(current)
+        return stats
+    
     async def add_ui_component_runtime(self, component_data: Dict[str, Any]) -> bool:
-        """Ajoute un composant UI à l'exécution"""
+        """Ajoute ou remplace un composant UI à l'exécution (champ 'version' optionnel)"""
+        return await self.add_ui_components_runtime([component_data])
+    
+    async def add_knowledge_runtime(self, content: str, source: str, metadata: Optional[Dict] = None,
+                                    namespace: Optional[str] = None, version: Optional[int] = None) -> bool:
+        """Ajoute ou remplace une source de connaissances à l'exécution
+        
+        Tous les chunks d'une version précédente de la source sont remplacés
+        (voir replace_knowledge_sources). Le namespace par défaut est
+        settings.rag_default_namespace.
+        """
+        if namespace:
+            metadata = {**(metadata or {}), 'namespace': namespace}
+        return await self.add_knowledge_batch_runtime([
+            {'content': content, 'source': source, 'metadata': metadata, 'version': version}
+        ])
+    
+    async def add_ui_components_runtime(self, components: List[Dict[str, Any]]) -> bool:
+        """Ajoute ou remplace un lot de composants UI à l'exécution"""
         try:
-            await self._add_ui_component(component_data)
+            await self._replace_ui_components(components)
+            self.vector_store.persist()
             return True
         except Exception as e:
-            logger.error(f"Erreur lors de l'ajout du composant à l'exécution: {e}")
+            logger.error(f"Erreur lors de l'ajout des composants à l'exécution: {e}")
             return False
     
-    async def add_knowledge_runtime(self, content: str, source: str, metadata: Optional[Dict] = None) -> bool:
-        """Ajoute une connaissance à l'exécution"""
+    async def add_knowledge_batch_runtime(self, documents: List[Dict[str, Any]]) -> bool:
+        """Ajoute ou remplace un lot de documents {content, source, metadata, version} à l'exécution"""
         try:
-            await self._add_knowledge_document(content, source, metadata)
+            await self.replace_knowledge_sources(documents)
+            self.vector_store.persist()
             return True
         except Exception as e:
-            logger.error(f"Erreur lors de l'ajout de la connaissance à l'exécution: {e}")
+            logger.error(f"Erreur lors de l'ajout des connaissances à l'exécution: {e}")
+            return False
+    
+    async def remove_knowledge_runtime(self, source: str) -> bool:
+        """Supprime tous les chunks d'une source de connaissances à l'exécution"""
+        try:
+            async with self._runtime_write_lock:
+                self.knowledge_collection.delete(where={"source": source})
+            self.vector_store.persist()
+            return True
+        except Exception as e:
+            logger.error(f"Erreur lors de la suppression de la source {source}: {e}")
             return False
     
     async def cleanup(self):
         """Nettoyage des ressources"""
         try:
-            if self.chroma_client:
-                # ChromaDB se ferme automatiquement
-                pass
+            for task in (self._merge_task, self._embedding_health_task, self._watch_task):
+                if task is None:
+                    continue
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+            
+            if self._init_task is not None and not self._init_task.done():
+                self._init_task.cancel()
+                try:
+                    await self._init_task
+                except (asyncio.CancelledError, Exception):
+                    pass
+            
+            if self.vector_store:
+                self.vector_store.close()
+            
+            if self.embedding_executor:
+                self.embedding_executor.shutdown()
+            
+            # Le serveur d'embeddings partagé n'est pas arrêté : il s'arrête seul une fois inactif
+            if isinstance(self.embedding_model, RemoteEmbeddingModel):
+                self.embedding_model.close()
             
             self.initialized = False
             logger.info("Service RAG nettoyé")
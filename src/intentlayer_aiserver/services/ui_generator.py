@@ -3,7 +3,7 @@
 import asyncio
 import time
 import json
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Union, Tuple
 import logging
 
 from openai import AsyncOpenAI
@@ -75,11 +75,10 @@ class UIGeneratorService:
         start_time = time.time()
         
         try:
-            # Recherche des composants pertinents via RAG
-            relevant_components = await self._get_relevant_components(request.intent, request.context)
-            
-            # Recherche des layouts pertinents via RAG
-            relevant_layouts = await self._get_relevant_layouts(request.intent, request.context)
+            # Recherche des composants et layouts pertinents via RAG (un seul encodage)
+            relevant_components, relevant_layouts = await self._get_relevant_components_and_layouts(
+                request.intent, request.context
+            )
             
             # Génération du layout avec LLM - retour direct des données JSON
             if self.langchain_llm:
@@ -109,51 +108,41 @@ class UIGeneratorService:
                 "confidence_score": 0.3
             }
     
-    async def _get_relevant_components(self, intent: str, context: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Récupère les composants UI pertinents via RAG"""
-        try:
-            # Construction de la requête de recherche
-            search_query = f"intention: {intent}"
-            
-            # Ajout du contexte à la recherche
-            if context.get('intent_type'):
-                search_query += f" type: {context['intent_type']}"
-            
-            if context.get('entity_types'):
-                search_query += f" entités: {', '.join(context['entity_types'])}"
-            
-            # Recherche dans la base vectorielle
-            components = await self.rag_service.search_ui_components(search_query, top_k=10)
-            
-            logger.debug(f"Trouvé {len(components)} composants pertinents pour: {search_query}")
-            return components
-            
-        except Exception as e:
-            logger.error(f"Erreur lors de la recherche de composants: {e}")
-            return []
+    def _build_search_query(self, intent: str, context: Dict[str, Any]) -> str:
+        """Construit la requête de recherche RAG à partir de l'intention et du contexte"""
+        search_query = f"intention: {intent}"
+        
+        # Ajout du contexte à la recherche
+        if context.get('intent_type'):
+            search_query += f" type: {context['intent_type']}"
+        
+        if context.get('entity_types'):
+            search_query += f" entités: {', '.join(context['entity_types'])}"
+        
+        return search_query
     
-    async def _get_relevant_layouts(self, intent: str, context: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Récupère les layouts UI pertinents via RAG"""
+    async def _get_relevant_components_and_layouts(self, intent: str, context: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Récupère composants et layouts pertinents via une recherche RAG groupée"""
         try:
-            # Construction de la requête de recherche
-            search_query = f"intention: {intent}"
+            search_query = self._build_search_query(intent, context)
             
-            # Ajout du contexte à la recherche
-            if context.get('intent_type'):
-                search_query += f" type: {context['intent_type']}"
-            
-            if context.get('entity_types'):
-                search_query += f" entités: {', '.join(context['entity_types'])}"
-            
-            # Recherche des layouts dans la base vectorielle
-            layouts = await self.rag_service.search_ui_layouts(search_query, top_k=5)
+            # Un seul encodage de la requête pour les deux collections ; reranking MMR
+            # selon la configuration (settings.rag_mmr_enabled)
+            rag_results = await self.rag_service.multi_search(
+                search_query, {"ui_components": 10, "ui_layouts": 5}, diversify=None
+            )
+            components = rag_results['results']['ui_components']
+            layouts = rag_results['results']['ui_layouts']
             
-            logger.debug(f"Trouvé {len(layouts)} layouts pertinents pour: {search_query}")
-            return layouts
+            logger.debug(
+                f"Trouvé {len(components)} composants et {len(layouts)} layouts pertinents pour: "
+                f"{search_query} ({rag_results['timings']})"
+            )
+            return components, layouts
             
         except Exception as e:
-            logger.error(f"Erreur lors de la recherche de layouts: {e}")
-            return []
+            logger.error(f"Erreur lors de la recherche de composants et layouts: {e}")
+            return [], []
     
     async def _generate_layout_llm(self, request: UIGenerationRequest, 
                                  relevant_components: List[Dict[str, Any]],
@@ -0,0 +1,628 @@
+"""Backends de stockage vectoriel pour le service RAG (ChromaDB, FAISS)"""
+
+import os
+import json
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional, Sequence
+from pathlib import Path
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INCLUDE = ("metadatas", "documents", "distances")
+
+
+def matches_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Évalue un filtre de métadonnées au format ChromaDB
+
+    Supporte l'égalité simple, $eq, $ne, $gt, $gte, $lt, $lte, $in, $nin,
+    ainsi que la combinaison par $and / $or.
+    """
+    if not where:
+        return True
+
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, expected in condition.items():
+                if operator == "$eq" and value != expected:
+                    return False
+                if operator == "$ne" and value == expected:
+                    return False
+                if operator == "$in" and value not in expected:
+                    return False
+                if operator == "$nin" and value in expected:
+                    return False
+                if operator in ("$gt", "$gte", "$lt", "$lte"):
+                    if value is None:
+                        return False
+                    if operator == "$gt" and not value > expected:
+                        return False
+                    if operator == "$gte" and not value >= expected:
+                        return False
+                    if operator == "$lt" and not value < expected:
+                        return False
+                    if operator == "$lte" and not value <= expected:
+                        return False
+        elif metadata.get(key) != condition:
+            return False
+
+    return True
+
+
+class VectorCollection(ABC):
+    """Interface d'une collection vectorielle
+
+    Reprend le sous-ensemble de l'API des collections ChromaDB utilisé par le
+    service RAG, afin que les collections Chroma s'y conforment telles quelles.
+    Les distances retournées par query sont des distances L2 au carré. Un
+    backend incomplet échoue dès sa construction.
+    """
+
+    name: str
+
+    @abstractmethod
+    def count(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add(self, ids: List[str], embeddings: List[List[float]],
+            documents: List[str], metadatas: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: List[List[float]],
+               documents: List[str], metadatas: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, ids: List[str], embeddings: Optional[List[List[float]]] = None,
+               documents: Optional[List[str]] = None, metadatas: Optional[List[Dict[str, Any]]] = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            include: Sequence[str] = ("metadatas", "documents"),
+            limit: Optional[int] = None, offset: Optional[int] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10,
+              where: Optional[Dict[str, Any]] = None,
+              include: Sequence[str] = DEFAULT_INCLUDE) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class VectorStore(ABC):
+    """Backend de stockage : crée et persiste des collections vectorielles"""
+
+    backend_type: str = ""
+    prebuilt: bool = False  # Index construit hors ligne : pas d'ingestion au démarrage
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    @abstractmethod
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> VectorCollection:
+        raise NotImplementedError
+
+    def persist(self):
+        """Écrit sur disque les modifications en attente"""
+
+    def close(self):
+        """Libère les ressources du backend"""
+        self.persist()
+
+
+class ChromaVectorStore(VectorStore):
+    """Backend ChromaDB persistant (les collections Chroma sont retournées telles quelles)"""
+
+    backend_type = "chroma"
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        import chromadb
+        from chromadb.config import Settings as ChromaSettings
+
+        os.makedirs(path, exist_ok=True)
+
+        # Configuration ChromaDB
+        chroma_settings = ChromaSettings(
+            persist_directory=path,
+            anonymized_telemetry=False
+        )
+
+        self.client = chromadb.PersistentClient(
+            path=path,
+            settings=chroma_settings
+        )
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None):
+        return self.client.get_or_create_collection(name=name, metadata=metadata)
+
+
+class FaissCollection(VectorCollection):
+    """Collection vectorielle FAISS avec stockage annexe des documents et métadonnées
+
+    Les lignes sont ajoutées en fin d'index ; une suppression ou un
+    remplacement marque l'ancienne ligne comme morte (pierre tombale). Les
+    recherches ignorent les lignes mortes et l'index est reconstruit à partir
+    des lignes vivantes lorsque leur proportion devient trop élevée. Les
+    vecteurs ne sont stockés que dans l'index FAISS (reconstruits au besoin).
+    """
+
+    COMPACTION_RATIO = 0.2
+    COMPACTION_MIN_DEAD = 64
+
+    def __init__(self, name: str, directory: Path, index_type: str = "hnsw",
+                 metadata: Optional[Dict[str, Any]] = None):
+        import faiss
+
+        self._faiss = faiss
+        self.name = name
+        self.metadata = metadata or {}
+        self.index_type = index_type
+        self.index_path = directory / f"{name}.index"
+        self.meta_path = directory / f"{name}.meta.json"
+
+        self.index = None
+        self.dim: Optional[int] = None
+        self.row_ids: List[Optional[str]] = []
+        self.row_documents: List[Optional[str]] = []
+        self.row_metadatas: List[Optional[Dict[str, Any]]] = []
+        self.row_by_id: Dict[str, int] = {}
+        self.dead_rows = 0
+        self.dirty = False
+        self._lock = threading.RLock()
+
+        self._load()
+
+    # Persistance
+
+    def _load(self):
+        """Charge l'index et le stockage annexe depuis le disque"""
+        if not self.meta_path.exists():
+            return
+
+        with open(self.meta_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        self.dim = data.get('dim')
+        self.row_ids = data.get('ids', [])
+        self.row_documents = data.get('documents', [])
+        self.row_metadatas = data.get('metadatas', [])
+        self.row_by_id = {chunk_id: row for row, chunk_id in enumerate(self.row_ids) if chunk_id is not None}
+        self.dead_rows = len(self.row_ids) - len(self.row_by_id)
+
+        if self.index_path.exists():
+            self.index = self._faiss.read_index(str(self.index_path))
+            self._configure_search(self.index)
+
+        if self.index is None or self.index.ntotal != len(self.row_ids):
+            # Vecteurs irrécupérables : la collection repart vide et sera ré-ingérée
+            logger.warning(f"Collection FAISS {self.name}: index absent ou incohérent, collection réinitialisée")
+            self.index = None
+            self.row_ids, self.row_documents, self.row_metadatas = [], [], []
+            self.row_by_id = {}
+            self.dead_rows = 0
+            self.dirty = True
+        elif data.get('index_type') != self.index_type:
+            logger.info(f"Collection FAISS {self.name}: reconstruction de l'index ({self.index_type})")
+            self._rebuild()
+
+        logger.info(f"Collection FAISS {self.name} chargée: {len(self.row_by_id)} vecteurs")
+
+    def persist(self):
+        """Écrit l'index et le stockage annexe de manière atomique"""
+        with self._lock:
+            if not self.dirty:
+                return
+
+            tmp_meta = self.meta_path.with_suffix('.tmp')
+            with open(tmp_meta, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'name': self.name,
+                    'dim': self.dim,
+                    'index_type': self.index_type,
+                    'metadata': self.metadata,
+                    'ids': self.row_ids,
+                    'documents': self.row_documents,
+                    'metadatas': self.row_metadatas
+                }, f, ensure_ascii=False)
+
+            if self.index is not None:
+                tmp_index = self.index_path.with_suffix('.index.tmp')
+                self._faiss.write_index(self.index, str(tmp_index))
+                os.replace(tmp_index, self.index_path)
+            os.replace(tmp_meta, self.meta_path)
+
+            self.dirty = False
+
+    # Construction de l'index
+
+    def _create_index(self, n_vectors: int):
+        """Crée un index vide du type configuré"""
+        from ..core.config import settings
+
+        faiss = self._faiss
+        if self.index_type == "flat":
+            return faiss.IndexFlatL2(self.dim)
+
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(self.dim, settings.faiss_hnsw_m)
+            index.hnsw.efConstruction = settings.faiss_hnsw_ef_construction
+            return index
+
+        if self.index_type == "ivf":
+            # Au moins ~39 points par centroïde pour un entraînement correct
+            nlist = min(settings.faiss_ivf_nlist, n_vectors // 39)
+            if nlist < 1:
+                return faiss.IndexFlatL2(self.dim)
+            quantizer = faiss.IndexFlatL2(self.dim)
+            return faiss.IndexIVFFlat(quantizer, self.dim, nlist)
+
+        raise ValueError(f"Type d'index FAISS inconnu: {self.index_type}")
+
+    def _configure_search(self, index):
+        """Applique les paramètres de recherche (efSearch, nprobe)"""
+        from ..core.config import settings
+
+        faiss = self._faiss
+        if isinstance(index, faiss.IndexHNSWFlat):
+            index.hnsw.efSearch = settings.faiss_hnsw_ef_search
+        elif isinstance(index, faiss.IndexIVFFlat):
+            index.nprobe = settings.faiss_ivf_nprobe
+            index.make_direct_map()
+
+    def _live_rows(self) -> List[int]:
+        return [row for row, chunk_id in enumerate(self.row_ids) if chunk_id is not None]
+
+    def _rebuild(self):
+        """Reconstruit l'index à partir des seules lignes vivantes"""
+        live_rows = self._live_rows()
+        vectors = self._reconstruct_rows(live_rows) if live_rows else np.zeros((0, self.dim or 0), dtype=np.float32)
+
+        self.row_ids = [self.row_ids[row] for row in live_rows]
+        self.row_documents = [self.row_documents[row] for row in live_rows]
+        self.row_metadatas = [self.row_metadatas[row] for row in live_rows]
+        self.row_by_id = {chunk_id: row for row, chunk_id in enumerate(self.row_ids)}
+        self.dead_rows = 0
+        self.dirty = True
+
+        if self.dim is None:
+            self.index = None
+            return
+
+        index = self._create_index(len(live_rows))
+        if not index.is_trained:
+            index.train(vectors)
+        if len(live_rows):
+            index.add(vectors)
+        self._configure_search(index)
+        self.index = index
+
+    def _reconstruct_rows(self, rows: List[int]) -> np.ndarray:
+        """Relit les vecteurs de lignes depuis l'index"""
+        if self.index is None or not rows:
+            return np.zeros((len(rows), self.dim or 0), dtype=np.float32)
+        return np.vstack([self.index.reconstruct(int(row)) for row in rows]).astype(np.float32)
+
+    def _maybe_upgrade_ivf(self):
+        """Ré-entraîne l'index IVF lorsque la collection a assez grossi
+
+        Un index plat provisoire est utilisé tant qu'il n'y a pas assez de
+        vecteurs pour entraîner des centroïdes ; le nombre de listes est
+        ensuite doublé au fil de la croissance jusqu'à faiss_ivf_nlist.
+        """
+        if self.index_type != "ivf":
+            return
+
+        from ..core.config import settings
+
+        target_nlist = min(settings.faiss_ivf_nlist, len(self.row_by_id) // 39)
+        current_nlist = self.index.nlist if isinstance(self.index, self._faiss.IndexIVFFlat) else 0
+        if target_nlist >= 1 and (current_nlist == 0 or target_nlist >= 2 * current_nlist):
+            self._rebuild()
+
+    def _maybe_compact(self):
+        """Compacte l'index lorsque les lignes mortes sont trop nombreuses"""
+        total = len(self.row_ids)
+        if self.dead_rows >= self.COMPACTION_MIN_DEAD and self.dead_rows > total * self.COMPACTION_RATIO:
+            logger.debug(f"Collection FAISS {self.name}: compaction ({self.dead_rows}/{total} lignes mortes)")
+            self._rebuild()
+
+    # Écritures
+
+    def _kill(self, chunk_id: str) -> bool:
+        row = self.row_by_id.pop(chunk_id, None)
+        if row is None:
+            return False
+        self.row_ids[row] = None
+        self.row_documents[row] = None
+        self.row_metadatas[row] = None
+        self.dead_rows += 1
+        return True
+
+    def count(self) -> int:
+        return len(self.row_by_id)
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        with self._lock:
+            new = [i for i, chunk_id in enumerate(ids) if chunk_id not in self.row_by_id]
+            if len(new) < len(ids):
+                logger.warning(f"Collection FAISS {self.name}: {len(ids) - len(new)} ids existants ignorés")
+            self._append(
+                [ids[i] for i in new],
+                [embeddings[i] for i in new],
+                [documents[i] for i in new] if documents is not None else None,
+                [metadatas[i] for i in new] if metadatas is not None else None
+            )
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        with self._lock:
+            if not ids:
+                return
+            # Le nouveau bloc est validé avant que les anciennes lignes ne soient marquées mortes
+            vectors = self._prepare(ids, embeddings)
+            for chunk_id in ids:
+                self._kill(chunk_id)
+            self._append(ids, vectors, documents, metadatas)
+            self._maybe_compact()
+
+    def _prepare(self, ids, embeddings) -> np.ndarray:
+        """Vecteurs float32 contigus d'un bloc, de la dimension de la collection"""
+        vectors = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError(
+                f"Collection FAISS {self.name}: {len(ids)} ids pour des embeddings de forme {vectors.shape}"
+            )
+        if self.dim is not None and vectors.shape[1] != self.dim:
+            raise ValueError(
+                f"Dimension d'embedding {vectors.shape[1]} incompatible avec la collection {self.name} ({self.dim})"
+            )
+        return vectors
+
+    def _append(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+
+        vectors = self._prepare(ids, embeddings)
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            self.index = self._create_index(0)
+            self._configure_search(self.index)
+
+        start = len(self.row_ids)
+        self.index.add(vectors)
+        for offset, chunk_id in enumerate(ids):
+            self.row_by_id[chunk_id] = start + offset
+        self.row_ids.extend(ids)
+        self.row_documents.extend(documents if documents is not None else [None] * len(ids))
+        self.row_metadatas.extend(metadatas if metadatas is not None else [{}] * len(ids))
+        self.dirty = True
+
+        self._maybe_upgrade_ivf()
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        with self._lock:
+            if embeddings is not None:
+                # Comme sans embeddings (et comme Chroma), les ids inconnus sont ignorés
+                known = [i for i, chunk_id in enumerate(ids) if chunk_id in self.row_by_id]
+                if len(known) < len(ids):
+                    logger.warning(f"Collection FAISS {self.name}: {len(ids) - len(known)} ids inconnus ignorés")
+                rows = [self.row_by_id[ids[i]] for i in known]
+                self.upsert(
+                    [ids[i] for i in known],
+                    [embeddings[i] for i in known],
+                    [documents[i] for i in known] if documents is not None else [self.row_documents[row] for row in rows],
+                    [metadatas[i] for i in known] if metadatas is not None else [self.row_metadatas[row] for row in rows]
+                )
+                return
+
+            for i, chunk_id in enumerate(ids):
+                row = self.row_by_id.get(chunk_id)
+                if row is None:
+                    continue
+                if documents is not None:
+                    self.row_documents[row] = documents[i]
+                if metadatas is not None:
+                    self.row_metadatas[row] = metadatas[i]
+            self.dirty = True
+
+    def delete(self, ids=None, where=None):
+        with self._lock:
+            if ids is None:
+                ids = [
+                    chunk_id for chunk_id, row in self.row_by_id.items()
+                    if matches_where(self.row_metadatas[row], where)
+                ]
+            elif where:
+                ids = [
+                    chunk_id for chunk_id in ids
+                    if chunk_id in self.row_by_id and matches_where(self.row_metadatas[self.row_by_id[chunk_id]], where)
+                ]
+
+            removed = sum(1 for chunk_id in ids if self._kill(chunk_id))
+            if removed:
+                self.dirty = True
+                self._maybe_compact()
+
+    # Lectures
+
+    def get(self, ids=None, where=None, include=("metadatas", "documents"), limit=None, offset=None):
+        with self._lock:
+            if ids is None:
+                rows = [row for row in self.row_by_id.values()]
+                rows.sort()
+            else:
+                rows = [self.row_by_id[chunk_id] for chunk_id in ids if chunk_id in self.row_by_id]
+            if where:
+                rows = [row for row in rows if matches_where(self.row_metadatas[row], where)]
+            if offset:
+                rows = rows[offset:]
+            if limit is not None:
+                rows = rows[:limit]
+
+            return {
+                'ids': [self.row_ids[row] for row in rows],
+                'embeddings': self._reconstruct_rows(rows) if "embeddings" in include else None,
+                'documents': [self.row_documents[row] for row in rows] if "documents" in include else None,
+                'metadatas': [self.row_metadatas[row] for row in rows] if "metadatas" in include else None
+            }
+
+    def query(self, query_embeddings, n_results=10, where=None, include=DEFAULT_INCLUDE):
+        with self._lock:
+            results = {'ids': [], 'distances': [], 'documents': [], 'metadatas': [], 'embeddings': []}
+            queries = np.ascontiguousarray(np.asarray(query_embeddings, dtype=np.float32))
+
+            for query in queries:
+                rows, distances = self._search_rows(query, n_results, where)
+                results['ids'].append([self.row_ids[row] for row in rows])
+                results['distances'].append(distances)
+                results['documents'].append([self.row_documents[row] for row in rows])
+                results['metadatas'].append([self.row_metadatas[row] for row in rows])
+                results['embeddings'].append(self._reconstruct_rows(rows) if "embeddings" in include else None)
+
+            for key in ("distances", "documents", "metadatas", "embeddings"):
+                if key not in include:
+                    results[key] = None
+            return results
+
+    def _search_rows(self, query: np.ndarray, n_results: int, where: Optional[Dict[str, Any]]):
+        """Recherche les lignes vivantes les plus proches, en élargissant k si des lignes sont filtrées"""
+        total = self.index.ntotal if self.index is not None else 0
+        if total == 0 or n_results <= 0:
+            return [], []
+
+        k = min(total, n_results + self.dead_rows)
+        while True:
+            distances, labels = self.index.search(query.reshape(1, -1), k)
+            rows, kept = [], []
+            for distance, row in zip(distances[0], labels[0]):
+                if row < 0 or self.row_ids[row] is None:
+                    continue
+                if where and not matches_where(self.row_metadatas[row], where):
+                    continue
+                rows.append(int(row))
+                kept.append(float(distance))
+                if len(rows) == n_results:
+                    return rows, kept
+
+            if k >= total:
+                return rows, kept
+            k = min(total, k * 2)
+
+
+class FaissVectorStore(VectorStore):
+    """Backend FAISS persistant (index flat, IVF ou HNSW selon la configuration)"""
+
+    backend_type = "faiss"
+
+    def __init__(self, path: str, index_type: str = "hnsw"):
+        super().__init__(path)
+        self.index_type = index_type
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.collections: Dict[str, FaissCollection] = {}
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> FaissCollection:
+        if name not in self.collections:
+            self.collections[name] = FaissCollection(name, self.path, self.index_type, metadata)
+        return self.collections[name]
+
+    def persist(self):
+        for collection in self.collections.values():
+            try:
+                collection.persist()
+            except Exception as e:
+                logger.error(f"Erreur lors de la sauvegarde de la collection FAISS {collection.name}: {e}")
+
+
+def create_vector_store(backend_type: str, path: str) -> VectorStore:
+    """Crée le backend vectoriel correspondant à settings.vector_db_type"""
+    from ..core.config import settings
+
+    backend_type = (backend_type or "chroma").lower()
+    if backend_type in ("chroma", "chromadb"):
+        return ChromaVectorStore(path)
+    if backend_type == "faiss":
+        return FaissVectorStore(str(Path(path) / "faiss"), settings.faiss_index_type.lower())
+
+    raise ValueError(f"Type de base vectorielle inconnu: {backend_type}")
+
+
+class CollectionObserver:
+    """Observateur des écritures d'une collection (index dérivés, caches)"""
+
+    def on_upsert(self, collection_name: str, ids: List[str],
+                  documents: Optional[List[str]], metadatas: Optional[List[Dict[str, Any]]]):
+        """Appelé après l'ajout ou le remplacement d'items"""
+
+    def on_update(self, collection_name: str, ids: List[str],
+                  documents: Optional[List[str]], metadatas: Optional[List[Dict[str, Any]]]):
+        """Appelé après la mise à jour des documents/métadonnées d'items existants"""
+
+    def on_delete(self, collection_name: str, ids: List[str]):
+        """Appelé après la suppression d'items"""
+
+
+class ObservedCollection(VectorCollection):
+    """Collection qui notifie ses observateurs après chaque écriture
+
+    Les suppressions par filtre sont résolues en ids avant d'être appliquées,
+    afin que les observateurs reçoivent toujours la liste exacte des ids.
+    """
+
+    def __init__(self, collection, observers: Optional[List[CollectionObserver]] = None):
+        self.collection = collection
+        self.observers: List[CollectionObserver] = list(observers or [])
+        self.name = collection.name
+
+    def add_observer(self, observer: CollectionObserver):
+        self.observers.append(observer)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        self.collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        for observer in self.observers:
+            observer.on_upsert(self.name, ids, documents, metadatas)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        for observer in self.observers:
+            observer.on_upsert(self.name, ids, documents, metadatas)
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        self.collection.update(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        for observer in self.observers:
+            observer.on_update(self.name, ids, documents, metadatas)
+
+    def delete(self, ids=None, where=None):
+        if where is not None:
+            ids = self.collection.get(ids=ids, where=where, include=[])['ids']
+        if not ids:
+            return
+        self.collection.delete(ids=ids)
+        for observer in self.observers:
+            observer.on_delete(self.name, ids)
+
+    def get(self, ids=None, where=None, include=("metadatas", "documents"), limit=None, offset=None):
+        return self.collection.get(ids=ids, where=where, include=include, limit=limit, offset=offset)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=DEFAULT_INCLUDE):
+        return self.collection.query(query_embeddings=query_embeddings, n_results=n_results,
+                                     where=where, include=include)